@@ -138,6 +138,10 @@ function App() {
   };
 
   const logout = () => {
+    const token = localStorage.getItem('token');
+    if (token) {
+      axios.post('/api/logout', null, { headers: { Authorization: `Bearer ${token}` } }).catch(() => {});
+    }
     localStorage.removeItem('token');
     delete axios.defaults.headers.common['Authorization'];
     setUser(null);
@@ -0,0 +1,233 @@
+"""Asyncio serving path for the catalog, cart and admin metrics endpoints.
+
+``create_asgi_app`` wraps the Flask app in an ASGI app. Requests are matched
+against Flask's URL map. Endpoints in ASYNC_VIEWS run as coroutines on the
+event loop, with their SQL on an async engine (aiomysql or aiosqlite; see
+``config.async_database_url``). Every other route goes to the Flask app in
+a thread pool. An async view runs inside a Flask request context, so
+``request``, JWT checks, error handlers and the after-request hooks
+(compression, metrics, replica fence) work as in the threaded app. It also
+runs the same steps generator as the Flask view (see querysteps.py).
+Statements yielded together run concurrently, for example the count and the
+page of ``/api/products`` and the four aggregates of ``/api/admin/metrics``.
+
+A request waiting on the database holds a coroutine, not a thread. The
+requests in flight per worker are therefore bounded by the async pool
+(``DB_POOL_SIZE + DB_MAX_OVERFLOW``) rather than by the thread count.
+
+Some work still blocks:
+
+- The search and facet index loaders run in a thread (``querysteps.Call``).
+- Catalog cache, cart store and revocation lookups are called inline. With
+  the in-process backends this costs nothing. With the redis backends, each
+  call is a short round trip that blocks the loop.
+- Async views always read from the primary, because replicas.py only
+  routes the Flask session.
+
+    uvicorn asgi:app --workers 4          # or: python serve.py --asgi
+"""
+import io
+import sys
+
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+
+import app as ekart
+import querysteps
+from config import async_database_url
+
+try:
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+except ImportError as e:
+    raise ImportError('asyncio serving needs uvicorn and an async driver '
+                      '(pip install -r requirements-optional.txt)') from e
+
+ASYNC_VIEWS = {}
+
+
+def async_view(endpoint):
+    """Serve the Flask endpoint ``endpoint`` with this coroutine."""
+    def decorator(fn):
+        ASYNC_VIEWS[endpoint] = fn
+        return fn
+    return decorator
+
+
+async def _run(steps):
+    return await querysteps.run_async(steps, current_app.extensions['async_engine'])
+
+
+# -- views (each mirrors the Flask view of the same endpoint in app.py) -----
+
+@async_view('api.get_products')
+async def get_products():
+    return await _run(ekart._products_steps())
+
+
+@async_view('api.get_product_detail')
+async def get_product_detail(product_id):
+    return await _run(ekart._product_detail_steps(product_id))
+
+
+@async_view('api.get_categories')
+async def get_categories():
+    return await _run(ekart._categories_steps())
+
+
+@async_view('api.get_cart')
+async def get_cart():
+    verify_jwt_in_request()
+    return await _run(ekart._cart_steps(int(get_jwt_identity())))
+
+
+@async_view('api.add_to_cart')
+async def add_to_cart():
+    verify_jwt_in_request()
+    return await _run(ekart._add_to_cart_steps(int(get_jwt_identity()), request.get_json()))
+
+
+@async_view('api.update_cart_item')
+async def update_cart_item():
+    verify_jwt_in_request()
+    return await _run(ekart._update_cart_item_steps(int(get_jwt_identity()), request.get_json()))
+
+
+@async_view('api.delete_cart_item')
+async def delete_cart_item(product_id):
+    verify_jwt_in_request()
+    return await _run(ekart._delete_cart_item_steps(int(get_jwt_identity()), product_id))
+
+
+@async_view('api.admin_metrics')
+async def admin_metrics():
+    verify_jwt_in_request()
+    return await _run(ekart._admin_metrics_steps())
+
+
+# -- ASGI plumbing -----------------------------------------------------------
+
+def _environ(scope):
+    """WSGI environ for an HTTP ``scope``, without a body yet."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope['http_version'],
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': '0',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+class AsyncApp:
+    """ASGI app serving ASYNC_VIEWS on the event loop and everything else
+    through the Flask WSGI app."""
+
+    def __init__(self, flask_app, engine, wsgi_threads=10):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        environ = _environ(scope)
+        try:
+            rule, view_args = self.flask_app.url_map.bind_to_environ(environ).match(return_rule=True)
+            view = ASYNC_VIEWS.get(rule.endpoint)
+        except HTTPException:
+            view = None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+        body = await _read_body(receive)
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        response = await self._dispatch(environ, view, view_args)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.get_data()})
+        finally:
+            response.close()
+
+    async def _dispatch(self, environ, view, view_args):
+        """Flask's full_dispatch_request with an awaited view."""
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            return app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+        finally:
+            ctx.pop(error)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None):
+    flask_app = ekart.create_app(config)
+    flask_app.config.setdefault('ASGI_WSGI_THREADS', 10)
+    url = flask_app.config.get('ASYNC_DATABASE_URL') or async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    try:
+        engine = create_async_engine(url, **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    except ImportError as e:
+        raise ImportError(f'no asyncio driver installed for {url.split(":", 1)[0]} '
+                          '(pip install -r requirements-optional.txt)') from e
+    flask_app.extensions['async_engine'] = engine
+    return AsyncApp(flask_app, engine, flask_app.config['ASGI_WSGI_THREADS'])
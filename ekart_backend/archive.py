@@ -0,0 +1,225 @@
+"""Archival of cold orders out of the live ``orders``/``order_items`` tables.
+
+The live tables hold recent orders and every order still in progress. Their
+size, and the index upkeep each checkout pays, therefore depends on the
+order volume of the last ``ORDER_ARCHIVE_AFTER_DAYS`` days rather than on
+the whole history. ``order-archiver`` is a PeriodicWorker that runs every
+``ORDER_ARCHIVE_INTERVAL`` seconds (``flask archive-orders`` runs it once).
+It moves delivered and cancelled orders created before that window, with
+their lines, into ``orders_archive`` and ``order_items_archive``. It works
+in batches of ``ORDER_ARCHIVE_BATCH_SIZE`` orders, one transaction per
+batch.
+
+Archive rows carry the order's ``created_at``, lines included, and it is
+part of their primary keys. On MySQL both archive tables are partitioned by
+month on it (migration 10: one partition per month and a ``pmax``
+catch-all). The job adds partitions for the months it is about to fill.
+Views that read order history query the live and the archive table
+(``app.ORDER_TABLES``), so a ``created_at`` range lets MySQL skip every
+month outside it. Other databases get plain tables with the same indexes.
+The live tables are not partitioned, because MySQL does not allow foreign
+keys on partitioned tables.
+
+Archived orders never change. Changing the status of one moves it back to
+the live tables first (``restore``). If it is still terminal, the job
+archives it again later.
+
+The job never archives the highest live order id. SQLite tables without
+AUTOINCREMENT, and InnoDB before MySQL 8.0 after a restart, hand out the
+next id from the highest one still in the table, so archiving it would let
+a new order reuse an archived id. ``restore`` refuses an order whose id is
+already live (``OrderIdConflict``, answered with 409).
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from flask import jsonify
+from sqlalchemy import func, select, text
+
+from jobs import PeriodicWorker
+
+
+TERMINAL_STATUSES = ('delivered', 'cancelled')
+CATCH_ALL_PARTITION = 'pmax'
+
+
+class OrderIdConflict(RuntimeError):
+    pass
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'p{month:%Y%m}'
+
+
+def partitioned_tables(conn, names):
+    """The tables among ``names`` that are partitioned (MySQL only)."""
+    rows = conn.execute(text(
+        'SELECT DISTINCT TABLE_NAME FROM information_schema.PARTITIONS '
+        'WHERE TABLE_SCHEMA = DATABASE() AND PARTITION_NAME IS NOT NULL'
+    ))
+    return {name for (name,) in rows} & set(names)
+
+
+class OrderArchive:
+    """``live`` and ``archive`` are ``(order model, item model)`` pairs."""
+
+    def __init__(self, db, live, archive, app=None):
+        self.db = db
+        self.orders, self.items = (model.__table__ for model in live)
+        self.archived_orders, self.archived_items = (model.__table__ for model in archive)
+        self.after_days = 90
+        self.batch_size = 1000
+        self.worker = PeriodicWorker('order-archiver', self.archive)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ORDER_ARCHIVE_AFTER_DAYS', 90)
+        app.config.setdefault('ORDER_ARCHIVE_INTERVAL', 3600)
+        app.config.setdefault('ORDER_ARCHIVE_BATCH_SIZE', 1000)
+        self.after_days = app.config['ORDER_ARCHIVE_AFTER_DAYS']
+        self.batch_size = app.config['ORDER_ARCHIVE_BATCH_SIZE']
+        self.worker.interval = app.config['ORDER_ARCHIVE_INTERVAL'] or 3600
+        app.extensions['order_archive'] = self
+
+        @app.errorhandler(OrderIdConflict)
+        def _order_id_conflict(e):
+            return jsonify({'msg': str(e)}), 409
+
+    # -- moving orders ---------------------------------------------------------
+
+    @contextmanager
+    def _job_lock(self):
+        """One archiver at a time across workers on MySQL; yields False if another holds it."""
+        if self.db.engine.dialect.name != 'mysql':
+            yield True
+            return
+        with self.db.engine.connect() as conn:
+            got = conn.execute(text("SELECT GET_LOCK('ekart_order_archive', 0)")).scalar()
+            try:
+                yield bool(got)
+            finally:
+                if got:
+                    conn.execute(text("SELECT RELEASE_LOCK('ekart_order_archive')"))
+
+    def archive(self, before=None):
+        """Move terminal orders created before ``before`` (default: ORDER_ARCHIVE_AFTER_DAYS
+        ago) and their lines to the archive. Returns the number of orders moved."""
+        before = before or datetime.utcnow() - timedelta(days=self.after_days)
+        session = self.db.session
+        o = self.orders
+        moved = 0
+        with self._job_lock() as locked:
+            if not locked:
+                return 0
+            # the highest id stays live, so the next order id cannot be an archived one
+            newest_id = session.execute(select(func.max(o.c.order_id))).scalar()
+            eligible = [o.c.status.in_(TERMINAL_STATUSES), o.c.created_at < before, o.c.order_id < newest_id]
+            oldest = session.execute(select(func.min(o.c.created_at)).where(*eligible)).scalar()
+            session.commit()
+            if oldest is None:
+                return 0
+            self.ensure_partitions(oldest, before)
+            while True:
+                batch = session.execute(
+                    select(o.c.order_id).where(*eligible)
+                    .order_by(o.c.created_at, o.c.order_id)
+                    .limit(self.batch_size)
+                    .with_for_update()
+                ).scalars().all()
+                if batch:
+                    self._move(batch)
+                session.commit()
+                moved += len(batch)
+                if len(batch) < self.batch_size:
+                    return moved
+
+    def _move(self, order_ids):
+        o, i = self.orders, self.items
+        ao, ai = self.archived_orders, self.archived_items
+        session = self.db.session
+        order_columns = [c.name for c in ao.columns]
+        item_columns = [c.name for c in ai.columns]
+        session.execute(ao.insert().from_select(
+            order_columns, select(*(o.c[name] for name in order_columns)).where(o.c.order_id.in_(order_ids))))
+        session.execute(ai.insert().from_select(
+            item_columns,
+            select(*(i.c[name] if name in i.c else o.c[name] for name in item_columns))
+            .select_from(i.join(o, o.c.order_id == i.c.order_id))
+            .where(i.c.order_id.in_(order_ids))))
+        session.execute(i.delete().where(i.c.order_id.in_(order_ids)))
+        session.execute(o.delete().where(o.c.order_id.in_(order_ids)))
+
+    def restore(self, order_id):
+        """Move an archived order and its lines back to the live tables, in the
+        caller's transaction. Returns False if ``order_id`` is not archived and
+        raises OrderIdConflict if a live order already has its id."""
+        o, i = self.orders, self.items
+        ao, ai = self.archived_orders, self.archived_items
+        session = self.db.session
+        created_at = session.execute(
+            select(ao.c.created_at).where(ao.c.order_id == order_id).with_for_update()
+        ).scalar()
+        if created_at is None:
+            return False
+        if session.execute(select(o.c.order_id).where(o.c.order_id == order_id)).first() is not None:
+            raise OrderIdConflict(f'Order {order_id} is both live and archived; resolve the duplicate id first')
+        # created_at confines every statement to the order's month partition
+        in_order = [ao.c.order_id == order_id, ao.c.created_at == created_at]
+        in_lines = [ai.c.order_id == order_id, ai.c.created_at == created_at]
+        order_columns = [c.name for c in o.columns]
+        item_columns = [c.name for c in i.columns]
+        session.execute(o.insert().from_select(
+            order_columns, select(*(ao.c[name] for name in order_columns)).where(*in_order)))
+        session.execute(i.insert().from_select(
+            item_columns, select(*(ai.c[name] for name in item_columns)).where(*in_lines)))
+        session.execute(ai.delete().where(*in_lines))
+        session.execute(ao.delete().where(*in_order))
+        return True
+
+    # -- partitions --------------------------------------------------------------
+
+    def ensure_partitions(self, first, last):
+        """Give the partitioned archive tables a partition for every month from
+        ``first`` to ``last``, split off the catch-all. A no-op except on MySQL."""
+        if self.db.engine.dialect.name != 'mysql':
+            return
+        months = [_month_start(first)]
+        while months[-1] < _month_start(last):
+            months.append(_next_month(months[-1]))
+        tables = (self.archived_orders.name, self.archived_items.name)
+        with self.db.engine.begin() as conn:
+            for table in sorted(partitioned_tables(conn, tables)):
+                existing = {name for (name,) in conn.execute(text(
+                    'SELECT PARTITION_NAME FROM information_schema.PARTITIONS '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t'), {'t': table})}
+                highest = max((name for name in existing if name != CATCH_ALL_PARTITION), default='')
+                # months below the highest partition already fall into some partition's range
+                new = [m for m in months if partition_name(m) > highest]
+                if not new:
+                    continue
+                parts = ', '.join(f"PARTITION {partition_name(m)} VALUES LESS THAN ('{_next_month(m):%Y-%m-%d}')"
+                                  for m in new)
+                conn.execute(text(
+                    f'ALTER TABLE {table} REORGANIZE PARTITION {CATCH_ALL_PARTITION} INTO '
+                    f'({parts}, PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN (MAXVALUE))'))
+
+    # -- reporting ---------------------------------------------------------------
+
+    def stats(self):
+        session = self.db.session
+        count = lambda table: session.execute(select(func.count()).select_from(table)).scalar()
+        return {
+            'live_orders': count(self.orders),
+            'archived_orders': count(self.archived_orders),
+            'archived_through': session.execute(select(func.max(self.archived_orders.c.created_at))).scalar(),
+            'after_days': self.after_days,
+        }
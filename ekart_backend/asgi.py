@@ -0,0 +1,4 @@
+"""ASGI entry point for the asyncio serving path (aio.py), e.g. ``uvicorn asgi:app``."""
+from aio import create_asgi_app
+
+app = create_asgi_app()
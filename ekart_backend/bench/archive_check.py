@@ -0,0 +1,190 @@
+"""Check that archiving cold orders leaves every order view unchanged.
+
+Copies ``--db`` (a seeded SQLite file, e.g. from bench/seed.py) into a
+scratch directory and migrates it. It then records the order-history
+responses:
+
+- sampled customers' ``GET /api/orders``, with and without a date range;
+- their order details, both the customer and the admin view;
+- admin transaction pages, by offset and by cursor, with and without a range;
+- analytics over whole and partial days;
+- the admin metrics;
+- the sales and order rollups as rebuilt from the order tables.
+
+It archives the orders older than ``--after-days``, records everything
+again and compares the two. It then changes the status of an archived
+order, which has to bring the order back to the live tables and keep the
+incrementally maintained rollups equal to a rebuild. Reports live and
+archived row counts and the mean time per request before and after. Exits
+non-zero on any difference.
+
+    python bench/archive_check.py --db seed.sqlite --after-days 90
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import migrations  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+
+def normalise(value):
+    """Round floats so sums added up in a different order compare equal."""
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {k: normalise(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalise(v) for v in value]
+    return value
+
+
+def rollups():
+    return ([(str(r.day), round(float(r.sales), 2), r.orders)
+             for r in ekart.SalesDaily.query.order_by(ekart.SalesDaily.day)]
+            + [(r.status, r.orders) for r in ekart.OrderStatusCount.query.order_by(ekart.OrderStatusCount.status)]
+            + [(r.product_id, r.quantity) for r in ekart.ProductSales.query.order_by(ekart.ProductSales.product_id)])
+
+
+def rebuild_rollups():
+    ekart.rebuild_sales_rollups()
+    ekart.rebuild_order_rollups()
+
+
+class Recorder:
+    def __init__(self, client):
+        self.client = client
+        self.responses = {}
+        self.ms = {}
+
+    def get(self, kind, url, headers):
+        started = time.perf_counter()
+        response = self.client.get(url, headers=headers)
+        self.ms.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (url, response.status_code, response.data[:200])
+        self.responses[url + ' ' + headers['Authorization'][-12:]] = normalise(response.get_json())
+        return response.get_json()
+
+
+def record(client, customers, orders, admin, now):
+    rec = Recorder(client)
+    month_ago = (now - timedelta(days=30)).isoformat()
+    year_ago = (now - timedelta(days=365)).isoformat()
+    for headers in customers.values():
+        rec.get('orders', '/api/orders', headers)
+        rec.get('orders (range)', f'/api/orders?from={year_ago}&to={month_ago}', headers)
+    for order_id, user_id in orders:
+        rec.get('order detail', f'/api/orders/{order_id}', customers[user_id])
+        rec.get('admin order detail', f'/api/admin/transactions/{order_id}', admin)
+    for query in ('', f'&from={month_ago}', f'&from={year_ago}&to={month_ago}'):
+        for page in (1, 2, 5):
+            rec.get('transactions (offset)', f'/api/admin/transactions?page={page}{query}', admin)
+        cursor = ''
+        for _ in range(5):
+            body = rec.get('transactions (cursor)', f'/api/admin/transactions?cursor={cursor}{query}', admin)
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+    rec.get('analytics', '/api/admin/analytics', admin)
+    for days in (400, 200, 100, 20):
+        start = (now - timedelta(days=days, hours=7)).isoformat()
+        end = (now - timedelta(days=days // 2, hours=3)).isoformat()
+        rec.get('analytics (partial days)', f'/api/admin/analytics?from={start}&to={end}', admin)
+    rec.get('metrics', '/api/admin/metrics', admin)
+    return rec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='seed.sqlite')
+    parser.add_argument('--after-days', type=float, default=90)
+    parser.add_argument('--customers', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='ekart-archive-')
+    path = os.path.join(scratch, 'db.sqlite')
+    shutil.copyfile(args.db, path)
+    app = ekart.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+        'CATALOG_CACHE_BACKEND': 'none',
+        'METRICS_ENABLED': False,
+        'SLOW_REQUEST_MS': None,
+        'ORDER_ARCHIVE_INTERVAL': 0,
+        'ORDER_ARCHIVE_AFTER_DAYS': args.after_days,
+        'ORDER_ARCHIVE_BATCH_SIZE': args.batch_size,
+    })
+    rng = random.Random(args.seed)
+    with app.app_context():
+        migrations.upgrade(ekart.db, log=lambda *a: None)
+        rebuild_rollups()
+        admin_user = ekart.User.query.filter_by(role='admin').first()
+        sample = ekart.db.session.query(ekart.Order.order_id, ekart.Order.user_id).all()
+        if admin_user is None or not sample:
+            raise SystemExit('seed orders and an admin first (bench/seed.py)')
+        sample = rng.sample(sample, min(len(sample), args.customers))
+
+        def headers(user):
+            return {'Authorization': 'Bearer ' + create_access_token(
+                identity=str(user.user_id), additional_claims={'username': user.username, 'role': user.role})}
+        customers = {user_id: headers(ekart.db.session.get(ekart.User, user_id)) for _, user_id in sample}
+        admin = headers(admin_user)
+        rollups_before = rollups()
+        now = datetime.utcnow()
+
+    client = app.test_client()
+    before = record(client, customers, sample, admin, now)
+    with app.app_context():
+        started = time.perf_counter()
+        moved = ekart.order_archive.archive()
+        seconds = time.perf_counter() - started
+        stats = ekart.order_archive.stats()
+        rebuild_rollups()
+        rollups_after = rollups()
+    print(f"archived {moved} orders in {seconds:.2f}s; {stats['live_orders']} live, "
+          f"{stats['archived_orders']} archived, newest archived {stats['archived_through']}")
+    after = record(client, customers, sample, admin, now)
+
+    failures = 0
+    print(f"{'requests':<28}{'count':>7}{'before ms':>11}{'after ms':>10}")
+    for kind, samples in before.ms.items():
+        print(f"{kind:<28}{len(samples):>7}{sum(samples) / len(samples):>11.2f}"
+              f"{sum(after.ms[kind]) / len(after.ms[kind]):>10.2f}")
+    differing = [key for key in before.responses if before.responses[key] != after.responses.get(key)]
+    for key in differing[:10]:
+        print('DIFFERENT:', key)
+    failures += len(differing)
+    if rollups_before != rollups_after:
+        print('DIFFERENT: rollups rebuilt from the archive')
+        failures += 1
+    print(f'responses compared: {len(before.responses)}, different: {len(differing)}')
+
+    with app.app_context():
+        archived = ekart.ArchivedOrder.query.filter_by(status='delivered').first()
+    if archived is not None:
+        response = client.patch(f'/api/orders/{archived.order_id}/status', headers=admin, json={'status': 'cancelled'})
+        with app.app_context():
+            restored = ekart.db.session.get(ekart.Order, archived.order_id)
+            incremental = rollups()
+            rebuild_rollups()
+            ok = (response.status_code == 200 and restored is not None and restored.status == 'cancelled'
+                  and ekart.ArchivedOrder.query.filter_by(order_id=archived.order_id).first() is None
+                  and incremental == rollups())
+        print(f'status change on archived order {archived.order_id}:', 'restored' if ok else 'FAIL')
+        failures += not ok
+
+    shutil.rmtree(scratch, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
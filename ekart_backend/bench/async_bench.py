@@ -0,0 +1,256 @@
+"""Compare concurrent connections per worker: threaded gunicorn vs the asyncio app.
+
+Starts one worker of each serving mode on a local port, against the database
+configured through the environment:
+
+- ``threaded``: gunicorn with one gthread worker and ``--threads`` threads;
+- ``async``: uvicorn serving ``aio.create_asgi_app`` with one worker.
+
+Both use a ``--pool``-connection pool. For each ``--connections`` count,
+that many keep-alive connections (coroutines of one asyncio client, so the
+client side is cheap) repeatedly request a mix of the async endpoints:
+listing pages, product detail, a customer's cart and the admin metrics.
+Reports requests/s, p50/p99 latency and errors per mode. The catalog cache
+is off, so every request reaches the database.
+
+The gap between the modes comes from time spent waiting on the database,
+and a local SQLite file barely waits. ``--db-latency`` adds that many
+milliseconds to every SQLite statement (a sleep in the connection's trace
+callback, on the thread that runs the statement), which is roughly what a
+database across the network costs:
+
+    python bench/async_bench.py --connections 8 32 128 256 --db-latency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+MIX = (('products', 4), ('detail', 4), ('cart', 2), ('metrics', 1))
+
+
+# -- server side (``--serve``) -----------------------------------------------
+
+def add_sqlite_latency(seconds):
+    """Sleep ``seconds`` before every statement on every SQLite connection."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.util import await_only
+
+    def trace(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(Engine, 'connect')
+    def _on_connect(dbapi_connection, record):
+        conn = getattr(dbapi_connection, 'driver_connection', dbapi_connection)
+        if hasattr(conn, '_execute'):  # aiosqlite: the sqlite3 connection lives in its thread
+            await_only(conn._execute(conn._conn.set_trace_callback, trace))
+        elif hasattr(conn, 'set_trace_callback'):
+            conn.set_trace_callback(trace)
+
+
+def serve(args):
+    from config import database_url, engine_options
+    url = database_url()
+    config = {
+        'CATALOG_CACHE_BACKEND': 'none',
+        'METRICS_ENABLED': False,
+        'SLOW_REQUEST_MS': None,
+        'SQLALCHEMY_ENGINE_OPTIONS': {**engine_options(url), 'pool_size': args.pool, 'max_overflow': 0,
+                                      'pool_timeout': 60},
+    }
+    if args.db_latency and url.startswith('sqlite'):
+        add_sqlite_latency(args.db_latency / 1000)
+    if args.serve == 'async':
+        import uvicorn
+        from aio import create_asgi_app
+        uvicorn.run(create_asgi_app(config), host='127.0.0.1', port=args.port, backlog=4096,
+                    log_level='warning', access_log=False)
+    else:
+        from serve import Server
+        Server({'bind': f'127.0.0.1:{args.port}', 'workers': 1, 'threads': args.threads,
+                'worker_class': 'gthread', 'backlog': 4096, 'keepalive': 30, 'loglevel': 'warning'},
+               config).run()
+    return 0
+
+
+# -- client side -------------------------------------------------------------
+
+def fixtures():
+    """Product ids, bearer tokens for up to 100 customers and one for an admin."""
+    import app as ekart
+    from flask_jwt_extended import create_access_token
+    app = ekart.create_app({'CATALOG_CACHE_BACKEND': 'none', 'METRICS_ENABLED': False})
+    with app.app_context():
+        product_ids = [pid for (pid,) in ekart.db.session.query(ekart.Product.product_id).limit(2000)]
+        customers = ekart.User.query.filter_by(role='customer').limit(100).all()
+        admin = ekart.User.query.filter_by(role='admin').first()
+        if not product_ids or not customers or admin is None:
+            raise SystemExit('seed products, customers and an admin first (bench/seed.py)')
+
+        def token(user):
+            return create_access_token(identity=str(user.user_id),
+                                       additional_claims={'username': user.username, 'role': user.role},
+                                       expires_delta=False)
+        return product_ids, [token(u) for u in customers], token(admin)
+
+
+def request_for(kind, rng, product_ids, customer, admin):
+    if kind == 'products':
+        return f'/api/products?page={rng.randint(1, 5)}', None
+    if kind == 'detail':
+        return f'/api/products/{rng.choice(product_ids)}', None
+    if kind == 'cart':
+        return '/api/cart', customer
+    return '/api/admin/metrics', admin
+
+
+async def fetch(reader, writer, path, token):
+    head = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+    if token:
+        head += f'Authorization: Bearer {token}\r\n'
+    writer.write((head + '\r\n').encode())
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            close = value.strip().lower() == 'close'
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), close
+
+
+async def connection(port, deadline, fixture, seed, latencies):
+    product_ids, customers, admin = fixture
+    rng = random.Random(seed)
+    kinds = [kind for kind, weight in MIX for _ in range(weight)]
+    customer = rng.choice(customers)
+    errors = 0
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path, token = request_for(rng.choice(kinds), rng, product_ids, customer, admin)
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status, close = await fetch(reader, writer, path, token)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+            continue
+        if status != 200:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+    return errors
+
+
+async def load(port, connections, duration, fixture):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(connection(port, deadline, fixture, i, latencies) for i in range(connections)))
+    return latencies, sum(errors), time.perf_counter() - started
+
+
+def wait_ready(port, timeout=60):
+    import http.client
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/ping')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def percentile(sorted_seconds, q):
+    if not sorted_seconds:
+        return float('nan')
+    return sorted_seconds[min(len(sorted_seconds) - 1, int(len(sorted_seconds) * q))] * 1e3
+
+
+def run_mode(mode, args, fixture):
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(args.port),
+         '--threads', str(args.threads), '--pool', str(args.pool), '--db-latency', str(args.db_latency)],
+        cwd=HERE, stdout=subprocess.DEVNULL,
+    )
+    rows = []
+    try:
+        if not wait_ready(args.port):
+            raise SystemExit(f'{mode} server did not start')
+        asyncio.run(load(args.port, 8, args.warmup, fixture))
+        for connections in args.connections:
+            latencies, errors, wall = asyncio.run(load(args.port, connections, args.duration, fixture))
+            latencies.sort()
+            rows.append({'mode': mode, 'connections': connections, 'requests': len(latencies), 'errors': errors,
+                         'rps': len(latencies) / wall, 'p50_ms': percentile(latencies, 0.50),
+                         'p99_ms': percentile(latencies, 0.99)})
+            r = rows[-1]
+            print(f"{mode:<10}{connections:>12}{r['rps']:>10.1f}{r['p50_ms']:>9.2f}{r['p99_ms']:>10.2f}{errors:>8}",
+                  flush=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=('threaded', 'async'), default=['threaded', 'async'])
+    parser.add_argument('--connections', type=int, nargs='+', default=[8, 32, 128, 256])
+    parser.add_argument('--threads', type=int, default=32, help='gthread threads in threaded mode')
+    parser.add_argument('--pool', type=int, default=32, help='database connections per worker, both modes')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='ms added to every SQLite statement')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--out', help='write results as JSON to this file')
+    parser.add_argument('--serve', choices=('threaded', 'async'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args)
+
+    fixture = fixtures()
+    print(f'threads: {args.threads}  pool: {args.pool}  db latency: {args.db_latency:g} ms  '
+          f"mix: {', '.join(f'{k} x{w}' for k, w in MIX)}")
+    print(f"{'mode':<10}{'connections':>12}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>10}{'errors':>8}")
+    rows = []
+    for mode in args.modes:
+        rows += run_mode(mode, args, fixture)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'threads': args.threads, 'pool': args.pool, 'db_latency_ms': args.db_latency,
+                       'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Measure the per-request cost of the token revocation check.
+
+Fills the revocation maps with ``--revoked`` users and token ids, then times
+``Revocations.is_revoked`` for a token that is not revoked (the common case)
+and a primary-key User lookup, the per-request alternative it replaces,
+against the database configured through the environment. Finally times
+``GET /api/profile`` through the test client.
+
+    DATABASE_URL=sqlite:///seed.sqlite python bench/auth_bench.py --revoked 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+from flask_jwt_extended import create_access_token, decode_token  # noqa: E402
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--revoked', type=int, default=10000, help='revoked users and token ids to preload')
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = ekart.create_app({'METRICS_ENABLED': False})
+    revocations = ekart.revocations
+    now = time.time()
+    for i in range(args.revoked):
+        revocations.apply(f'user|{1_000_000 + i}|{now!r}')
+        revocations.apply(f'jti|{uuid.uuid4()}|{now + 3600!r}')
+
+    with app.app_context():
+        user_id = ekart.db.session.query(ekart.User.user_id).limit(1).scalar() or 1
+        token = create_access_token(identity=str(user_id), additional_claims={'username': 'bench', 'role': 'customer'})
+        payload = decode_token(token)
+        print(f"{'check':<28}{'median us':>11}{'p99 us':>9}")
+        median, p99 = timed(lambda: revocations.is_revoked(payload), args.iterations)
+        print(f"{'blocklist lookup':<28}{median:11.2f}{p99:9.2f}")
+
+        def user_lookup():
+            ekart.db.session.get(ekart.User, user_id)
+            ekart.db.session.expire_all()
+        median, p99 = timed(user_lookup, max(1, args.iterations // 10))
+        print(f"{'User lookup (replaced)':<28}{median:11.2f}{p99:9.2f}")
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/profile', headers=headers).status_code == 200
+    median, p99 = timed(lambda: client.get('/api/profile', headers=headers), max(1, args.iterations // 10))
+    print(f"{'GET /api/profile':<28}{median:11.2f}{p99:9.2f}")
+    print(revocations.stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
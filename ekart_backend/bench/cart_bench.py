@@ -0,0 +1,114 @@
+"""Measure cart operations per second for each cart store.
+
+For each ``CART_STORE`` backend, ``--users`` users (taken from the database
+configured through the environment, e.g. seeded by bench/seed.py) each run
+``--rounds`` rounds of add, add again, update, view and remove through the
+test client, so JWT handling and routing are included. The ``redis`` store
+uses ``--redis-url``, or fakeredis when that is installed and no URL is
+given. After the run, a final flush writes the key-value carts to the
+``cart`` table. Cart rows of the users involved are deleted before each
+store runs.
+
+    DATABASE_URL=sqlite:///seed.sqlite python bench/cart_bench.py --users 50 --rounds 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import cart_store  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+OPERATIONS = ('add', 'add again', 'update', 'view', 'remove')
+
+
+def backend_for(store, redis_url):
+    """Config for ``store``; the redis backend is swapped in after create_app
+    when running against fakeredis."""
+    if store != 'redis':
+        return {'CART_STORE': store}, None
+    if redis_url:
+        return {'CART_STORE': 'redis', 'CART_STORE_URL': redis_url}, None
+    try:
+        import fakeredis
+    except ImportError:
+        return None, None
+    return {'CART_STORE': 'memory'}, cart_store.RedisBackend(fakeredis.FakeRedis())
+
+
+def run(store, args):
+    config, backend = backend_for(store, args.redis_url)
+    if config is None:
+        print(f'{store:<8}skipped: give --redis-url or install fakeredis')
+        return
+    app = ekart.create_app(dict(config, METRICS_ENABLED=False, POPULARITY_TRACK_EVENTS=False,
+                                CART_FLUSH_INTERVAL=args.flush_interval))
+    if backend is not None:
+        ekart.cart_store.backend = backend
+    with app.app_context():
+        users = [u for (u,) in ekart.db.session.query(ekart.User.user_id).order_by(ekart.User.user_id).limit(args.users)]
+        products = [p for (p,) in ekart.db.session.query(ekart.Product.product_id)
+                    .filter(ekart.Product.inventory >= 10).order_by(ekart.Product.product_id).limit(args.products)]
+        if not users or not products:
+            raise SystemExit('seed users and products first (bench/seed.py)')
+        ekart.Cart.query.filter(ekart.Cart.user_id.in_(users)).delete(synchronize_session=False)
+        ekart.db.session.commit()
+        headers = [{'Authorization': 'Bearer ' + create_access_token(
+            identity=str(u), additional_claims={'username': 'bench', 'role': 'customer'})} for u in users]
+
+    client = app.test_client()
+    samples = {op: [] for op in OPERATIONS}
+
+    def timed(op, call):
+        t0 = time.perf_counter()
+        response = call()
+        samples[op].append(time.perf_counter() - t0)
+        assert response.status_code == 200, (op, response.status_code, response.data[:200])
+
+    started = time.perf_counter()
+    for r in range(args.rounds):
+        for i, h in enumerate(headers):
+            pid = products[(i + r) % len(products)]
+            timed('add', lambda: client.post('/api/cart', headers=h, json={'product_id': pid, 'quantity': 1}))
+            timed('add again', lambda: client.post('/api/cart', headers=h, json={'product_id': pid, 'quantity': 1}))
+            timed('update', lambda: client.put('/api/cart', headers=h, json={'product_id': pid, 'quantity': 3}))
+            timed('view', lambda: client.get('/api/cart', headers=h))
+            if r % 2:
+                timed('remove', lambda: client.delete(f'/api/cart/{pid}', headers=h))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        flushed = ekart.cart_store.flush()
+        flush_ms = (time.perf_counter() - t0) * 1000
+
+    total = sum(len(s) for s in samples.values())
+    for op in OPERATIONS:
+        s = sorted(samples[op])
+        print(f'{store:<8}{op:<11}{len(s) / sum(s):>10,.0f}{statistics.median(s) * 1000:>9.2f}'
+              f'{s[int(len(s) * 0.99)] * 1000:>9.2f}')
+    print(f"{store:<8}{'all':<11}{total / elapsed:>10,.0f}   final flush: {flushed} carts in {flush_ms:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stores', nargs='+', default=['sql', 'memory', 'redis'], choices=['sql', 'memory', 'redis'])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--products', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    print(f"{'store':<8}{'operation':<11}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for store in args.stores:
+        run(store, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Concurrent checkout stress test for place_order.
+
+Creates one product with a fixed stock, gives each of N users a cart line for
+it, then fires all checkouts at once from a thread pool against the database
+configured in app.py. Fails if more units were sold than were in stock.
+
+    python bench/checkout_stress.py --users 200 --stock 50 --threads 32
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app, db, Cart, OrderItem, Product, User  # noqa: E402
+
+app = create_app()
+
+
+def setup(n_users, stock, quantity):
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        product = Product(name=f'stress-{tag}', description='checkout stress test', price=1, inventory=stock)
+        db.session.add(product)
+        users = [User(username=f'stress-{tag}-{i}', password_hash='!', role='customer') for i in range(n_users)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all(Cart(user_id=u.user_id, product_id=product.product_id, quantity=quantity) for u in users)
+        db.session.commit()
+        tokens = [create_access_token(identity=str(u.user_id), additional_claims={'username': u.username, 'role': 'customer'})
+                  for u in users]
+        return product.product_id, tokens
+
+
+def checkout(token):
+    client = app.test_client()
+    r = client.post('/api/orders', headers={'Authorization': f'Bearer {token}'})
+    return r.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--quantity', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    product_id, tokens = setup(args.users, args.stock, args.quantity)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = list(pool.map(checkout, tokens))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        remaining = db.session.get(Product, product_id).inventory
+        sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+            .filter(OrderItem.product_id == product_id).scalar()
+        orders = db.session.query(db.func.count(db.distinct(OrderItem.order_id))) \
+            .filter(OrderItem.product_id == product_id).scalar()
+
+    placed = codes.count(201)
+    print(f'checkouts: {len(codes)}  placed: {placed}  rejected: {codes.count(400) + codes.count(409)}  '
+          f'errors: {len(codes) - placed - codes.count(400) - codes.count(409)}')
+    print(f'stock: {args.stock}  sold: {sold}  remaining: {remaining}  orders: {orders}')
+    print(f'elapsed: {elapsed:.3f}s  orders/s: {placed / elapsed:.1f}  checkouts/s: {len(codes) / elapsed:.1f}')
+
+    expected_sold = min(args.stock // args.quantity, args.users) * args.quantity
+    if remaining < 0 or sold + remaining != args.stock or sold != expected_sold or orders != placed:
+        print('FAIL: inventory accounting mismatch (oversold or lost update)')
+        return 1
+    print('OK: no overselling')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Diff two bench/load_test.py result files and flag regressions.
+
+A scenario regresses when its p95 latency grows by more than ``--threshold``
+percent, its throughput drops by more than that, or it issues more SQL
+statements per request than before. Exits 1 if any scenario regressed.
+
+    python bench/compare.py before.json after.json --threshold 15
+"""
+import argparse
+import json
+import sys
+
+
+def _pct(old, new):
+    if old is None or new is None or old == 0:
+        return None
+    return (new - old) / old * 100.0
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed latency/throughput change in percent')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"base: {base['meta'].get('revision')} {base['meta'].get('timestamp')}  "
+          f"head: {head['meta'].get('revision')} {head['meta'].get('timestamp')}")
+    if base['meta'].get('concurrency') != head['meta'].get('concurrency'):
+        print('warning: runs used different concurrency')
+
+    print(f"{'scenario':<26}{'p50 ms':>16}{'p95 ms':>16}{'req/s':>18}{'sql/req':>14}")
+    regressions = []
+    for name, new in head['results'].items():
+        old = base['results'].get(name)
+        if old is None:
+            print(f'{name:<26} (new)')
+            continue
+        p95 = _pct(old['p95_ms'], new['p95_ms'])
+        rps = _pct(old['rps'], new['rps'])
+        reasons = []
+        if p95 is not None and p95 > args.threshold:
+            reasons.append(f'p95 +{p95:.0f}%')
+        if rps is not None and rps < -args.threshold:
+            reasons.append(f'req/s {rps:.0f}%')
+        if (old['queries_per_request'] is not None and new['queries_per_request'] is not None
+                and new['queries_per_request'] > old['queries_per_request'] + 1e-9):
+            reasons.append('more SQL')
+        if new['errors'] > old['errors']:
+            reasons.append('more errors')
+        print(f"{name:<26}"
+              f"{_fmt(old['p50_ms'], '7.2f')} {_fmt(new['p50_ms'], '7.2f')} "
+              f"{_fmt(old['p95_ms'], '7.2f')} {_fmt(new['p95_ms'], '7.2f')} "
+              f"{_fmt(old['rps'], '8.1f')} {_fmt(new['rps'], '8.1f')} "
+              f"{_fmt(old['queries_per_request'], '6.2f')} {_fmt(new['queries_per_request'], '6.2f')}"
+              f"{'  REGRESSED: ' + ', '.join(reasons) if reasons else ''}")
+        if reasons:
+            regressions.append(name)
+    for name in sorted(set(base['results']) - set(head['results'])):
+        print(f'{name:<26} (missing from head)')
+
+    print(f"{len(regressions)} regression(s): {', '.join(regressions)}" if regressions else 'no regressions')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Measure bytes sent and server CPU per request for the catalog endpoints.
+
+Runs the app in-process against the database configured through the
+environment (seed it with bench/seed.py) with the catalog cache on (or off
+with ``--no-cache``, to see what a 304 costs when the body is not cached),
+and for each endpoint times ``--iterations`` requests in four modes:
+
+``identity``   compression off, full body (the behaviour before compression
+               and ETags)
+``gzip``/``br`` full body, compressed (br needs the ``brotli`` package)
+``304``        revalidation with the ETag from a previous response
+
+Reports the response body size, CPU time per request (``process_time``,
+client and server in one process, so compare rows rather than read absolute
+numbers) and SQL statements per request. ``encode us`` is the cost of one
+uncached compression of that body; repeat requests reuse the memoised bytes.
+
+    DATABASE_URL=sqlite:///seed.sqlite python bench/compression_bench.py --iterations 500 [--no-cache]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import compression  # noqa: E402
+
+ENDPOINTS = {
+    'products_page': '/api/products',
+    'products_100': '/api/products?page_size=100',
+    'product_detail': '/api/products/1',
+    'categories': '/api/categories',
+}
+
+
+def measure(client, path, headers, iterations):
+    r = client.get(path, headers=headers)
+    assert r.status_code in (200, 304), (path, r.status_code, r.data[:200])
+    started = time.process_time()
+    for _ in range(iterations):
+        r = client.get(path, headers=headers)
+    cpu = (time.process_time() - started) / iterations
+    return r, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--no-cache', action='store_true', help='run with the catalog cache off')
+    args = parser.parse_args()
+
+    app = ekart.create_app({'QUERY_COUNT_HEADER': True,
+                            'CATALOG_CACHE_BACKEND': 'none' if args.no_cache else 'memory'})
+    client = app.test_client()
+    modes = ['identity'] + [c for c in ('gzip', 'br') if c in compression.ENCODERS] + ['304']
+    print(f"{'endpoint':<16}{'mode':<10}{'bytes':>9}{'ratio':>8}{'cpu us':>9}{'sql':>5}{'encode us':>11}")
+    for name, path in ENDPOINTS.items():
+        full = None
+        for mode in modes:
+            app.config['COMPRESS_ENABLED'] = mode != 'identity'
+            if mode == '304':
+                etag = client.get(path, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+                headers = {'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+            else:
+                headers = {'Accept-Encoding': mode}
+            r, cpu = measure(client, path, headers, args.iterations)
+            size = len(r.data)
+            full = full or size
+            encode = ''
+            if mode in ('gzip', 'br'):
+                raw = client.get(path, headers={'Accept-Encoding': 'identity'}).data
+                t0 = time.perf_counter()
+                compression.ENCODERS[mode](raw, app.config)
+                encode = f'{(time.perf_counter() - t0) * 1e6:.0f}'
+            ratio = f'{full / size:.1f}' if size else '-'
+            print(f"{name:<16}{mode:<10}{size:>9}{ratio:>8}{cpu * 1e6:>9.0f}"
+                  f"{r.headers.get('X-Query-Count', '-'):>5}{encode:>11}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
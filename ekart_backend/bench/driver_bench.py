@@ -0,0 +1,83 @@
+"""Compare MySQL drivers on the row-heavy catalog and analytics endpoints.
+
+Starts one child process per driver with ``DB_DRIVER`` set (the other DB_*
+variables are passed through, so point them at a seeded database, e.g. from
+bench/seed.py). Each child turns the catalog cache off, warms up, then times
+``--iterations`` calls of each endpoint in-process. Drivers whose package is
+not installed are reported and skipped.
+
+    DB_PASSWORD=... python bench/driver_bench.py --drivers mysqlconnector mysqldb --iterations 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    'get_products': '/api/products?page_size=100',
+    'get_products_rating': '/api/products?sort=rating&page_size=100',
+    'admin_analytics': '/api/admin/analytics?from={start}',
+}
+
+CHILD = r'''
+import json, sys, time
+from datetime import date, timedelta
+import app as ekart
+from cache import NullBackend
+from flask_jwt_extended import create_access_token
+
+iterations, days = int(sys.argv[1]), int(sys.argv[2])
+paths = json.loads(sys.argv[3])
+app = ekart.create_app()
+ekart.catalog_cache.backend = NullBackend()
+with app.app_context():
+    token = create_access_token(identity='0', additional_claims={'username': 'bench', 'role': 'admin'})
+headers = {'Authorization': f'Bearer {token}'}
+start = (date.today() - timedelta(days=days)).isoformat()
+client = app.test_client()
+result = {}
+for name, path in paths.items():
+    path = path.format(start=start)
+    for _ in range(3):
+        r = client.get(path, headers=headers)
+        assert r.status_code == 200, (path, r.status_code, r.data[:200])
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        client.get(path, headers=headers)
+        samples.append((time.perf_counter() - t0) * 1e3)
+    result[name] = samples
+print(json.dumps(result))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drivers', nargs='+', default=['mysqlconnector', 'mysqldb', 'pymysql'])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--days', type=int, default=365, help='analytics range ending today')
+    args = parser.parse_args()
+
+    print(f"{'driver':<16}{'endpoint':<22}{'median ms':>11}{'p95 ms':>9}{'min ms':>9}")
+    for driver in args.drivers:
+        env = dict(os.environ, DB_DRIVER=driver)
+        env.pop('DATABASE_URL', None)
+        proc = subprocess.run([sys.executable, '-c', CHILD, str(args.iterations), str(args.days), json.dumps(ENDPOINTS)],
+                              cwd=HERE, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            last = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            print(f'{driver:<16}skipped: {last}')
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        for name, samples in result.items():
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            print(f'{driver:<16}{name:<22}{statistics.median(samples):11.2f}{p95:9.2f}{samples[0]:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Query-plan regression check: EXPLAIN every SELECT the hot endpoints issue.
+
+Calls each endpoint in ENDPOINTS through the test client, captures the
+SELECT statements it sends, runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on
+each one with the same parameters, and fails if any of them reads a whole
+table that is not expected to. A full scan is ``type = ALL`` on MySQL, or
+``SCAN <table>`` without an index on SQLite. Reading a derived table (a
+subquery in FROM) is not one: it is MySQL's ``<derivedN>`` and SQLite's
+materialised or co-routine subquery, whose own plan is checked separately.
+The order-history views merge the live and archive tables this way, one
+page's worth of rows from each. The catalog cache is turned off so that
+every request reaches the database.
+
+Without ``--seed`` it only reads the database configured in app.py.
+``--seed N`` never writes there: it migrates a scratch database, inserts N
+products plus one user, order and cart line, checks that and then drops
+it. The scratch database is a temporary SQLite file, or ``--scratch-url``
+(an empty schema, e.g. on MySQL to check MySQL's plans). The pytest suite
+runs the same check on in-memory SQLite (tests/test_query_plans.py).
+
+    python bench/explain_check.py --seed 200 -v
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import app as ekart  # noqa: E402
+import migrations  # noqa: E402
+from cache import NullBackend  # noqa: E402
+from config import engine_options  # noqa: E402
+
+# Tables small enough (or read in full by design) that a scan is fine anywhere.
+SMALL_TABLES = {'categories', 'sales_daily', 'sales_monthly', 'order_status_counts', 'schema_migrations',
+                'popularity_state'}
+
+# (method, path, role, tables this endpoint may scan). Paths are formatted with
+# the ids found by ``fixtures``. The admin listings page through whole tables
+# in primary-key order, which is a scan by nature.
+ENDPOINTS = [
+    ('GET', '/api/products', None, {'products'}),
+    ('GET', '/api/products?page=3&page_size=10', None, {'products'}),
+    ('GET', '/api/products?sort=price_asc&cursor=', None, set()),
+    ('GET', '/api/products?sort=rating&cursor=', None, set()),
+    ('GET', '/api/products?sort=popularity&cursor=', None, set()),
+    ('GET', '/api/products?category_id={category_id}', None, set()),
+    ('GET', '/api/products?q={search_term}', None, set()),
+    ('GET', '/api/products/{product_id}', None, set()),
+    ('GET', '/api/categories', None, set()),
+    ('GET', '/api/cart', 'customer', set()),
+    ('GET', '/api/orders', 'customer', set()),
+    ('GET', '/api/orders/{order_id}', 'customer', set()),
+    ('GET', '/api/admin/metrics', 'admin', set()),
+    ('GET', '/api/admin/analytics', 'admin', set()),
+    ('GET', '/api/admin/users', 'admin', {'users'}),
+    ('GET', '/api/admin/transactions', 'admin', set()),
+    ('GET', '/api/admin/transactions/{order_id}', 'admin', set()),
+]
+
+
+def seed(n_products):
+    tag = uuid.uuid4().hex[:8]
+    category = ekart.Category(name=f'explain-{tag}')
+    ekart.db.session.add(category)
+    products = [ekart.Product(name=f'explain {tag} item {i}', description='query plan check',
+                              price=1 + i % 50, inventory=100) for i in range(n_products)]
+    ekart.db.session.add_all(products)
+    ekart.db.session.flush()
+    ekart.db.session.add_all(ekart.ProductMeta(product_id=p.product_id, rating=i % 5, popularity=i)
+                             for i, p in enumerate(products))
+    ekart.db.session.add_all(ekart.ProductCategory(product_id=p.product_id, category_id=category.category_id)
+                             for p in products[::3])
+    user = ekart.User(username=f'explain-{tag}', password_hash='!', role='customer')
+    ekart.db.session.add(user)
+    ekart.db.session.flush()
+    order = ekart.Order(user_id=user.user_id, total=products[0].price, status='paid')
+    ekart.db.session.add(order)
+    ekart.db.session.flush()
+    ekart.db.session.add(ekart.OrderItem(order_id=order.order_id, product_id=products[0].product_id,
+                                         quantity=1, price_at_purchase=products[0].price))
+    ekart.db.session.add(ekart.Cart(user_id=user.user_id, product_id=products[1].product_id, quantity=1))
+    ekart.db.session.commit()
+
+
+def fixtures():
+    """Ids to plug into ENDPOINTS, taken from whatever data the database holds."""
+    session = ekart.db.session
+    order = session.query(ekart.Order).order_by(ekart.Order.order_id.desc()).first()
+    product = session.query(ekart.Product).order_by(ekart.Product.product_id.desc()).first()
+    link = session.query(ekart.ProductCategory).first()
+    if order is None or product is None or link is None:
+        raise SystemExit('No orders/products/categories found; run with --seed N first')
+    return {
+        'order_id': order.order_id,
+        'user_id': order.user_id,
+        'product_id': product.product_id,
+        'category_id': link.category_id,
+        'search_term': product.name.split()[0],
+    }
+
+
+def explain(conn, statement, parameters):
+    """``[(table, detail), ...]`` for every full scan in the plan of ``statement``."""
+    scans = []
+    if conn.dialect.name == 'mysql':
+        for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings():
+            if row['type'] == 'ALL' and row['table'] and not row['table'].startswith('<'):
+                scans.append((row['table'], f"type=ALL rows={row['rows']} extra={row['Extra']}"))
+    else:
+        derived = set()
+        for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+            detail = row[-1]
+            if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE ')):
+                derived.add(detail.split()[1])
+            elif (detail.startswith('SCAN ') and ' USING ' not in detail and 'CONSTANT ROW' not in detail
+                  and detail.split()[1] not in derived):
+                scans.append((detail.split()[1], detail))
+    return scans
+
+
+def check(app, verbose=False, log=print):
+    """Call every endpoint in ENDPOINTS on ``app``; return the number of unexpected full scans and errors."""
+    ekart.catalog_cache.backend = NullBackend()
+    with app.app_context():
+        ekart.search_index.build(ekart._load_search_documents(None))
+        ids = fixtures()
+        headers = {
+            role: {'Authorization': 'Bearer ' + create_access_token(
+                identity=str(ids['user_id']), additional_claims={'username': 'explain', 'role': role})}
+            for role in ('customer', 'admin')
+        }
+        engine = ekart.db.engine
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    failures = 0
+    client = app.test_client()
+    try:
+        for method, path, role, allowed in ENDPOINTS:
+            path = path.format(**ids)
+            captured.clear()
+            response = client.open(path, method=method, headers=headers.get(role, {}))
+            statements = list(captured)
+            if response.status_code >= 400:
+                log(f'FAIL {method} {path}: HTTP {response.status_code}')
+                failures += 1
+                continue
+            before = failures
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    scans = [(t, d) for t, d in explain(conn, statement, parameters)
+                             if t not in SMALL_TABLES and t not in allowed]
+                    if verbose:
+                        log(f"  {' '.join(statement.split())[:160]}")
+                    for table, detail in scans:
+                        failures += 1
+                        log(f'FAIL {method} {path}: full scan of {table} ({detail})')
+                        log(f"     {' '.join(statement.split())}")
+            if failures == before:
+                log(f'ok   {method} {path}  ({len(statements)} statements)')
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0, metavar='N',
+                        help='check a scratch database seeded with N products plus one user/order/cart line')
+    parser.add_argument('--scratch-url', help='empty database to seed with --seed instead of a temporary SQLite file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every statement checked')
+    args = parser.parse_args()
+    if args.scratch_url and not args.seed:
+        parser.error('--scratch-url needs --seed')
+
+    if not args.seed:
+        failures = check(ekart.create_app(), args.verbose)
+    else:
+        scratch = None
+        url = args.scratch_url
+        if url is None:
+            scratch = tempfile.mkdtemp(prefix='ekart-explain-')
+            url = 'sqlite:///' + os.path.join(scratch, 'explain.sqlite')
+        app = ekart.create_app({'SQLALCHEMY_DATABASE_URI': url, 'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url),
+                                'SQLALCHEMY_BINDS': {}})
+        try:
+            with app.app_context():
+                migrations.upgrade(ekart.db, log=lambda *a: None)
+                seed(args.seed)
+            failures = check(app, args.verbose)
+        finally:
+            with app.app_context():
+                ekart.db.engine.dispose()
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f'{failures} unexpected full scan(s)' if failures else 'OK: no unexpected full scans')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
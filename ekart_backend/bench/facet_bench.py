@@ -0,0 +1,94 @@
+"""Measure facet index build time and facet-count latency at catalog scale.
+
+Builds the facet index from ``--products`` synthetic products spread over
+``--categories`` categories (one to three each, log-normal prices, random
+stock and ratings), with no database involved. It then times
+``FacetIndex.facets`` for a range of filter combinations, a search-restricted
+request, and the incremental updates applied after a checkout and after a
+bulk import chunk.
+
+    python bench/facet_bench.py --products 500000 --categories 40
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facets import FacetIndex, Filters  # noqa: E402
+
+
+def dataset(n, n_categories, rng):
+    products, links = [], []
+    for pid in range(1, n + 1):
+        products.append((pid, round(min(rng.lognormvariate(3.3, 0.9), 5000) + 0.99, 2),
+                         rng.choice((0, 1, 3, 10, 50)), round(rng.random() * 5, 2)))
+        for cid in rng.sample(range(1, n_categories + 1), k=rng.choice((1, 1, 2, 3))):
+            links.append((pid, cid))
+    names = {cid: f'Category {cid}' for cid in range(1, n_categories + 1)}
+    return products, links, names
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--categories', type=int, default=40)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    products, links, names = dataset(args.products, args.categories, rng)
+    index = FacetIndex()
+    t0 = time.perf_counter()
+    index.build(products, links, names)
+    print(f'build: {args.products:,} products, {len(links):,} links in {time.perf_counter() - t0:.2f}s')
+
+    hits = rng.sample(range(1, args.products + 1), 1000)
+    cases = [
+        ('no filters', Filters(), None),
+        ('one category', Filters([3]), None),
+        ('three categories', Filters([3, 7, 11]), None),
+        ('price range', Filters(min_price=20, max_price=80), None),
+        ('in stock + rating', Filters(in_stock=True, min_rating=4), None),
+        ('everything', Filters([3, 7], 10, 100, True, 3), None),
+        ('search hits + filters', Filters([3], in_stock=True), hits),
+    ]
+    print(f"{'facets for':<24}{'p50 ms':>9}{'p99 ms':>9}{'matches':>10}")
+    for label, filters, ids in cases:
+        total = index.facets(filters, ids)['total']
+        median, p99 = timed(lambda: index.facets(filters, ids), args.iterations)
+        print(f'{label:<24}{median:9.2f}{p99:9.2f}{total:>10,}')
+
+    def checkout():
+        index.set_inventory({rng.randint(1, args.products): rng.randint(0, 5) for _ in range(3)})
+
+    def import_chunk():
+        start = rng.randint(1, args.products - 1000)
+        ids = list(range(start, start + 1000))
+        chunk = [(pid, rng.random() * 200, rng.randint(0, 9), rng.random() * 5) for pid in ids]
+        chunk_links = [(pid, rng.randint(1, args.categories)) for pid in ids]
+        index.reload(ids, lambda product_ids: (chunk, chunk_links, {}))
+
+    print(f"{'update':<24}{'p50 ms':>9}{'p99 ms':>9}")
+    for label, fn in (('checkout (3 lines)', checkout), ('import chunk (1000)', import_chunk)):
+        median, p99 = timed(fn, max(1, args.iterations // 5))
+        print(f'{label:<24}{median:9.2f}{p99:9.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
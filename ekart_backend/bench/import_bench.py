@@ -0,0 +1,71 @@
+"""Measure bulk import throughput (rows per minute) for each import kind.
+
+Generates ``--rows`` synthetic rows and imports them through the same code as
+``POST /api/admin/import/<kind>`` and ``flask bulk-import``: products twice
+(first inserts, then the same SKUs as updates), then one category link per
+product, then one inventory delta per product. Writes to the database
+configured through the environment, migrating it first, so point it at a
+scratch database:
+
+    DATABASE_URL=sqlite:////tmp/import.sqlite python bench/import_bench.py --rows 100000 --format csv
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import migrations  # noqa: E402
+
+
+def encode(rows, fmt):
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(r) + '\n' for r in rows).encode()
+    columns = list(rows[0])
+    lines = [','.join(columns)] + [','.join(str(r[c]) for c in columns) for r in rows]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def datasets(n, prefix, rng):
+    products = [{'sku': f'{prefix}-{i:07d}', 'name': f'Imported item {i}', 'price': f'{rng.randint(100, 99999) / 100:.2f}',
+                 'inventory': rng.randint(0, 500), 'description': f'Supplier item number {i}',
+                 'image_url': f'https://img.example.com/{prefix}/{i}.jpg'} for i in range(n)]
+    updates = [dict(p, price=f"{float(p['price']) + 1:.2f}") for p in products]
+    links = [{'sku': p['sku'], 'category': f'Supplier category {i % 40}'} for i, p in enumerate(products)]
+    deltas = [{'sku': p['sku'], 'delta': rng.randint(1, 20)} for p in products]
+    return [('products (insert)', 'products', products), ('products (update)', 'products', updates),
+            ('categories', 'categories', links), ('inventory', 'inventory', deltas)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    app = ekart.create_app({'BULK_CHUNK_SIZE': args.chunk_size, 'METRICS_ENABLED': False})
+    rng = random.Random(args.seed)
+    prefix = f'B{int(time.time())}'
+    print(f"{'import':<20}{'rows':>9}{'seconds':>9}{'rows/min':>12}{'failed':>8}")
+    with app.app_context():
+        migrations.upgrade(ekart.db, log=lambda *a: None)
+        for label, kind, rows in datasets(args.rows, prefix, rng):
+            body = encode(rows, args.format)
+            started = time.perf_counter()
+            report = ekart.bulk_import(kind, io.BytesIO(body), args.format)
+            seconds = time.perf_counter() - started
+            print(f'{label:<20}{report.rows:>9}{seconds:>9.2f}{report.rows / seconds * 60:>12,.0f}{report.failed:>8}')
+            if report.errors:
+                print('  first error:', report.errors[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
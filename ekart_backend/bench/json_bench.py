@@ -0,0 +1,160 @@
+"""Compare response serialisation paths for the list-heavy endpoints.
+
+Builds ``--rows`` synthetic rows in the shape of each listing endpoint
+(products, orders, users, transactions) as the driver hands them back
+(``Decimal`` and ``datetime`` values), then times three ways of getting from
+those rows to a JSON body:
+
+``copy+stdlib``   per-row dict with ``float()``/``isoformat()`` (the old
+                  handlers), encoded by Flask's default provider
+``stdlib``        projection dicts encoded by FastJSONProvider on the stdlib
+                  encoder
+``orjson``        the same on orjson (skipped if it is not installed)
+
+With ``--endpoints`` it also times the real endpoints in-process through the
+test client under each ``JSON_ENCODER`` against the configured database.
+
+    python bench/json_bench.py --rows 100 --iterations 2000
+    DATABASE_URL=sqlite:///seed.sqlite python bench/json_bench.py --endpoints
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import FastJSONProvider  # noqa: E402
+
+ENDPOINTS = {
+    'get_products': '/api/products?page_size=100',
+    'list_orders': '/api/orders',
+    'admin_users_list': '/api/admin/users',
+    'admin_transactions': '/api/admin/transactions?page_size=100',
+}
+
+
+def sample_rows(n):
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    products = [(i, f'Product {i}', f'Description of product {i} ' * 4, Decimal(f'{i % 500}.99'), i % 37,
+                 f'https://img.example.com/{i}.jpg', 3.5 + (i % 15) / 10, i * 7) for i in range(1, n + 1)]
+    orders = [(i, 'PLACED', Decimal(f'{i * 13 % 900}.50'), base + timedelta(minutes=i)) for i in range(1, n + 1)]
+    users = [(i, f'user{i:06d}', 'customer', True) for i in range(1, n + 1)]
+    transactions = [(i, i % 50, f'user{i % 50:06d}', 'PLACED', Decimal(f'{i * 13 % 900}.50'),
+                     base + timedelta(minutes=i)) for i in range(1, n + 1)]
+    return {
+        'products': (products, ['product_id', 'name', 'description', 'price', 'inventory', 'image_url',
+                                'rating', 'popularity']),
+        'orders': (orders, ['order_id', 'status', 'total', 'created_at']),
+        'users': (users, ['user_id', 'username', 'role', 'is_active']),
+        'transactions': (transactions, ['order_id', 'user_id', 'username', 'status', 'total', 'created_at']),
+    }
+
+
+def _copy(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def old_path(provider, rows, keys):
+    items = [{k: _copy(v) for k, v in zip(keys, r)} for r in rows]
+    return provider.response({'items': items}).get_data()
+
+
+def projection_path(provider, rows, keys):
+    items = [dict(zip(keys, r)) for r in rows]
+    return provider.response({'items': items}).get_data()
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def encoder_paths():
+    app = Flask(__name__)
+    paths = [('copy+stdlib', old_path, DefaultJSONProvider(app))]
+    app.config['JSON_ENCODER'] = 'stdlib'
+    paths.append(('stdlib', projection_path, FastJSONProvider(app)))
+    app.config['JSON_ENCODER'] = 'auto'
+    fast = FastJSONProvider(app)
+    if fast.backend == 'orjson':
+        paths.append(('orjson', projection_path, fast))
+    else:
+        print('orjson not installed; skipping')
+    return app, paths
+
+
+def bench_encoders(n, iterations):
+    app, paths = encoder_paths()
+    print(f"{'shape':<14}{'path':<14}{'median us':>11}{'speed-up':>10}{'bytes':>9}")
+    with app.app_context():
+        for shape, (rows, keys) in sample_rows(n).items():
+            baseline = None
+            for name, fn, provider in paths:
+                median = timed(lambda: fn(provider, rows, keys), iterations)
+                baseline = baseline or median
+                size = len(fn(provider, rows, keys))
+                print(f'{shape:<14}{name:<14}{median:11.1f}{baseline / median:10.2f}{size:9}')
+
+
+def bench_endpoints(iterations):
+    import app as ekart
+    from cache import NullBackend
+    from flask_jwt_extended import create_access_token
+
+    print(f"{'endpoint':<22}{'encoder':<10}{'median ms':>11}")
+    for encoder in ('stdlib', 'orjson'):
+        try:
+            app = ekart.create_app({'JSON_ENCODER': encoder, 'METRICS_ENABLED': False})
+        except ImportError:
+            print(f'{encoder}: not installed; skipping')
+            continue
+        ekart.catalog_cache.backend = NullBackend()
+        with app.app_context():
+            admin = ekart.User.query.filter_by(role='admin').first()
+            customer = ekart.db.session.query(ekart.Order.user_id).limit(1).scalar()
+            tokens = {
+                'admin': create_access_token(identity=str(admin.user_id if admin else 0),
+                                             additional_claims={'username': 'bench', 'role': 'admin'}),
+                'customer': create_access_token(identity=str(customer or 0),
+                                                additional_claims={'username': 'bench', 'role': 'customer'}),
+            }
+        client = app.test_client()
+        for name, path in ENDPOINTS.items():
+            token = tokens['customer' if name == 'list_orders' else 'admin']
+            headers = {'Authorization': f'Bearer {token}'}
+            r = client.get(path, headers=headers)
+            assert r.status_code == 200, (path, r.status_code, r.data[:200])
+            median = timed(lambda: client.get(path, headers=headers), iterations) / 1e3
+            print(f'{name:<22}{encoder:<10}{median:11.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--endpoints', action='store_true', help='also time the endpoints against the database')
+    args = parser.parse_args()
+    bench_encoders(args.rows, args.iterations)
+    if args.endpoints:
+        print()
+        bench_endpoints(max(1, args.iterations // 10))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""Load test every API route and report latency percentiles, throughput and SQL statements per request.
+
+Runs each scenario in SCENARIOS for ``--requests`` requests spread over
+``--concurrency`` threads, either in-process through the WSGI test client
+(default, against the database configured in app.py) or over HTTP against a
+running server (``--url``). Expects data from bench/seed.py: it logs in as the
+seeded customers and admin and discovers product, category and order ids
+through the API.
+
+Statements per request come from the ``X-Query-Count`` response header, which
+the in-process mode switches on; for ``--url`` start the server with
+``QUERY_COUNT_HEADER = True``. Write results with ``--out`` and diff two runs
+with bench/compare.py.
+
+    python bench/seed.py && python bench/load_test.py --concurrency 8 --out before.json
+    python bench/load_test.py --url http://127.0.0.1:5000 --only 'products|cart'
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class WsgiClient:
+    """Calls the app in-process through a per-thread Flask test client."""
+
+    def __init__(self):
+        from app import create_app
+        app = create_app({'QUERY_COUNT_HEADER': True})
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        r = client.open(path, method=method, headers=headers, json=body)
+        return r.status_code, r.headers.get('X-Query-Count'), r.data
+
+
+class HttpClient:
+    """Calls a running server over per-thread keep-alive HTTP connections."""
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in (0, 1):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                r = conn.getresponse()
+                data = r.read()
+                return r.status, r.getheader('X-Query-Count'), data
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+class Context:
+    """Tokens and ids discovered through the API before the timed runs."""
+
+    def __init__(self, client, customers, password):
+        self.client = client
+        self._names = itertools.count()
+        self.tag = f'{os.getpid()}-{int(time.time())}'
+        self.password = password
+        self.customers = []
+        for i in range(1, customers + 1):
+            username = f'user{i:06d}'
+            token = self.login(username)
+            if token:
+                self.customers.append((username, token))
+        if not self.customers:
+            raise SystemExit('Could not log in as any seeded customer; run bench/seed.py first')
+        self.admin = self.login('admin001')
+        if not self.admin:
+            raise SystemExit('Could not log in as admin001; run bench/seed.py first')
+
+        products = self.get('/api/products?sort=popularity&page_size=100')['items']
+        self.product_ids = [p['product_id'] for p in products]
+        self.in_stock = [p['product_id'] for p in products if p['inventory'] > 100] or self.product_ids
+        self.search_terms = sorted({w.lower() for p in products for w in p['name'].split() if not w.isdigit()})
+        self.category_ids = [c['category_id'] for c in self.get('/api/categories')]
+        self.orders = {}
+        for username, token in self.customers:
+            self.orders[token] = [o['order_id'] for o in self.get('/api/orders', token)]
+        self.all_orders = [oid for ids in self.orders.values() for oid in ids]
+        if not self.product_ids or not self.all_orders:
+            raise SystemExit('No products or orders found; run bench/seed.py first')
+
+    def get(self, path, token=None):
+        status, _, data = self.client.request('GET', path, token)
+        if status != 200:
+            raise SystemExit(f'GET {path} returned {status} during setup')
+        return json.loads(data)
+
+    def login(self, username):
+        status, _, data = self.client.request('POST', '/api/login', body={'username': username, 'password': self.password})
+        return json.loads(data)['access_token'] if status == 200 else None
+
+    def new_username(self):
+        return f'load-{self.tag}-{next(self._names)}'
+
+
+# -- scenarios ------------------------------------------------------------
+# Each prepare(ctx, rng) does any untimed setup and returns the timed request
+# as (method, path, token, body).
+
+def _customer(ctx, rng):
+    return rng.choice(ctx.customers)[1]
+
+
+def _deactivate(ctx, rng):
+    username = ctx.new_username()
+    ctx.client.request('POST', '/api/register', body={'username': username, 'password': ctx.password})
+    return 'POST', '/api/account/deactivate', ctx.login(username), None
+
+
+def _order_pay(ctx, rng):
+    token = rng.choice([t for t, ids in ctx.orders.items() if ids])
+    order_id = rng.choice(ctx.orders[token])
+    ctx.client.request('PATCH', f'/api/orders/{order_id}/status', ctx.admin, {'status': 'pending'})
+    return 'POST', f'/api/orders/{order_id}/pay', token, None
+
+
+def _checkout(ctx, rng):
+    token = _customer(ctx, rng)
+    for pid in rng.sample(ctx.in_stock, k=min(len(ctx.in_stock), rng.randint(1, 3))):
+        ctx.client.request('POST', '/api/cart', token, {'product_id': pid, 'quantity': 1})
+    return 'POST', '/api/orders', token, None
+
+
+def _cart_update(ctx, rng):
+    token, pid = _customer(ctx, rng), rng.choice(ctx.in_stock)
+    ctx.client.request('POST', '/api/cart', token, {'product_id': pid, 'quantity': 1})
+    return 'PUT', '/api/cart', token, {'product_id': pid, 'quantity': rng.randint(1, 3)}
+
+
+def _cart_delete(ctx, rng):
+    token, pid = _customer(ctx, rng), rng.choice(ctx.in_stock)
+    ctx.client.request('POST', '/api/cart', token, {'product_id': pid, 'quantity': 1})
+    return 'DELETE', f'/api/cart/{pid}', token, None
+
+
+def _own_order(ctx, rng):
+    token = rng.choice([t for t, ids in ctx.orders.items() if ids])
+    return 'GET', f'/api/orders/{rng.choice(ctx.orders[token])}', token, None
+
+
+# (name, prepare, accepted statuses, request cap or None)
+SCENARIOS = [
+    ('ping', lambda ctx, rng: ('GET', '/ping', None, None), {200}, None),
+    ('health', lambda ctx, rng: ('GET', '/health', None, None), {200}, None),
+    ('register', lambda ctx, rng: ('POST', '/api/register', None,
+                                   {'username': ctx.new_username(), 'password': ctx.password}), {201}, 200),
+    ('admin_register', lambda ctx, rng: ('POST', '/api/admin/register', None,
+                                         {'username': ctx.new_username(), 'password': ctx.password}), {201}, 200),
+    ('login', lambda ctx, rng: ('POST', '/api/login', None,
+                                {'username': rng.choice(ctx.customers)[0], 'password': ctx.password}), {200}, 200),
+    ('profile', lambda ctx, rng: ('GET', '/api/profile', _customer(ctx, rng), None), {200}, None),
+    ('deactivate', _deactivate, {200}, 50),
+    ('products', lambda ctx, rng: ('GET', '/api/products', None, None), {200}, None),
+    ('products_page', lambda ctx, rng: ('GET', f'/api/products?page={rng.randint(1, 20)}', None, None), {200}, None),
+    ('products_price', lambda ctx, rng: ('GET', '/api/products?sort=price_asc&cursor=', None, None), {200}, None),
+    ('products_rating', lambda ctx, rng: ('GET', '/api/products?sort=rating&cursor=', None, None), {200}, None),
+    ('products_popularity', lambda ctx, rng: ('GET', '/api/products?sort=popularity&cursor=', None, None), {200}, None),
+    ('products_category', lambda ctx, rng: ('GET', f'/api/products?category_id={rng.choice(ctx.category_ids)}',
+                                            None, None), {200}, None),
+    ('products_search', lambda ctx, rng: ('GET', f'/api/products?q={rng.choice(ctx.search_terms)}', None, None),
+     {200}, None),
+    ('product_detail', lambda ctx, rng: ('GET', f'/api/products/{rng.choice(ctx.product_ids)}', None, None),
+     {200}, None),
+    ('categories', lambda ctx, rng: ('GET', '/api/categories', None, None), {200}, None),
+    ('rate', lambda ctx, rng: ('POST', f'/api/products/{rng.choice(ctx.product_ids)}/rate', _customer(ctx, rng),
+                               {'rating': rng.randint(1, 5)}), {200, 201, 409}, None),
+    ('cart', lambda ctx, rng: ('GET', '/api/cart', _customer(ctx, rng), None), {200}, None),
+    ('cart_add', lambda ctx, rng: ('POST', '/api/cart', _customer(ctx, rng),
+                                   {'product_id': rng.choice(ctx.in_stock), 'quantity': 1}), {200, 400}, None),
+    ('cart_update', _cart_update, {200}, None),
+    ('cart_delete', _cart_delete, {200}, None),
+    ('checkout', _checkout, {201, 400, 409}, None),
+    ('orders', lambda ctx, rng: ('GET', '/api/orders', _customer(ctx, rng), None), {200}, None),
+    ('order_detail', _own_order, {200}, None),
+    ('order_pay', _order_pay, {200}, None),
+    ('order_status', lambda ctx, rng: ('PATCH', f'/api/orders/{rng.choice(ctx.all_orders)}/status', ctx.admin,
+                                       {'status': rng.choice(['shipped', 'delivered'])}), {200}, None),
+    ('admin_metrics', lambda ctx, rng: ('GET', '/api/admin/metrics', ctx.admin, None), {200}, None),
+    ('admin_analytics', lambda ctx, rng: ('GET', '/api/admin/analytics', ctx.admin, None), {200}, None),
+    ('admin_users', lambda ctx, rng: ('GET', '/api/admin/users', ctx.admin, None), {200}, None),
+    ('admin_users_csv', lambda ctx, rng: ('GET', '/api/admin/users?format=csv', ctx.admin, None), {200}, 50),
+    ('admin_transactions', lambda ctx, rng: ('GET', '/api/admin/transactions', ctx.admin, None), {200}, None),
+    ('admin_transactions_csv', lambda ctx, rng: ('GET', '/api/admin/transactions?format=csv', ctx.admin, None),
+     {200}, 20),
+    ('admin_transaction_detail', lambda ctx, rng: ('GET', f'/api/admin/transactions/{rng.choice(ctx.all_orders)}',
+                                                   ctx.admin, None), {200}, None),
+    ('admin_cache_stats', lambda ctx, rng: ('GET', '/api/admin/cache/stats', ctx.admin, None), {200}, None),
+    ('admin_inventory', lambda ctx, rng: ('PATCH', f'/api/admin/products/{rng.choice(ctx.in_stock)}/inventory',
+                                          ctx.admin, {'inventory': rng.randint(1000, 100000)}), {200}, None),
+    ('admin_create_product', lambda ctx, rng: ('POST', '/api/admin/products', ctx.admin,
+                                               {'name': f'Load test item {ctx.new_username()}', 'price': 9.99,
+                                                'inventory': 10, 'description': 'created by load_test'}), {201}, 200),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(ctx, prepare, accepted, requests, concurrency, warmup, seed):
+    counter = itertools.count()
+    lock = threading.Lock()
+    samples = []
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        while True:
+            i = next(counter)
+            if i >= requests + warmup:
+                break
+            method, path, token, body = prepare(ctx, rng)
+            started = time.perf_counter()
+            status, queries, _ = ctx.client.request(method, path, token, body)
+            elapsed = time.perf_counter() - started
+            if i >= warmup:
+                local.append((elapsed, status, None if queries is None else int(queries)))
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(s[0] * 1e3 for s in samples)
+    queries = [s[2] for s in samples if s[2] is not None]
+    errors = [s[1] for s in samples if s[1] not in accepted]
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None,
+        'rps': len(samples) / wall if wall else None,
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server (default: in-process test client)')
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--customers', type=int, default=50, help='seeded customers to log in as')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--only', help='regex selecting scenario names')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    client = HttpClient(args.url) if args.url else WsgiClient()
+    ctx = Context(client, args.customers, args.password)
+    selected = [s for s in SCENARIOS if not args.only or re.search(args.only, s[0])]
+
+    results = {}
+    print(f"{'scenario':<26}{'reqs':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'sql/req':>9}")
+    for name, prepare, accepted, cap in selected:
+        requests = min(args.requests, cap) if cap else args.requests
+        r = results[name] = run_scenario(ctx, prepare, accepted, requests, args.concurrency, args.warmup, args.seed)
+        print(f"{name:<26}{r['requests']:>6}{r['errors']:>5}{_fmt(r['p50_ms'], '9.2f')}{_fmt(r['p95_ms'], '9.2f')}"
+              f"{_fmt(r['p99_ms'], '9.2f')}{_fmt(r['rps'], '9.1f')}{_fmt(r['queries_per_request'], '9.2f')}")
+
+    if args.out:
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'target': args.url or 'in-process',
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'concurrency': args.concurrency,
+                'seed': args.seed,
+                'python': platform.python_version(),
+            },
+            'results': results,
+        }
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'wrote {args.out}')
+    return 1 if any(r['errors'] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Measure login throughput and catalog latency while logins saturate the server.
+
+For each hashing mode, starts gunicorn (gthread workers, see serve.py) against
+the database configured through the environment, seeded by bench/seed.py so
+that ``--username``/``--password`` can log in. ``--login-clients`` processes
+then post logins back to back while ``--catalog-clients`` processes request
+``/api/products``, for ``--duration`` seconds. Modes:
+
+``inline``   PASSWORD_HASH_WORKERS=0: hash on the request thread (the old way)
+``pool``     hash in the process pool with bounded queueing (503 when full)
+
+    DATABASE_URL=sqlite:///seed.sqlite python bench/login_bench.py --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from bench.scaling_bench import percentile, wait_ready  # noqa: E402
+
+MODES = {
+    'inline': {'PASSWORD_HASH_WORKERS': 0},
+    'pool': {},
+}
+
+SERVER = 'import json, sys; from serve import Server; Server(json.loads(sys.argv[1]), json.loads(sys.argv[2])).run()'
+
+
+def client_loop(args):
+    port, kind, duration, credentials = args
+    latencies, statuses = [], {}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    body = json.dumps(credentials)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if kind == 'login':
+                conn.request('POST', '/api/login', body=body, headers={'Content-Type': 'application/json'})
+            else:
+                conn.request('GET', '/api/products')
+            r = conn.getresponse()
+            r.read()
+        except (http.client.HTTPException, OSError):
+            statuses['error'] = statuses.get('error', 0) + 1
+            conn.close()
+            continue
+        statuses[r.status] = statuses.get(r.status, 0) + 1
+        if r.status == 200:
+            latencies.append(time.perf_counter() - started)
+        elif r.status == 503:
+            time.sleep(float(r.getheader('Retry-After') or 1) / 10)
+    conn.close()
+    return kind, latencies, statuses
+
+
+def run(mode, args):
+    options = {'bind': f'127.0.0.1:{args.port}', 'workers': args.workers, 'threads': args.threads,
+               'worker_class': 'gthread', 'preload_app': True}
+    config = dict(MODES[mode], METRICS_ENABLED=False)
+    server = subprocess.Popen([sys.executable, '-c', SERVER, json.dumps(options), json.dumps(config)],
+                              cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    credentials = {'username': args.username, 'password': args.password}
+    try:
+        if not wait_ready(args.port):
+            raise SystemExit(f'server for {mode} did not start')
+        jobs = ([(args.port, 'login', args.duration, credentials)] * args.login_clients
+                + [(args.port, 'catalog', args.duration, credentials)] * args.catalog_clients)
+        with multiprocessing.Pool(len(jobs)) as pool:
+            results = pool.map(client_loop, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    out = {}
+    for kind in ('login', 'catalog'):
+        lats = sorted(l for k, ls, _ in results if k == kind for l in ls)
+        statuses = {}
+        for k, _, st in results:
+            if k == kind:
+                for code, n in st.items():
+                    statuses[str(code)] = statuses.get(str(code), 0) + n
+        out[kind] = {'ok_per_s': len(lats) / args.duration, 'p50_ms': percentile(lats, 0.50),
+                     'p99_ms': percentile(lats, 0.99), 'statuses': statuses}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--login-clients', type=int, default=8)
+    parser.add_argument('--catalog-clients', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--username', default='user000001')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'traffic':<9}{'ok/s':>8}{'p50 ms':>9}{'p99 ms':>10}  statuses")
+    for mode in args.modes:
+        result = run(mode, args)
+        for kind, r in result.items():
+            print(f"{mode:<8}{kind:<9}{r['ok_per_s']:>8.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>10.1f}  {r['statuses']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
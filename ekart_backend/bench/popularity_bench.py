@@ -0,0 +1,76 @@
+"""Benchmark the popularity score computation at scale.
+
+Generates synthetic order lines (Zipf-skewed products, dates spread over a
+year) as column arrays and times the vectorised computation in
+popularity.contributions against a per-row Python loop.
+
+    python bench/popularity_bench.py --lines 1000000 --products 50000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import popularity  # noqa: E402
+
+
+def synthetic_lines(n_lines, n_products, seed):
+    rng = np.random.default_rng(seed)
+    product_ids = np.minimum(rng.zipf(1.3, n_lines), n_products)
+    quantities = rng.integers(1, 4, n_lines)
+    now = time.time()
+    timestamps = now - rng.uniform(0, 365 * popularity.SECONDS_PER_DAY, n_lines)
+    return product_ids, quantities, timestamps, now
+
+
+def python_loop(product_ids, quantities, timestamps, now, half_life):
+    scores = {}
+    scale = half_life * popularity.SECONDS_PER_DAY
+    for pid, qty, ts in zip(product_ids.tolist(), quantities.tolist(), timestamps.tolist()):
+        scores[pid] = scores.get(pid, 0.0) + qty * math.pow(2.0, -(now - ts) / scale)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=50_000)
+    parser.add_argument('--half-life', type=float, default=14.0)
+    parser.add_argument('--chunk', type=int, default=50_000, help='rows per streamed batch')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--skip-loop', action='store_true', help='skip the per-row baseline')
+    args = parser.parse_args()
+
+    product_ids, quantities, timestamps, now = synthetic_lines(args.lines, args.products, args.seed)
+
+    started = time.perf_counter()
+    dense = popularity.contributions(product_ids, quantities, timestamps, now, args.half_life)
+    one_shot = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunked = np.zeros(0)
+    for lo in range(0, args.lines, args.chunk):
+        hi = lo + args.chunk
+        chunked = popularity.add_dense(chunked, popularity.contributions(
+            product_ids[lo:hi], quantities[lo:hi], timestamps[lo:hi], now, args.half_life))
+    streamed = time.perf_counter() - started
+    assert np.allclose(dense, chunked)
+
+    print(f'lines: {args.lines:,}  products: {args.products:,}  scored: {len(popularity.nonzero_scores(dense)):,}')
+    print(f'numpy one-shot: {one_shot * 1e3:9.1f} ms')
+    print(f'numpy chunked:  {streamed * 1e3:9.1f} ms  ({args.chunk:,} rows/batch)')
+    if not args.skip_loop:
+        started = time.perf_counter()
+        baseline = python_loop(product_ids, quantities, timestamps, now, args.half_life)
+        loop = time.perf_counter() - started
+        assert all(abs(dense[pid] - s) < 1e-6 * max(1.0, s) for pid, s in baseline.items())
+        print(f'python loop:    {loop * 1e3:9.1f} ms  ({loop / one_shot:.0f}x slower)')
+
+
+if __name__ == '__main__':
+    main()
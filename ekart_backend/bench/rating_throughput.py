@@ -0,0 +1,80 @@
+"""Throughput of POST /api/products/<id>/rate with many concurrent raters.
+
+Creates one product and N users, has every user rate it at once from a thread
+pool, then drains the rating log with fold_ratings and checks that the folded
+average and count match what was submitted.
+
+    python bench/rating_throughput.py --raters 1000 --threads 64
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app, db, fold_ratings, Product, ProductMeta, User  # noqa: E402
+
+app = create_app()
+
+
+def setup(n_raters):
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        product = Product(name=f'rating-bench-{tag}', description='rating throughput', price=1, inventory=1)
+        db.session.add(product)
+        users = [User(username=f'rating-bench-{tag}-{i}', password_hash='!', role='customer') for i in range(n_raters)]
+        db.session.add_all(users)
+        db.session.commit()
+        tokens = [create_access_token(identity=str(u.user_id), additional_claims={'username': u.username, 'role': 'customer'})
+                  for u in users]
+        return product.product_id, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--raters', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    product_id, tokens = setup(args.raters)
+    ratings = [rng.randint(1, 5) for _ in tokens]
+
+    def rate(i):
+        r = app.test_client().post(f'/api/products/{product_id}/rate', json={'rating': ratings[i]},
+                                   headers={'Authorization': f'Bearer {tokens[i]}'})
+        return r.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = list(pool.map(rate, range(len(tokens))))
+    elapsed = time.perf_counter() - started
+
+    fold_started = time.perf_counter()
+    with app.app_context():
+        while fold_ratings():
+            pass
+        meta = db.session.get(ProductMeta, product_id)
+        count, avg = meta.rating_count, meta.rating
+    fold_elapsed = time.perf_counter() - fold_started
+
+    accepted = codes.count(200)
+    print(f'ratings: {len(codes)}  accepted: {accepted}  errors: {len(codes) - accepted}')
+    print(f'submit: {elapsed:.3f}s  ({len(codes) / elapsed:.1f} ratings/s)  drain: {fold_elapsed:.3f}s')
+    expected = sum(ratings) / len(ratings)
+    print(f'folded count: {count}  average: {avg:.4f}  expected: {expected:.4f}')
+    if accepted != len(codes) or count != len(codes) or abs(avg - expected) > 1e-6:
+        print('FAIL: lost or double-counted ratings')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Check read-replica routing against two local SQLite databases.
+
+Copies ``--primary`` (a seeded SQLite file, e.g. from bench/seed.py) into a
+scratch directory twice, once as the primary and once as ``replica1``, then
+tags every category name on the replica with " [replica]" so each
+``GET /api/categories`` response shows which database served it. Replication
+is simulated by writing the replica's heartbeat row directly. The script
+checks each routing case in turn: a current replica, a client that just
+wrote to the cart (fenced to the primary until the replica catches up), a
+replica beyond ``REPLICA_MAX_LAG``, and an unreachable replica. It also
+checks that ``GET /api/cart`` always reads from the primary. Exits non-zero
+if any case is routed wrongly.
+
+    python bench/replica_check.py --primary seed.sqlite --requests 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import migrations  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+
+def set_replayed(path, seconds_ago):
+    """Pretend the replica has applied the primary's writes up to ``seconds_ago``."""
+    with sqlite3.connect(path) as conn:
+        conn.execute('INSERT OR REPLACE INTO replica_heartbeat (id, beat_ms) VALUES (1, ?)',
+                     (int((time.time() - seconds_ago) * 1000),))
+
+
+def served_by(client, n):
+    counts = {'replica': 0, 'primary': 0}
+    started = time.perf_counter()
+    for _ in range(n):
+        response = client.get('/api/categories')
+        assert response.status_code == 200, response.data[:200]
+        names = [c['name'] for c in response.get_json()]
+        counts['replica' if names and names[0].endswith('[replica]') else 'primary'] += 1
+    return counts, (time.perf_counter() - started) / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--primary', default='seed.sqlite')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--max-lag', type=float, default=2.0)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='ekart-replicas-')
+    primary, replica = os.path.join(scratch, 'primary.sqlite'), os.path.join(scratch, 'replica.sqlite')
+    shutil.copyfile(args.primary, primary)
+    app = ekart.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + primary,
+        'SQLALCHEMY_BINDS': {'replica1': 'sqlite:///' + replica},
+        'REPLICA_MAX_LAG': args.max_lag,
+        'REPLICA_CHECK_INTERVAL': 3600,  # this script drives the checks itself
+        'CATALOG_CACHE_BACKEND': 'none',
+        'METRICS_ENABLED': False,
+    })
+    with app.app_context():
+        migrations.upgrade(ekart.db, log=lambda *a: None)
+        ekart.db.session.remove()
+        ekart.db.engine.dispose()
+        shutil.copyfile(primary, replica)
+        with sqlite3.connect(replica) as conn:
+            conn.execute("UPDATE categories SET name = name || ' [replica]'")
+        user = ekart.User.query.order_by(ekart.User.user_id).first()
+        product = ekart.Product.query.filter(ekart.Product.inventory > 0).first()
+        if user is None or product is None:
+            raise SystemExit('seed users and products first (bench/seed.py)')
+        ekart.Cart.query.filter_by(user_id=user.user_id).delete()
+        ekart.db.session.commit()
+        headers = {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(user.user_id), additional_claims={'username': user.username, 'role': 'customer'})}
+        product_id = product.product_id
+
+    router = ekart.replica_router
+    failures = 0
+    print(f"{'case':<34}{'replica':>9}{'primary':>9}{'ms/req':>9}  expected")
+
+    def case(label, client, expected):
+        nonlocal failures
+        counts, ms = served_by(client, args.requests)
+        ok = counts[expected] == args.requests
+        failures += not ok
+        print(f"{label:<34}{counts['replica']:>9}{counts['primary']:>9}{ms:>9.2f}  {expected}{'' if ok else '  FAIL'}")
+
+    with app.app_context():
+        set_replayed(replica, 0)
+        router.check()
+    case('replica current', app.test_client(), 'replica')
+
+    writer = app.test_client()
+    response = writer.post('/api/cart', headers=headers, json={'product_id': product_id, 'quantity': 1})
+    assert response.status_code == 200, response.data[:200]
+    case('after a cart write, replica behind', writer, 'primary')
+    cart = writer.get('/api/cart', headers=headers).get_json()
+    in_cart = any(item['product_id'] == product_id for item in cart)
+    print(f"{'cart read after the write':<34}{'':>27}  {'primary' if in_cart else 'FAIL: write not visible'}")
+    failures += not in_cart
+
+    with app.app_context():
+        set_replayed(replica, 0)
+        router.check()
+    case('after a cart write, caught up', writer, 'replica')
+
+    with app.app_context():
+        set_replayed(replica, args.max_lag * 2)
+        router.check()
+    case(f'replica {args.max_lag * 2:g}s behind', app.test_client(), 'primary')
+
+    with app.app_context():
+        ekart.db.engines['replica1'].dispose()
+        os.remove(replica)
+        router.check()
+        print('replica error:', router.stats()['replicas']['replica1'].get('error', '-').splitlines()[0][:60])
+    case('replica unreachable', app.test_client(), 'primary')
+
+    print('routed:', router.stats()['routed'])
+    shutil.rmtree(scratch, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
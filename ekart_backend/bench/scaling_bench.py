@@ -0,0 +1,120 @@
+"""Measure how /api/products throughput scales with the number of gunicorn workers.
+
+For each worker count, starts ``serve.py`` on a local port against the
+database configured through the environment, waits for ``/ping``, then runs
+``--clients`` load-generating processes (separate processes, so the client
+side is not GIL-bound) with one keep-alive connection each, for
+``--duration`` seconds. Reports requests/s, p50/p99 latency and the speed-up
+over the first worker count.
+
+    python bench/scaling_bench.py --workers 1 2 4 8 --clients 32 --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def client_loop(args):
+    port, path, duration = args
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            r = conn.getresponse()
+            r.read()
+            if r.status != 200:
+                errors += 1
+            if r.getheader('Connection', '').lower() == 'close':
+                conn.close()
+        except (http.client.HTTPException, OSError):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies, errors
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/ping')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run(workers, threads, port, clients, path, duration, warmup):
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--workers', str(workers), '--threads', str(threads),
+         '--bind', f'127.0.0.1:{port}', '--preload'],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_ready(port):
+            raise SystemExit(f'server with {workers} workers did not start')
+        with multiprocessing.Pool(clients) as pool:
+            pool.map(client_loop, [(port, path, warmup)] * clients)
+            started = time.perf_counter()
+            results = pool.map(client_loop, [(port, path, duration)] * clients)
+            wall = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    latencies = sorted(l for lats, _ in results for l in lats)
+    errors = sum(e for _, e in results)
+    return {'workers': workers, 'threads': threads, 'requests': len(latencies), 'errors': errors,
+            'rps': len(latencies) / wall, 'p50_ms': percentile(latencies, 0.50), 'p99_ms': percentile(latencies, 0.99)}
+
+
+def percentile(sorted_seconds, q):
+    if not sorted_seconds:
+        return float('nan')
+    return sorted_seconds[min(len(sorted_seconds) - 1, int(len(sorted_seconds) * q))] * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = multiprocessing.cpu_count()
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, cores, cores * 2} - {0}))
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=cores * 4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--path', default='/api/products')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--out', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f'cores: {cores}  clients: {args.clients}  path: {args.path}')
+    print(f"{'workers':>8}{'threads':>8}{'req/s':>10}{'speed-up':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    rows = []
+    for workers in args.workers:
+        r = run(workers, args.threads, args.port, args.clients, args.path, args.duration, args.warmup)
+        rows.append(r)
+        print(f"{workers:>8}{args.threads:>8}{r['rps']:>10.1f}{r['rps'] / rows[0]['rps']:>10.2f}"
+              f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['errors']:>8}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'cores': cores, 'clients': args.clients, 'path': args.path, 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Fill an empty database with deterministic synthetic shop data.
+
+Generates categories, products (with meta rows and category links), customers
+and admins, ratings, open carts and an order history, then rebuilds the sales
+rollups and popularity scores so every endpoint has realistic data to serve.
+The same ``--seed`` and ``--end`` always produce the same rows.
+
+- Product demand is Zipf-distributed over a shuffled product order, so a few
+  products sell far more than the long tail and popularity is not tied to id.
+- Order dates follow a seasonal curve: busier weekends, a November/December
+  peak, an evening peak within the day and gentle growth over the period.
+- Older orders are mostly delivered; recent ones are still pending, paid or
+  shipped, and a small share is cancelled.
+
+Every user's password is ``--password`` (customers are ``user000001``...,
+admins ``admin001``...), which is what bench/load_test.py logs in with.
+
+    python bench/seed.py --users 5000 --products 2000 --orders 50000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import (  # noqa: E402
+    create_app, db, rebuild_order_rollups, rebuild_sales_rollups, recompute_popularity,
+    Cart, Category, Order, OrderItem, Product, ProductCategory, ProductMeta, ProductRating, User,
+)
+
+app = create_app()
+
+BATCH_SIZE = 5000
+
+CATEGORY_NAMES = [
+    'Electronics', 'Books', 'Home & Kitchen', 'Toys', 'Sports', 'Beauty', 'Grocery', 'Garden',
+    'Automotive', 'Fashion', 'Music', 'Office', 'Pets', 'Health', 'Baby', 'Tools',
+]
+ADJECTIVES = ['Classic', 'Compact', 'Deluxe', 'Eco', 'Ultra', 'Smart', 'Portable', 'Premium',
+              'Wireless', 'Vintage', 'Pro', 'Mini', 'Organic', 'Rugged', 'Silent', 'Bright']
+NOUNS = ['Lamp', 'Kettle', 'Backpack', 'Speaker', 'Notebook', 'Blender', 'Headphones', 'Mug',
+         'Jacket', 'Drone', 'Puzzle', 'Sneakers', 'Charger', 'Keyboard', 'Tent', 'Watch']
+COLOURS = ['red', 'blue', 'black', 'white', 'green', 'grey', 'silver', 'yellow']
+
+ORDER_LINES = [1, 1, 1, 2, 2, 3, 4]
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 6, 6, 7, 7, 8, 7, 7, 7, 8, 9, 11, 12, 12, 10, 6, 3]
+
+
+def zipf_cum_weights(n, s):
+    return list(accumulate(1.0 / rank ** s for rank in range(1, n + 1)))
+
+
+def day_weight(day, start, days):
+    weight = 1.0 + 0.5 * (day - start).days / max(days, 1)    # growth
+    if day.weekday() >= 5:
+        weight *= 1.3
+    peak = day.timetuple().tm_yday - 335                       # early December
+    weight *= 1.0 + 1.5 * math.exp(-(peak / 18.0) ** 2)
+    return weight
+
+
+def order_status(rng, age_days):
+    if rng.random() < 0.05:
+        return 'cancelled'
+    if age_days < 2:
+        return rng.choice(['pending', 'paid', 'paid'])
+    if age_days < 7:
+        return rng.choice(['paid', 'shipped', 'shipped'])
+    return 'delivered'
+
+
+def insert(model, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[i:i + BATCH_SIZE])
+
+
+def generate(args):
+    """Return ``{model: [row dict, ...]}`` for the whole data set."""
+    rng = random.Random(args.seed)
+    end = datetime.combine(args.end, datetime.min.time())
+    start = end - timedelta(days=args.days)
+
+    categories = [{'category_id': i + 1,
+                   'name': CATEGORY_NAMES[i % len(CATEGORY_NAMES)] + ('' if i < len(CATEGORY_NAMES) else f' {i}')}
+                  for i in range(args.categories)]
+
+    products, metas, links = [], [], []
+    for pid in range(1, args.products + 1):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pid}'
+        in_stock = rng.random() > 0.05
+        products.append({
+            'product_id': pid,
+            'name': name,
+            'description': f'A {rng.choice(COLOURS)} {name.lower()} for everyday use.',
+            'price': Decimal(str(round(min(rng.lognormvariate(3.3, 0.9), 5000) + 0.99, 2))),
+            'inventory': rng.randint(20, args.max_inventory) if in_stock else 0,
+        })
+        metas.append({'product_id': pid, 'image_url': f'https://picsum.photos/seed/{pid}/400/400',
+                      'rating': 0.0, 'rating_count': 0, 'popularity': 0, 'popularity_score': 0.0})
+        for cid in rng.sample(range(1, args.categories + 1), k=min(args.categories, rng.choice([1, 1, 2, 3]))):
+            links.append({'product_id': pid, 'category_id': cid})
+
+    password_hash = generate_password_hash(args.password)
+    users = [{'user_id': uid, 'username': f'user{uid:06d}', 'password_hash': password_hash,
+              'role': 'customer', 'is_active': True} for uid in range(1, args.users + 1)]
+    users += [{'user_id': args.users + i, 'username': f'admin{i:03d}', 'password_hash': password_hash,
+               'role': 'admin', 'is_active': True} for i in range(1, args.admins + 1)]
+
+    # popularity rank -> product id, shuffled so demand is not tied to insertion order
+    ranked = list(range(1, args.products + 1))
+    rng.shuffle(ranked)
+    product_cum = zipf_cum_weights(args.products, args.zipf)
+    user_cum = zipf_cum_weights(args.users, 0.6)
+    customers = list(range(1, args.users + 1))
+    rng.shuffle(customers)
+
+    def pick_products(k):
+        picked = set()
+        while len(picked) < min(k, args.products):
+            picked.add(rng.choices(ranked, cum_weights=product_cum)[0])
+        return picked
+
+    def pick_user():
+        return rng.choices(customers, cum_weights=user_cum)[0]
+
+    days = [start.date() + timedelta(days=d) for d in range(args.days)]
+    day_cum = list(accumulate(day_weight(d, days[0], args.days) for d in days))
+    hour_cum = list(accumulate(HOUR_WEIGHTS))
+
+    orders, items = [], []
+    prices = {p['product_id']: p['price'] for p in products}
+    item_id = 0
+    for oid in range(1, args.orders + 1):
+        day = rng.choices(days, cum_weights=day_cum)[0]
+        hour = rng.choices(range(24), cum_weights=hour_cum)[0]
+        created = datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=hour, minutes=rng.randrange(60), seconds=rng.randrange(60))
+        amount = Decimal('0')
+        for pid in pick_products(rng.choice(ORDER_LINES)):
+            quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+            item_id += 1
+            items.append({'order_item_id': item_id, 'order_id': oid, 'product_id': pid,
+                          'quantity': quantity, 'price_at_purchase': prices[pid]})
+            amount += prices[pid] * quantity
+        orders.append({'order_id': oid, 'user_id': pick_user(), 'total': amount,
+                       'status': order_status(rng, (end - created).days), 'created_at': created})
+
+    ratings, seen = [], set()
+    for rid in range(1, args.ratings + 1):
+        user_id, pid = pick_user(), next(iter(pick_products(1)))
+        if (user_id, pid) in seen:
+            continue
+        seen.add((user_id, pid))
+        score = min(5, max(1, round(rng.gauss(3.9, 1.0))))
+        ratings.append({'rating_id': rid, 'user_id': user_id, 'product_id': pid, 'rating': score,
+                        'folded': True, 'created_at': start + timedelta(seconds=rng.randrange(args.days * 86400))})
+        meta = metas[pid - 1]
+        meta['rating'] = (meta['rating'] * meta['rating_count'] + score) / (meta['rating_count'] + 1)
+        meta['rating_count'] += 1
+
+    carts = []
+    for user_id in rng.sample(range(1, args.users + 1), k=int(args.users * args.cart_share)):
+        for pid in pick_products(rng.randint(1, 5)):
+            if products[pid - 1]['inventory']:
+                carts.append({'user_id': user_id, 'product_id': pid, 'quantity': 1})
+
+    return {
+        Category: categories, User: users, Product: products, ProductMeta: metas, ProductCategory: links,
+        Order: orders, OrderItem: items, ProductRating: ratings, Cart: carts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--ratings', type=int, default=10000)
+    parser.add_argument('--cart-share', type=float, default=0.3, help='fraction of customers with an open cart')
+    parser.add_argument('--days', type=int, default=365, help='length of the order history')
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(),
+                        help='last day of the order history (default: today)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='exponent of the product demand distribution')
+    parser.add_argument('--max-inventory', type=int, default=100000)
+    parser.add_argument('--password', default='bench-password')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with app.app_context():
+        if db.session.query(Product.product_id).first() or db.session.query(User.user_id).first():
+            print('Database already has users or products; seed an empty database (flask db-upgrade first)')
+            return 1
+        data = generate(args)
+        for model, rows in data.items():
+            insert(model, rows)
+        db.session.commit()
+        days, months = rebuild_sales_rollups()
+        rebuild_order_rollups()
+        scored = recompute_popularity()
+
+    for model, rows in data.items():
+        print(f'{model.__tablename__:<20} {len(rows):>9}')
+    print(f'rollups: {days} days, {months} months  popularity: {scored} products scored')
+    print(f'seeded in {time.perf_counter() - started:.1f}s (seed={args.seed}, end={args.end})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
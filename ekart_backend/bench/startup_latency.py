@@ -0,0 +1,53 @@
+"""Measure app import time and first-request latency in fresh processes.
+
+Each run starts a new interpreter, imports app.py and calls create_app(), then
+times the first and second GET of an endpoint through the test client. Schema
+setup is expected to have been applied beforehand (``flask db-upgrade``), so
+the first request should cost about the same as the second.
+
+    python bench/startup_latency.py --runs 10 --path /api/categories
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import app as ekart
+app = ekart.create_app()
+t1 = time.perf_counter()
+client = app.test_client()
+t2 = time.perf_counter()
+client.get(sys.argv[1])
+t3 = time.perf_counter()
+client.get(sys.argv[1])
+t4 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1e3, 'first_ms': (t3 - t2) * 1e3, 'second_ms': (t4 - t3) * 1e3}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/api/categories')
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, '-c', CHILD, args.path], cwd=HERE,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    for key in ('import_ms', 'first_ms', 'second_ms'):
+        values = [s[key] for s in samples]
+        print(f'{key:>10}: median {statistics.median(values):8.2f}  min {min(values):8.2f}  max {max(values):8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Streaming CSV / NDJSON readers and row validation for bulk catalog imports.
+
+Rows are read and validated one at a time, so an import's memory is bounded
+by the write chunk, not by the file. Each row is checked on its own and a bad
+row is reported (with its line number) without stopping the import.
+
+Row shapes (CSV header names or NDJSON keys):
+
+``products``     sku, name, price, inventory, optional description and image_url;
+                 upserted by ``sku``
+``categories``   sku or product_id, category (name; created if missing)
+``inventory``    sku or product_id and either ``delta`` (added to the current
+                 stock) or ``inventory`` (the new absolute stock)
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+
+FORMATS = ('csv', 'ndjson')
+KINDS = ('products', 'categories', 'inventory')
+
+SKU_MAX = 64
+NAME_MAX = 255
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(fmt, content_type, filename=None):
+    """``fmt`` if given, else guess from the content type or file extension."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return fmt
+    content_type = (content_type or '').lower()
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'application/json' in content_type:
+        return 'ndjson'
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+
+class _Lines:
+    """A binary stream decoded line by line, keeping the line endings (the csv
+    module needs them to read quoted fields that span lines).
+
+    Lines are split on the raw bytes, which UTF-8 allows, so one undecodable
+    line does not affect the others. Such a line is decoded with replacement
+    characters, and ``invalid`` maps its number to the byte offset of the
+    first bad sequence in the stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.invalid = {}
+
+    def __iter__(self):
+        number, offset, pending = 0, 0, b''
+        for block in iter(lambda: self.stream.read(65536), b''):
+            pending += block
+            lines = pending.split(b'\n')
+            pending = lines.pop()
+            for raw in lines:
+                number += 1
+                yield self._decode(raw + b'\n', number, offset)
+                offset += len(raw) + 1
+        if pending:
+            yield self._decode(pending, number + 1, offset)
+
+    def _decode(self, raw, number, offset):
+        if number == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw, offset = raw[len(codecs.BOM_UTF8):], offset + len(codecs.BOM_UTF8)
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            self.invalid[number] = offset + e.start
+            return raw.decode('utf-8', 'replace')
+
+    def error(self, first, last):
+        """RowError for the first invalid line from ``first`` to ``last``, or None."""
+        for number in range(first, last + 1) if self.invalid else ():
+            if number in self.invalid:
+                return RowError(f'line {number} is not valid UTF-8 (byte offset {self.invalid[number]})')
+        return None
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row_dict_or_RowError)`` from a binary stream."""
+    lines = _Lines(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        last = 0
+        for row in reader:
+            # a record spans the lines after the previous one, the header included
+            error = lines.error(last + 1, reader.line_num)
+            last = reader.line_num
+            if error is not None:
+                yield reader.line_num, error
+            elif None in row:
+                yield reader.line_num, RowError('too many fields')
+            else:
+                yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            error = lines.error(line_number, line_number)
+            if error is not None:
+                yield line_number, error
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'invalid JSON: {e}')
+                continue
+            yield line_number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text(row, field, max_len=None, required=False):
+    value = row.get(field)
+    if _blank(value):
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    value = str(value).strip()
+    if max_len is not None and len(value) > max_len:
+        raise RowError(f'{field} is longer than {max_len} characters')
+    return value
+
+
+def _int(row, field, minimum=None):
+    value = row.get(field)
+    try:
+        if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        value = int(str(value).strip()) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be an integer')
+    if minimum is not None and value < minimum:
+        raise RowError(f'{field} must be at least {minimum}')
+    return value
+
+
+def _price(row, field='price'):
+    try:
+        value = Decimal(str(row.get(field)).strip())
+    except (InvalidOperation, ValueError):
+        raise RowError(f'{field} must be a number')
+    if not value.is_finite() or value < 0 or value >= Decimal('1e8'):
+        raise RowError(f'{field} must be between 0 and 99999999.99')
+    if value != value.quantize(Decimal('0.01')):
+        raise RowError(f'{field} has more than two decimal places')
+    return value
+
+
+def _product_ref(row):
+    sku = _text(row, 'sku', SKU_MAX)
+    if sku is not None:
+        return {'sku': sku}
+    if _blank(row.get('product_id')):
+        raise RowError('sku or product_id is required')
+    return {'product_id': _int(row, 'product_id', minimum=1)}
+
+
+def validate_product(row):
+    return {
+        'sku': _text(row, 'sku', SKU_MAX, required=True),
+        'name': _text(row, 'name', NAME_MAX, required=True),
+        'description': _text(row, 'description') or '',
+        'price': _price(row),
+        'inventory': _int(row, 'inventory', minimum=0),
+        'image_url': _text(row, 'image_url'),
+    }
+
+
+def validate_category_link(row):
+    ref = _product_ref(row)
+    ref['category'] = _text(row, 'category', NAME_MAX, required=True)
+    return ref
+
+
+def validate_inventory(row):
+    ref = _product_ref(row)
+    has_delta, has_absolute = not _blank(row.get('delta')), not _blank(row.get('inventory'))
+    if has_delta == has_absolute:
+        raise RowError('give exactly one of delta or inventory')
+    if has_delta:
+        ref['delta'] = _int(row, 'delta')
+    else:
+        ref['inventory'] = _int(row, 'inventory', minimum=0)
+    return ref
+
+
+VALIDATORS = {
+    'products': validate_product,
+    'categories': validate_category_link,
+    'inventory': validate_inventory,
+}
+
+
+class Report:
+    """Counts and per-row errors of one import; keeps the first ``max_errors``."""
+
+    def __init__(self, kind, max_errors=1000):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows = 0
+        self.applied = 0
+        self.counts = {}
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            'applied': self.applied,
+            'failed': self.failed,
+            **self.counts,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+class Outcome:
+    """What one chunk changed; merged into the Report once its transaction commits."""
+
+    def __init__(self):
+        self.applied = 0
+        self.counts = {}
+        self.errors = []
+        self.product_ids = set()
+        self.documents = []
+        self.listings_changed = False
+        self.in_stock_changed = False
+        self.categories_changed = False
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge_into(self, report):
+        report.applied += self.applied
+        for name, n in self.counts.items():
+            report.count(name, n)
+        for line, message in self.errors:
+            report.error(line, message)
+
+
+def validated_chunks(rows, kind, report, size):
+    """Validate ``(line, row)`` pairs and yield lists of ``(line, clean_row)``
+    of up to ``size``; invalid rows go to ``report``."""
+    validate = VALIDATORS[kind]
+    chunk = []
+    for line, row in rows:
+        report.rows += 1
+        if isinstance(row, RowError):
+            report.error(line, str(row))
+            continue
+        try:
+            chunk.append((line, validate(row)))
+        except RowError as e:
+            report.error(line, str(e))
+            continue
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,315 @@
+"""Read-through cache for catalog responses with tag-based invalidation."""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from facets import TRUE_VALUES, Filters
+from json_provider import json_default
+
+
+class MemoryBackend:
+    """In-process TTL + LRU store. Each worker process has its own copy."""
+
+    shared = False
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._key_tags = {}
+        self._tags = {}
+
+    def _drop_locked(self, key):
+        self._entries.pop(key, None)
+        for tag in self._key_tags.pop(key, ()):
+            members = self._tags.get(tag)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._drop_locked(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            self._drop_locked(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._key_tags[key] = tuple(tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._drop_locked(key)
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._drop_locked(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_tags.clear()
+            self._tags.clear()
+
+
+class RedisBackend:
+    """Shared store on Redis (or anything speaking the redis-py API, such as
+    fakeredis in local runs). Tags are Redis sets of member keys.
+
+    The catalog version is a shared counter. A missing counter (first use,
+    or after ``clear()`` or a Redis flush) restarts from the clock, so it
+    never goes back to a value an earlier generation already handed out.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix='ekart:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError('CATALOG_CACHE_BACKEND=redis needs the redis package '
+                              '(pip install -r requirements-optional.txt)') from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, separators=(',', ':'), default=json_default), ex=int(ttl))
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, int(ttl))
+        pipe.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + k for k in keys])
+
+    def invalidate_tags(self, *tags):
+        tag_keys = [self.prefix + 'tag:' + t for t in tags]
+        keys = set()
+        for tag_key in tag_keys:
+            keys.update(k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(tag_key))
+        if keys:
+            self.delete(*keys)
+        if tag_keys:
+            self.client.delete(*tag_keys)
+        return len(keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def version(self):
+        key = self.prefix + 'version'
+        raw = self.client.get(key)
+        if raw is None:
+            self.client.set(key, time.time_ns() // 1000, nx=True)
+            raw = self.client.get(key)
+        return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+    def bump_version(self):
+        key = self.prefix + 'version'
+        pipe = self.client.pipeline()
+        pipe.set(key, time.time_ns() // 1000, nx=True)
+        pipe.incr(key)
+        pipe.execute()
+
+
+class NullBackend:
+    shared = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl, tags=()):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def invalidate_tags(self, *tags):
+        return 0
+
+    def clear(self):
+        pass
+
+
+class CatalogCache:
+    """Caches the JSON bodies of the public catalog endpoints.
+
+    Listing pages are tagged with ``product:<id>`` for every product on the
+    page, ``listings`` and ``listing_sort:<sort>``, so a write can drop just
+    the pages that show the product it touched.
+
+    ETags are the same in every worker. On a backend with a shared catalog
+    version (redis), every invalidation bumps it and ``etag()`` derives
+    validators from it: a client's ETag stays valid until some catalog write
+    happens, and checking it needs neither the cache nor the database. The
+    per-process backends have no version every worker sees, so there the ETag
+    is a hash of the body (``body_etag``) and is checked against the cached
+    or freshly loaded entry.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_CACHE_BACKEND', 'memory')
+        app.config.setdefault('CATALOG_CACHE_URL', None)
+        app.config.setdefault('CATALOG_CACHE_TTL', 60)
+        app.config.setdefault('CATALOG_CACHE_MAX_ENTRIES', 2048)
+        app.config.setdefault('CATALOG_CACHE_CONTROL', 'no-cache')
+        kind = app.config['CATALOG_CACHE_BACKEND']
+        if kind == 'memory':
+            self.backend = MemoryBackend(app.config['CATALOG_CACHE_MAX_ENTRIES'])
+        elif kind == 'redis':
+            self.backend = RedisBackend.from_url(app.config['CATALOG_CACHE_URL'])
+        else:
+            self.backend = NullBackend()
+        self.ttl = app.config['CATALOG_CACHE_TTL']
+        app.extensions['catalog_cache'] = self
+
+    # -- keys --------------------------------------------------------------
+
+    @staticmethod
+    def search_text(q):
+        """``q`` lower-cased with its whitespace collapsed; empty means no search."""
+        return ' '.join((q or '').lower().split())
+
+    @classmethod
+    def listing_key(cls, args, q, page, page_size):
+        """Normalise listing query args so equivalent requests share an entry.
+
+        ``q``, ``page`` and ``page_size`` come already normalised from the
+        caller, which serves the page from those same values.
+        """
+        filters = Filters.from_args(args)
+        parts = [
+            'q=' + q,
+            'category_id=' + ','.join(map(str, filters.category_ids)),
+            'min_price=%s' % ('' if filters.min_price is None else repr(filters.min_price)),
+            'max_price=%s' % ('' if filters.max_price is None else repr(filters.max_price)),
+            'in_stock=%d' % filters.in_stock,
+            'min_rating=%s' % ('' if filters.min_rating is None else repr(filters.min_rating)),
+            'page=%d' % page,
+            'page_size=%d' % page_size,
+            'sort=' + (args.get('sort') or ''),
+            'cursor=' + (args.get('cursor') if args.get('cursor') is not None else '-'),
+            'total=' + (args.get('total') or 'exact'),
+            'facets=%d' % ((args.get('facets') or '').lower() in TRUE_VALUES),
+        ]
+        return 'listing:' + '&'.join(parts)
+
+    @staticmethod
+    def product_key(product_id):
+        return 'product:%d' % product_id
+
+    CATEGORIES_KEY = 'categories'
+
+    # -- read-through ------------------------------------------------------
+
+    def _count(self, namespace, outcome):
+        with self._lock:
+            ns = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            ns[outcome] += 1
+
+    def lookup(self, key):
+        """The cached value for ``key``, or None; counted as a hit or a miss."""
+        value = self.backend.get(key)
+        self._count(key.split(':', 1)[0], 'hits' if value is not None else 'misses')
+        return value
+
+    def store(self, key, value, tags=None):
+        """Cache ``value``; ``tags`` is a callable taking it and returning its tags."""
+        self.backend.set(key, value, self.ttl, tags(value) if tags else ())
+
+    def etag(self, key):
+        """Strong validator for the body under ``key`` from the shared catalog
+        version, or None if the backend has none (see ``body_etag``).
+
+        Callers store the ETag taken before loading with the body, so a body
+        loaded just before a write never gets a post-write ETag.
+        """
+        if not self.backend.shared:
+            return None
+        version = self.backend.version()
+        return hashlib.blake2b(('%s|%s' % (version, key)).encode(), digest_size=10).hexdigest()
+
+    @staticmethod
+    def body_etag(body):
+        """Strong validator hashed from ``body`` itself."""
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), default=json_default)
+        return hashlib.blake2b(canonical.encode(), digest_size=10).hexdigest()
+
+    def stats(self):
+        with self._lock:
+            out = {ns: dict(v) for ns, v in self._stats.items()}
+        for v in out.values():
+            lookups = v['hits'] + v['misses']
+            v['hit_ratio'] = round(v['hits'] / lookups, 4) if lookups else 0.0
+        return out
+
+    # -- invalidation ------------------------------------------------------
+
+    def _bump_version(self):
+        if self.backend.shared:
+            self.backend.bump_version()
+
+    def invalidate_products(self, product_ids, sorts=(), filters=()):
+        """Drop detail entries and the listing pages showing these products,
+        plus every listing ordered by one of ``sorts`` and every listing
+        whose membership or facet counts depend on one of ``filters``
+        (``in_stock``, ``min_rating``)."""
+        product_ids = list(product_ids)
+        if product_ids:
+            self.backend.delete(*[self.product_key(pid) for pid in product_ids])
+        tags = ['product:%d' % pid for pid in product_ids]
+        tags += ['listing_sort:' + s for s in sorts]
+        tags += ['listing_filter:' + f for f in filters]
+        if tags:
+            self.backend.invalidate_tags(*tags)
+            self._bump_version()
+
+    def invalidate_listings(self):
+        self.backend.invalidate_tags('listings')
+        self._bump_version()
+
+    def invalidate_categories(self):
+        self.backend.delete(self.CATEGORIES_KEY)
+        self._bump_version()
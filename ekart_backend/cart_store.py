@@ -0,0 +1,478 @@
+"""Cart storage: the ``cart`` table, or a key-value store in front of it.
+
+``CART_STORE`` selects where cart operations go:
+
+``sql``      straight to the ``cart`` table, one transaction per operation
+             (default)
+``memory``   a dict in this process; one process only (development, tests,
+             single-worker deployments), since every worker would see its own
+             carts
+``redis``    one Redis hash per cart, shared by all workers (``CART_STORE_URL``;
+             anything speaking the redis-py API works, such as fakeredis)
+
+With a key-value store, adding, updating and removing lines touches no
+table. A ``cart-flusher`` worker writes the carts changed since its last run
+back to ``cart`` every ``CART_FLUSH_INTERVAL`` seconds (write-behind), so the
+table trails the store by about that long. A cart missing from the store
+(first use, a restart, or idle for ``CART_STORE_TTL`` seconds) is loaded
+from the table.
+
+Checkout takes the cart out of the store in one step, so two concurrent
+checkouts cannot both order it, and deletes its table rows in the order's
+transaction. If the checkout does not commit, the lines go back into the cart.
+
+The cart operations (``lines_steps``, ``add_steps``, ``update_steps`` and
+``remove_steps``) are steps generators (see querysteps.py), so the Flask and
+the async views share them.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import querysteps
+from jobs import PeriodicWorker
+
+
+class SqlBackend:
+    """Cart lines as rows of the ``cart`` table (``model``)."""
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def _rows(self, user_id):
+        return self.model.query.filter_by(user_id=user_id)
+
+    def _line(self, user_id, product_id):
+        table = self.model.__table__
+        return (table.c.user_id == user_id) & (table.c.product_id == product_id)
+
+    def lines_steps(self, user_id):
+        table = self.model.__table__
+        rows = yield select(table.c.product_id, table.c.quantity) \
+            .where(table.c.user_id == user_id).order_by(table.c.cart_id.asc())
+        return dict(rows)
+
+    def add_steps(self, user_id, product_id, quantity, limit):
+        table, line = self.model.__table__, self._line(user_id, product_id)
+        increment = table.update().where(line, table.c.quantity + quantity <= limit) \
+            .values(quantity=table.c.quantity + quantity)
+        if not (yield increment):
+            if quantity > limit:
+                return None
+            try:
+                yield table.insert().values(user_id=user_id, product_id=product_id, quantity=quantity)
+                return quantity
+            except IntegrityError:
+                # the line exists: over the limit, or inserted concurrently since the UPDATE
+                if not (yield increment):
+                    return None
+        rows = yield select(table.c.quantity).where(line)
+        return rows[0].quantity if rows else None
+
+    def update_steps(self, user_id, product_id, quantity):
+        table, line = self.model.__table__, self._line(user_id, product_id)
+        if quantity == 0:
+            changed = yield table.delete().where(line)
+        else:
+            changed = yield table.update().where(line).values(quantity=quantity)
+        return bool(changed)
+
+    def remove_steps(self, user_id, product_id):
+        return bool((yield self.model.__table__.delete().where(self._line(user_id, product_id))))
+
+    def take(self, user_id):
+        """Lock and read the cart, and delete it in the open transaction."""
+        lines = dict(self.db.session.query(self.model.product_id, self.model.quantity)
+                     .filter(self.model.user_id == user_id).order_by(self.model.cart_id.asc())
+                     .with_for_update())
+        self.delete(user_id)
+        return lines
+
+    def delete(self, user_id):
+        self._rows(user_id).delete(synchronize_session=False)
+
+    def replace(self, carts):
+        """Make the table hold exactly ``{user_id: {product_id: quantity}}``
+        for these users, in one transaction."""
+        if not carts:
+            return
+        table = self.model.__table__
+        self.db.session.execute(table.delete().where(table.c.user_id.in_(list(carts))))
+        rows = [{'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+                for user_id, lines in carts.items() for product_id, quantity in lines.items()]
+        if rows:
+            self.db.session.execute(table.insert(), rows)
+        self.db.session.commit()
+
+
+class MemoryBackend:
+    """Carts in a dict guarded by one lock. Only clean carts (flushed since
+    their last change) are dropped when idle."""
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._carts = {}
+        self._touched = OrderedDict()
+        self._dirty = set()
+
+    def _touch_locked(self, user_id, dirty=True):
+        self._touched[user_id] = time.monotonic()
+        self._touched.move_to_end(user_id)
+        if dirty:
+            self._dirty.add(user_id)
+
+    def get(self, user_id):
+        with self._lock:
+            lines = self._carts.get(user_id)
+            if lines is None:
+                return None
+            self._touch_locked(user_id, dirty=False)
+            return dict(lines)
+
+    def loaded(self, user_id):
+        return user_id in self._carts
+
+    def fill(self, user_id, lines):
+        with self._lock:
+            if user_id not in self._carts:
+                self._carts[user_id] = dict(lines)
+                self._touch_locked(user_id, dirty=False)
+
+    def add(self, user_id, product_id, quantity, limit):
+        with self._lock:
+            lines = self._carts.setdefault(user_id, {})
+            new_qty = lines.get(product_id, 0) + quantity
+            if new_qty > limit:
+                return None
+            lines[product_id] = new_qty
+            self._touch_locked(user_id)
+            return new_qty
+
+    def update(self, user_id, product_id, quantity):
+        with self._lock:
+            lines = self._carts.setdefault(user_id, {})
+            if product_id not in lines:
+                return False
+            if quantity == 0:
+                del lines[product_id]
+            else:
+                lines[product_id] = quantity
+            self._touch_locked(user_id)
+            return True
+
+    def remove(self, user_id, product_id):
+        with self._lock:
+            lines = self._carts.setdefault(user_id, {})
+            if lines.pop(product_id, None) is None:
+                return False
+            self._touch_locked(user_id)
+            return True
+
+    def take(self, user_id):
+        with self._lock:
+            lines = self._carts.get(user_id) or {}
+            self._carts[user_id] = {}
+            self._touch_locked(user_id)
+            return lines
+
+    def merge(self, user_id, lines):
+        with self._lock:
+            cart = self._carts.setdefault(user_id, {})
+            for product_id, quantity in lines.items():
+                cart[product_id] = cart.get(product_id, 0) + quantity
+            self._touch_locked(user_id)
+
+    def pop_dirty(self, count):
+        with self._lock:
+            user_ids = [self._dirty.pop() for _ in range(min(count, len(self._dirty)))]
+            return {user_id: dict(self._carts.get(user_id, {})) for user_id in user_ids}
+
+    def mark_dirty(self, user_ids):
+        with self._lock:
+            self._dirty.update(user_ids)
+
+    def prune(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            while self._touched:
+                user_id, touched = next(iter(self._touched.items()))
+                if touched > cutoff or user_id in self._dirty:
+                    break
+                del self._touched[user_id]
+                self._carts.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'carts': len(self._carts), 'dirty': len(self._dirty)}
+
+
+class RedisBackend:
+    """Carts as Redis hashes of ``product_id -> quantity``, plus a marker
+    field so that an empty cart is still known to be loaded. Changed carts
+    are collected in a set the flusher pops from."""
+
+    MARKER = '-'
+
+    def __init__(self, client, prefix='ekart:cart:', ttl=86400):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = int(ttl)
+        self.dirty_key = prefix + 'dirty'
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError('CART_STORE=redis needs the redis package '
+                              '(pip install -r requirements-optional.txt)') from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, user_id):
+        return '%s%d' % (self.prefix, user_id)
+
+    def _decode(self, raw):
+        lines = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field != self.MARKER:
+                lines[int(field)] = int(value)
+        return lines
+
+    def _touch(self, pipe, user_id, dirty=True):
+        pipe.expire(self._key(user_id), self.ttl)
+        if dirty:
+            pipe.sadd(self.dirty_key, user_id)
+
+    def get(self, user_id):
+        raw = self.client.hgetall(self._key(user_id))
+        return self._decode(raw) if raw else None
+
+    def loaded(self, user_id):
+        return bool(self.client.exists(self._key(user_id)))
+
+    def fill(self, user_id, lines):
+        from redis.exceptions import WatchError
+        key = self._key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.exists(key):
+                    return
+                pipe.multi()
+                pipe.hset(key, mapping={self.MARKER: 1, **{str(p): q for p, q in lines.items()}})
+                self._touch(pipe, user_id, dirty=False)
+                pipe.execute()
+            except WatchError:
+                pass  # loaded by a concurrent request first
+
+    def add(self, user_id, product_id, quantity, limit):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, product_id, quantity)
+        self._touch(pipe, user_id)
+        new_qty = pipe.execute()[0]
+        if new_qty > limit:
+            # undo; a line that only this request created goes away again
+            if self.client.hincrby(key, product_id, -quantity) <= 0:
+                self.client.hdel(key, product_id)
+            return None
+        return new_qty
+
+    def update(self, user_id, product_id, quantity):
+        key = self._key(user_id)
+        if quantity == 0:
+            return self.remove(user_id, product_id)
+        if not self.client.hexists(key, product_id):
+            return False
+        pipe = self.client.pipeline()
+        pipe.hset(key, product_id, quantity)
+        self._touch(pipe, user_id)
+        pipe.execute()
+        return True
+
+    def remove(self, user_id, product_id):
+        pipe = self.client.pipeline()
+        pipe.hdel(self._key(user_id), product_id)
+        self._touch(pipe, user_id)
+        return bool(pipe.execute()[0])
+
+    def take(self, user_id):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()  # MULTI/EXEC: read and empty in one step
+        pipe.hgetall(key)
+        pipe.delete(key)
+        pipe.hset(key, self.MARKER, 1)
+        self._touch(pipe, user_id)
+        return self._decode(pipe.execute()[0])
+
+    def merge(self, user_id, lines):
+        pipe = self.client.pipeline()
+        for product_id, quantity in lines.items():
+            pipe.hincrby(self._key(user_id), product_id, quantity)
+        self._touch(pipe, user_id)
+        pipe.execute()
+
+    def pop_dirty(self, count):
+        user_ids = [int(u) for u in self.client.spop(self.dirty_key, count) or ()]
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(self._key(user_id))
+        # a cart that expired meanwhile has nothing newer than the table
+        return {user_id: self._decode(raw) for user_id, raw in zip(user_ids, pipe.execute()) if raw}
+
+    def mark_dirty(self, user_ids):
+        if user_ids:
+            self.client.sadd(self.dirty_key, *user_ids)
+
+    def prune(self):
+        pass  # keys expire on their own
+
+    def stats(self):
+        return {'dirty': self.client.scard(self.dirty_key)}
+
+
+class Checkout:
+    """The lines taken out of a cart for one checkout; ``commit()`` once the
+    order's transaction has committed."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.committed = False
+
+    def commit(self):
+        self.committed = True
+
+
+class CartStore:
+    """Cart operations against the configured store; see the module docstring."""
+
+    def __init__(self, db, model, app=None):
+        self.sql = SqlBackend(db, model)
+        self.backend = None
+        self.flush_batch = 500
+        self.flusher = PeriodicWorker('cart-flusher', self.flush)
+        self._exit_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CART_STORE', 'sql')
+        app.config.setdefault('CART_STORE_URL', None)
+        app.config.setdefault('CART_STORE_TTL', 86400)
+        app.config.setdefault('CART_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('CART_FLUSH_BATCH', 500)
+        kind = app.config['CART_STORE']
+        if kind == 'memory':
+            self.backend = MemoryBackend(app.config['CART_STORE_TTL'])
+        elif kind == 'redis':
+            self.backend = RedisBackend.from_url(app.config['CART_STORE_URL'], ttl=app.config['CART_STORE_TTL'])
+        else:
+            self.backend = None
+        self.flusher.interval = app.config['CART_FLUSH_INTERVAL']
+        self.flush_batch = app.config['CART_FLUSH_BATCH']
+        app.extensions['cart_store'] = self
+
+    def _run(self, steps):
+        return querysteps.run(steps, self.sql.db.session)
+
+    def _ensure_steps(self, user_id):
+        """Load the cart from the table if the store does not have it, and
+        start this process's flusher."""
+        app = current_app._get_current_object()
+        self.flusher.ensure_started(app)
+        if self._exit_pid != os.getpid():
+            self._exit_pid = os.getpid()
+            atexit.register(self.flusher.run_once, app)
+        if not self.backend.loaded(user_id):
+            self.backend.fill(user_id, (yield from self.sql.lines_steps(user_id)))
+
+    # -- operations ----------------------------------------------------------
+
+    def lines_steps(self, user_id):
+        """``{product_id: quantity}`` in the order the lines were added."""
+        if self.backend is None:
+            return (yield from self.sql.lines_steps(user_id))
+        lines = self.backend.get(user_id)
+        if lines is None:
+            yield from self._ensure_steps(user_id)
+            lines = self.backend.get(user_id) or {}
+        return lines
+
+    def add_steps(self, user_id, product_id, quantity, limit):
+        """Add ``quantity`` units; the new line quantity, or None (and no
+        change) if it would exceed ``limit``."""
+        if self.backend is None:
+            return (yield from self.sql.add_steps(user_id, product_id, quantity, limit))
+        yield from self._ensure_steps(user_id)
+        return self.backend.add(user_id, product_id, quantity, limit)
+
+    def update_steps(self, user_id, product_id, quantity):
+        """Set a line's quantity (0 removes it); False if the cart has no such line."""
+        if self.backend is None:
+            return (yield from self.sql.update_steps(user_id, product_id, quantity))
+        yield from self._ensure_steps(user_id)
+        return self.backend.update(user_id, product_id, quantity)
+
+    def remove_steps(self, user_id, product_id):
+        if self.backend is None:
+            return (yield from self.sql.remove_steps(user_id, product_id))
+        yield from self._ensure_steps(user_id)
+        return self.backend.remove(user_id, product_id)
+
+    @contextmanager
+    def checkout(self, user_id):
+        """Take the cart for an order placed in the current transaction.
+
+        The cart's table rows are deleted in that transaction. Unless
+        ``commit()`` is called on the yielded Checkout, a key-value store gets
+        the lines back, merged with anything added meanwhile (the table rows
+        come back with the rollback).
+        """
+        if self.backend is None:
+            checkout = Checkout(self.sql.take(user_id))
+        else:
+            self._run(self._ensure_steps(user_id))
+            checkout = Checkout(self.backend.take(user_id))
+            self.sql.delete(user_id)
+        try:
+            yield checkout
+        finally:
+            if not checkout.committed and self.backend is not None and checkout.lines:
+                self.backend.merge(user_id, checkout.lines)
+
+    # -- write-behind --------------------------------------------------------
+
+    def flush(self):
+        """Write the carts changed since the last flush to the table; return
+        how many were written. Carts whose write fails stay pending."""
+        if self.backend is None:
+            return 0
+        total = 0
+        while True:
+            carts = self.backend.pop_dirty(self.flush_batch)
+            try:
+                self.sql.replace(carts)
+            except Exception:
+                self.sql.db.session.rollback()
+                self.backend.mark_dirty(list(carts))
+                raise
+            total += len(carts)
+            if len(carts) < self.flush_batch:
+                break
+        self.backend.prune()
+        return total
+
+    def stats(self):
+        if self.backend is None:
+            return {'store': 'sql'}
+        return {'store': type(self.backend).__name__, **self.backend.stats()}
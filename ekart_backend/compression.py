@@ -0,0 +1,117 @@
+"""Content-negotiated gzip/brotli compression of responses.
+
+``init_app`` registers an ``after_request`` hook that compresses buffered
+responses of the configured mimetypes when the client accepts it and the body
+is at least ``COMPRESS_MIN_SIZE`` bytes:
+
+``COMPRESS_ENABLED``       turn the hook on or off (default on)
+``COMPRESS_MIN_SIZE``      smaller bodies are sent as is (default 1024)
+``COMPRESS_MIMETYPES``     what to compress (default JSON and text)
+``COMPRESS_ALGORITHMS``    server preference among equally acceptable codings
+                           (default ``('br', 'gzip')``); ``br`` needs the
+                           optional ``brotli`` package
+``COMPRESS_LEVEL``         gzip level (default 6)
+``COMPRESS_BR_QUALITY``    brotli quality (default 4)
+
+Streamed responses (the CSV/NDJSON exports) are left alone. A compressed
+response with a strong ETag gets the coding appended to it (``"abc-gzip"``),
+since it is a different representation; ``matching_etag`` accepts either
+form. Bodies with a strong ETag are memoised per process by ETag and coding,
+so each version of a catalog page is compressed once.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODERS = {
+    'gzip': lambda data, config: gzip.compress(data, config['COMPRESS_LEVEL'], mtime=0),
+}
+if brotli is not None:
+    ENCODERS['br'] = lambda data, config: brotli.compress(data, quality=config['COMPRESS_BR_QUALITY'])
+
+
+def matching_etag(if_none_match, etag):
+    """The form of ``etag`` (plain or with a coding suffix) listed in
+    ``If-None-Match``, or None. Comparison is weak, as RFC 9110 asks for
+    If-None-Match. ``*`` does not count: answering it would need to know that
+    the resource exists."""
+    for candidate in [etag] + [f'{etag}-{coding}' for coding in ENCODERS]:
+        if if_none_match.is_strong(candidate) or if_none_match.is_weak(candidate):
+            return candidate
+    return None
+
+
+def negotiate(accept_encodings, algorithms):
+    best, best_q = None, 0
+    for coding in algorithms:
+        if coding not in ENCODERS:
+            continue
+        q = accept_encodings[coding]
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressedBodies:
+    """LRU of compressed bodies keyed by ``(etag, coding)``."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_MIMETYPES', ('application/json', 'text/csv', 'text/plain'))
+    app.config.setdefault('COMPRESS_ALGORITHMS', ('br', 'gzip'))
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+    memo = CompressedBodies()
+
+    @app.after_request
+    def _compress(response):
+        config = app.config
+        if (not config['COMPRESS_ENABLED'] or response.mimetype not in config['COMPRESS_MIMETYPES']
+                or response.direct_passthrough or response.is_streamed):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        coding = negotiate(request.accept_encodings, config['COMPRESS_ALGORITHMS'])
+        if coding is None or (response.content_length or 0) < config['COMPRESS_MIN_SIZE']:
+            return response
+        etag, weak = response.get_etag()
+        key = (etag, coding) if etag and not weak else None
+        body = memo.get(key) if key else None
+        if body is None:
+            body = ENCODERS[coding](response.get_data(), config)
+            if key:
+                memo.set(key, body)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = coding
+        if key:
+            response.set_etag(f'{etag}-{coding}')
+        return response
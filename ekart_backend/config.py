@@ -0,0 +1,111 @@
+"""Database engine configuration from environment variables.
+
+``DATABASE_URL`` wins if set; otherwise the URL is assembled from
+``DB_DRIVER`` (see DRIVERS), ``DB_USER``, ``DB_PASSWORD``, ``DB_HOST``,
+``DB_PORT`` and ``DB_NAME``. Pool behaviour comes from ``DB_POOL_SIZE``,
+``DB_MAX_OVERFLOW``, ``DB_POOL_RECYCLE``, ``DB_POOL_PRE_PING`` and
+``DB_POOL_TIMEOUT``.
+
+Each worker process has its own pool, so the database sees up to
+``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` connections; keep that under
+MySQL's ``max_connections``. ``DB_POOL_RECYCLE`` must stay below the server's
+``wait_timeout`` so that idle connections are replaced before MySQL drops
+them, and pre-ping catches the ones it dropped anyway (e.g. after a restart).
+
+``DATABASE_REPLICA_URLS`` is a comma-separated list of read replica URLs.
+They become the binds ``replica1``, ``replica2``, ... with the same pool
+settings as the primary; see replicas.py for how reads are routed to them.
+
+The ASGI app (aio.py) runs its queries on an async engine for the same
+database, through the asyncio driver in ASYNC_DRIVERS, or on
+``ASYNC_DATABASE_URL`` if that is set.
+"""
+import os
+from urllib.parse import quote_plus
+
+from sqlalchemy.engine import make_url
+
+# DB_DRIVER -> SQLAlchemy dialect+driver. mysqldb is the C mysqlclient
+# package and is much faster on wide result sets than the pure-Python drivers.
+DRIVERS = {
+    'mysqlconnector': 'mysql+mysqlconnector',
+    'mysqldb': 'mysql+mysqldb',
+    'pymysql': 'mysql+pymysql',
+}
+
+# database backend -> SQLAlchemy asyncio dialect+driver for aio.py
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def _bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url(environ=os.environ):
+    if environ.get('DATABASE_URL'):
+        return environ['DATABASE_URL']
+    driver = environ.get('DB_DRIVER', 'mysqlconnector')
+    if driver not in DRIVERS:
+        raise ValueError(f"DB_DRIVER must be one of {', '.join(DRIVERS)}, not {driver!r}")
+    user = quote_plus(environ.get('DB_USER', 'root'))
+    password = quote_plus(environ.get('DB_PASSWORD', 'MYSQL'))
+    host = environ.get('DB_HOST', 'localhost')
+    port = environ.get('DB_PORT', '3306')
+    name = environ.get('DB_NAME', 'ekart_db')
+    return f'{DRIVERS[driver]}://{user}:{password}@{host}:{port}/{name}'
+
+
+def async_database_url(url):
+    """``url`` with its driver swapped for the asyncio one."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no asyncio driver known for {backend!r}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def engine_options(url, environ=os.environ):
+    options = {'pool_pre_ping': _bool(environ.get('DB_POOL_PRE_PING', 'true'))}
+    if url.startswith('sqlite'):
+        return options
+    options.update(
+        pool_size=int(environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+        pool_recycle=int(environ.get('DB_POOL_RECYCLE', 1800)),
+        pool_timeout=float(environ.get('DB_POOL_TIMEOUT', 10)),
+    )
+    return options
+
+
+def replica_binds(environ=os.environ):
+    urls = [u.strip() for u in environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    return {f'replica{i}': {'url': url, **engine_options(url, environ)} for i, url in enumerate(urls, 1)}
+
+
+def configure_database(app, environ=os.environ):
+    url = database_url(environ)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url, environ)
+    if environ.get('ASYNC_DATABASE_URL'):
+        app.config['ASYNC_DATABASE_URL'] = environ['ASYNC_DATABASE_URL']
+    binds = replica_binds(environ)
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def pool_status(engine):
+    """Connection counts for ``engine``'s pool in this process."""
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            status[name] = fn()
+    if 'size' in status and 'overflow' in status:
+        status['max_overflow'] = pool._max_overflow
+        status['timeout'] = pool.timeout()
+    status['pid'] = os.getpid()
+    return status
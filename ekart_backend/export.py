@@ -0,0 +1,40 @@
+"""Incremental CSV / NDJSON rendering for streamed admin exports."""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def render(chunks, columns, fmt):
+    """Yield one text block per chunk of row tuples so memory stays bounded by the chunk size."""
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        yield buf.getvalue()
+        for rows in chunks:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows([_plain(v) for v in row] for row in rows)
+            yield buf.getvalue()
+    else:
+        for rows in chunks:
+            yield ''.join(
+                json.dumps(dict(zip(columns, map(_plain, row))), separators=(',', ':')) + '\n'
+                for row in rows
+            )
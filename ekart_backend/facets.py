@@ -0,0 +1,366 @@
+"""In-memory facet index behind the /api/products filters and facet counts.
+
+A set of products is a Python int used as a bitmap, with bit ``product_id``
+set for each member. There is one bitmap per category, per price bucket and
+per rating band, one for in-stock products and one for all products.
+Filters are ANDs and ORs of bitmaps, and a facet count is
+``(result & facet).bit_count()``. Counting every category, price bucket and
+rating band of a result set therefore takes a few dozen big-integer
+operations and no query. Price, inventory and rating are also kept in numpy
+arrays indexed by product id. Arbitrary ``min_price``/``max_price``/
+``min_rating`` bounds become a bitmap through one vector comparison.
+
+Counts are disjunctive: each facet is counted with every filter applied
+except its own. Selecting one category still shows how many products each
+other category would add.
+
+The index is built on first use and rebuilt in the background every
+``FACET_REFRESH_SECONDS``, which also picks up other workers' writes. This
+worker's writes are applied immediately through ``set_inventory`` and
+``reload``.
+
+``FACETS_ENABLED``          build the index and answer ``facets=1`` (default True)
+``FACET_PRICE_BUCKETS``     lower bounds of the price buckets
+                            (default 0, 10, 25, 50, 100, 250, 500)
+``FACET_RATING_BANDS``      minimum ratings counted as "N and up" (default 4, 3, 2, 1)
+``FACET_REFRESH_SECONDS``   seconds between full rebuilds (default 60)
+"""
+import threading
+import time
+
+import numpy as np
+
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def _float_or_none(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+
+class Filters:
+    """The product filters of a listing request."""
+
+    def __init__(self, category_ids=(), min_price=None, max_price=None, in_stock=False, min_rating=None):
+        self.category_ids = tuple(sorted(set(category_ids)))
+        self.min_price = min_price
+        self.max_price = max_price
+        self.in_stock = in_stock
+        self.min_rating = min_rating
+
+    @classmethod
+    def from_args(cls, args):
+        """Parse query args; ``category_id`` may repeat or hold a comma-separated
+        list. Malformed values are ignored, like other listing args."""
+        category_ids = []
+        for value in args.getlist('category_id'):
+            for part in value.split(','):
+                part = part.strip()
+                if part.isdigit() and int(part) > 0:
+                    category_ids.append(int(part))
+        return cls(category_ids,
+                   _float_or_none(args.get('min_price')),
+                   _float_or_none(args.get('max_price')),
+                   (args.get('in_stock') or '').lower() in TRUE_VALUES,
+                   _float_or_none(args.get('min_rating')))
+
+    def __bool__(self):
+        return bool(self.category_ids or self.in_stock or self.min_price is not None
+                    or self.max_price is not None or self.min_rating is not None)
+
+
+def _to_bits(mask):
+    """Bitmap of the True positions of a boolean array."""
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+class _State:
+    """One generation of the index; mutated only under FacetIndex._lock."""
+
+    def __init__(self, price_edges, rating_bands, size=1024):
+        self.price_edges = np.asarray(price_edges, dtype=np.float64)
+        self.rating_bands = tuple(rating_bands)
+        self.size = size
+        self.exists = np.zeros(size, dtype=bool)
+        self.price = np.full(size, np.nan)
+        self.inventory = np.zeros(size, dtype=np.int64)
+        self.rating = np.zeros(size)
+        self.all = 0
+        self.in_stock = 0
+        self.price_bits = [0] * len(self.price_edges)
+        self.rating_bits = [0] * len(self.rating_bands)
+        self.categories = {}
+        self.names = {}
+
+    def _grow(self, max_id):
+        if max_id < self.size:
+            return
+        size = max(2 * self.size, max_id + 1)
+        for name, fill in (('exists', False), ('price', np.nan), ('inventory', 0), ('rating', 0.0)):
+            old = getattr(self, name)
+            new = np.full(size, fill, dtype=old.dtype)
+            new[:self.size] = old
+            setattr(self, name, new)
+        self.size = size
+
+    def _ids_mask(self, ids):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[ids[ids < self.size]] = True
+        return mask
+
+    def _derive(self, ids=None):
+        """Recompute the column-derived bitmaps, for every product or only ``ids``."""
+        if ids is None:
+            at, keep = slice(None), 0
+        else:
+            at = ids[ids < self.size]
+            keep = ~_to_bits(self._ids_mask(at))
+        exists, price = self.exists[at], self.price[at]
+        buckets = np.searchsorted(self.price_edges, np.nan_to_num(price, nan=-1.0), side='right') - 1
+
+        def bits(values):
+            if ids is None:
+                return _to_bits(values)
+            mask = np.zeros(self.size, dtype=bool)
+            mask[at] = values
+            return _to_bits(mask)
+
+        self.all = (self.all & keep) | bits(exists)
+        self.in_stock = (self.in_stock & keep) | bits(exists & (self.inventory[at] > 0))
+        for i in range(len(self.price_edges)):
+            self.price_bits[i] = (self.price_bits[i] & keep) | bits(exists & (buckets == i))
+        rating = self.rating[at]
+        for i, band in enumerate(self.rating_bands):
+            self.rating_bits[i] = (self.rating_bits[i] & keep) | bits(exists & (rating >= band))
+
+    def load_products(self, rows):
+        """Set price, inventory and rating of ``(product_id, price, inventory, rating)`` rows."""
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64)
+        table = np.array([(pid, float(price), inventory, float(rating or 0.0))
+                          for pid, price, inventory, rating in rows], dtype=np.float64)
+        ids = table[:, 0].astype(np.int64)
+        self._grow(int(ids.max()))
+        self.exists[ids] = True
+        self.price[ids] = table[:, 1]
+        self.inventory[ids] = table[:, 2].astype(np.int64)
+        self.rating[ids] = table[:, 3]
+        return ids
+
+    def set_links(self, links, names, product_ids=None):
+        """Category membership from ``(product_id, category_id)`` links; with
+        ``product_ids`` only those products' memberships are replaced."""
+        self.names.update(names)
+        members = {}
+        for pid, cid in links:
+            members.setdefault(cid, []).append(pid)
+        keep = -1
+        if product_ids is not None:
+            keep = ~_to_bits(self._ids_mask(np.asarray(product_ids, dtype=np.int64)))
+        for cid in set(self.categories) | set(members):
+            bits = _to_bits(self._ids_mask(np.asarray(members[cid], dtype=np.int64))) if cid in members else 0
+            merged = (self.categories.get(cid, 0) & keep) | bits
+            if merged:
+                self.categories[cid] = merged
+            else:
+                self.categories.pop(cid, None)
+
+    def replace(self, product_ids, products, links, names):
+        self.load_products(products)
+        self._derive(np.asarray(product_ids, dtype=np.int64))
+        self.set_links(links, names, product_ids)
+
+    def set_inventory(self, inventory):
+        ids = np.fromiter(inventory, dtype=np.int64, count=len(inventory))
+        ids = ids[ids < self.size]
+        if not len(ids):
+            return
+        self.inventory[ids] = [inventory[pid] for pid in ids.tolist()]
+        was, now = self.in_stock, _to_bits(self._ids_mask(ids) & self.exists & (self.inventory > 0))
+        self.in_stock = (was & ~_to_bits(self._ids_mask(ids))) | now
+
+
+class FacetIndex:
+    """Facet bitmaps over all products; see the module docstring."""
+
+    def __init__(self, app=None):
+        self.price_edges = (0, 10, 25, 50, 100, 250, 500)
+        self.rating_bands = (4, 3, 2, 1)
+        self.refresh_seconds = 60
+        self.ready = False
+        self.last_refresh = 0.0
+        self._state = None
+        self._journal = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FACETS_ENABLED', True)
+        app.config.setdefault('FACET_PRICE_BUCKETS', (0, 10, 25, 50, 100, 250, 500))
+        app.config.setdefault('FACET_RATING_BANDS', (4, 3, 2, 1))
+        app.config.setdefault('FACET_REFRESH_SECONDS', 60)
+        self.price_edges = tuple(sorted(app.config['FACET_PRICE_BUCKETS']))
+        self.rating_bands = tuple(sorted(app.config['FACET_RATING_BANDS'], reverse=True))
+        self.refresh_seconds = app.config['FACET_REFRESH_SECONDS']
+        app.extensions['facet_index'] = self
+
+    # -- maintenance -------------------------------------------------------
+
+    def build(self, products, links, names):
+        """Replace the index with ``(product_id, price, inventory, rating)``
+        rows, ``(product_id, category_id)`` links and ``{category_id: name}``.
+
+        Changes applied while the rows were being read are replayed on the
+        new generation, so a rebuild never loses this worker's writes.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = _State(self.price_edges, self.rating_bands)
+            fresh.load_products(list(products))
+            fresh._derive()
+            fresh.set_links(links, names)
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            for method, args in self._journal:
+                getattr(fresh, method)(*args)
+            self._journal = None
+            self._state = fresh
+            self.last_refresh = time.monotonic()
+            self.ready = True
+
+    def ensure_ready(self, app, loader):
+        """Build the index now if it has never been built, and start a
+        background rebuild once it is older than FACET_REFRESH_SECONDS.
+
+        ``loader(product_ids=None)`` returns ``(products, links, names)`` for
+        ``build`` and is called inside an app context.
+        """
+        if not self.ready:
+            with self._build_lock:
+                if not self.ready:
+                    self.build(*loader())
+            return
+        if time.monotonic() - self.last_refresh < self.refresh_seconds:
+            return
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                with app.app_context():
+                    self.build(*loader())
+            except Exception as e:
+                app.logger.error(f'Facet index rebuild failed: {e}')
+                self.last_refresh = time.monotonic()
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name='facet-index-build', daemon=True).start()
+
+    def _apply(self, method, *args):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((method, args))
+            if self._state is not None:
+                getattr(self._state, method)(*args)
+
+    def reload(self, product_ids, loader):
+        """Re-read these products (columns and category links) after a write."""
+        product_ids = sorted(set(product_ids))
+        if not product_ids or not (self.ready or self._journal is not None):
+            return
+        products, links, names = loader(product_ids)
+        self._apply('replace', product_ids, list(products), list(links), dict(names))
+
+    def set_inventory(self, inventory):
+        """Apply known ``{product_id: inventory}`` values without a query."""
+        if inventory:
+            self._apply('set_inventory', dict(inventory))
+
+    # -- querying ----------------------------------------------------------
+
+    def _filter_bits(self, state, filters):
+        """Bitmap per filtered facet; absent facets are unfiltered."""
+        bits = {}
+        if filters.in_stock:
+            bits['in_stock'] = state.in_stock
+        if filters.category_ids:
+            union = 0
+            for cid in filters.category_ids:
+                union |= state.categories.get(cid, 0)
+            bits['category'] = union
+        if filters.min_price is not None or filters.max_price is not None:
+            mask = state.exists.copy()
+            if filters.min_price is not None:
+                mask &= state.price >= filters.min_price
+            if filters.max_price is not None:
+                mask &= state.price <= filters.max_price
+            bits['price'] = _to_bits(mask)
+        if filters.min_rating is not None:
+            bits['rating'] = _to_bits(state.exists & (state.rating >= filters.min_rating))
+        return bits
+
+    def facets(self, filters, product_ids=None):
+        """Facet counts for the products matching ``filters``, restricted to
+        ``product_ids`` (e.g. search hits) when given."""
+        with self._lock:
+            state = self._state
+            base = state.all
+            if product_ids is not None:
+                ids = np.fromiter(product_ids, dtype=np.int64)
+                base &= _to_bits(state._ids_mask(ids))
+            bits = self._filter_bits(state, filters)
+            categories, names = dict(state.categories), dict(state.names)
+            price_bits, rating_bits, in_stock = list(state.price_bits), list(state.rating_bits), state.in_stock
+
+        def without(facet):
+            result = base
+            for name, b in bits.items():
+                if name != facet:
+                    result &= b
+            return result
+
+        in_categories = without('category')
+        category_counts = []
+        for cid, members in categories.items():
+            count = (in_categories & members).bit_count()
+            if count or cid in filters.category_ids:
+                category_counts.append({'category_id': cid, 'name': names.get(cid), 'count': count,
+                                        'selected': cid in filters.category_ids})
+        category_counts.sort(key=lambda c: (c['name'] or '', c['category_id']))
+
+        in_prices = without('price')
+        edges = list(self.price_edges)
+        price_counts = [{'min': edges[i], 'max': edges[i + 1] if i + 1 < len(edges) else None,
+                         'count': (in_prices & b).bit_count()} for i, b in enumerate(price_bits)]
+
+        in_ratings = without('rating')
+        rating_counts = [{'min': band, 'count': (in_ratings & b).bit_count()}
+                         for band, b in zip(self.rating_bands, rating_bits)]
+
+        result = without(None)
+        return {
+            'total': result.bit_count(),
+            'in_stock': (without('in_stock') & in_stock).bit_count(),
+            'categories': category_counts,
+            'price': price_counts,
+            'rating': rating_counts,
+        }
+
+    def stats(self):
+        with self._lock:
+            state = self._state
+            if state is None:
+                return {'ready': False}
+            return {'ready': True, 'products': state.all.bit_count(), 'categories': len(state.categories),
+                    'age_seconds': round(time.monotonic() - self.last_refresh, 1)}
@@ -0,0 +1,173 @@
+"""Password hashing in a process pool, off the request threads.
+
+Hashing is deliberately slow (tens of milliseconds of CPU), and on a request
+thread it holds the GIL for that long, so a burst of logins stalls every
+other request the worker serves. ``PasswordHasher`` runs it in a pool of
+worker processes with a bounded number of jobs in flight: a request that
+finds the pool full fails at once with ``HasherBusy``, which becomes a 503
+with ``Retry-After``.
+
+``PASSWORD_HASH_METHOD``        werkzeug method and cost for new hashes
+                                (default ``scrypt:32768:8:1``;
+                                e.g. ``pbkdf2:sha256:600000``)
+``PASSWORD_SALT_LENGTH``        salt characters (default 16)
+``PASSWORD_HASH_WORKERS``       pool processes per server worker (default: the
+                                CPU count divided by ``WEB_CONCURRENCY``, which
+                                serve.py sets to its worker count, at least 1;
+                                2 when that is unset; 0 hashes inline on the
+                                request thread)
+``PASSWORD_HASH_MAX_PENDING``   jobs queued or running before HasherBusy
+                                (default 4 per pool process)
+``PASSWORD_HASH_TIMEOUT``       seconds a request waits for its result (default 10)
+``PASSWORD_HASH_RETRY_AFTER``   ``Retry-After`` seconds on a 503 (default 1)
+``PASSWORD_HASH_NICE``          niceness added to pool processes, so hashing
+                                yields the CPU to request workers (default 0)
+
+``verify`` also reports a replacement hash when the stored one was made with
+a different method or cost, so logins upgrade hashes as settings change.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method, salt_length):
+    # werkzeug fills in default costs, so compare against what it actually writes
+    return generate_password_hash('', method, salt_length).split('$', 1)[0]
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method, salt_length)
+
+
+def _verify(pwhash, password, method, salt_length):
+    """``(matches, new_hash)``; ``new_hash`` is None unless the password
+    matched and ``pwhash`` uses other parameters than ``method``."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split('$', 1)[0] == _method_prefix(method, salt_length):
+        return True, None
+    return True, generate_password_hash(password, method, salt_length)
+
+
+def default_pool_size(environ=os.environ):
+    """Pool processes per server worker, so all workers' pools together use about one process per core."""
+    cores = os.cpu_count() or 1
+    try:
+        server_workers = int(environ.get('WEB_CONCURRENCY') or 0)
+    except ValueError:
+        server_workers = 0
+    if server_workers <= 0:
+        return min(2, cores)
+    return max(1, cores // server_workers)
+
+
+def _init_worker(nice):
+    if nice:
+        os.nice(nice)
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = 10.0
+        self.nice = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', default_pool_size())
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', None)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+        app.config.setdefault('PASSWORD_HASH_RETRY_AFTER', 1)
+        app.config.setdefault('PASSWORD_HASH_NICE', 0)
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = app.config['PASSWORD_SALT_LENGTH']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING'] or 4 * max(self.workers, 1)
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.nice = app.config['PASSWORD_HASH_NICE']
+        app.extensions['password_hasher'] = self
+
+        @app.errorhandler(HasherBusy)
+        def _hasher_busy(e):
+            response = jsonify({'msg': 'Server busy, try again shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(app.config['PASSWORD_HASH_RETRY_AFTER'])
+            return response
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """``(matches, new_hash)``, see ``_verify``."""
+        return self._run(_verify, pwhash, password, self.method, self.salt_length)
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self._pending, 'max_pending': self.max_pending}
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy(f'{self._pending} password hashes pending')
+            self._pending += 1
+            pool = self._get_pool_locked()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._discard(pool)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise HasherBusy(f'password hash not done after {self.timeout}s')
+        except BrokenProcessPool:
+            self._discard(pool)
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _discard(self, pool):
+        # a pool process died; the next hash starts a fresh pool
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        raise HasherBusy('password hashing pool restarted')
+
+    def _get_pool_locked(self):
+        if self._pid != os.getpid():
+            # a pool inherited through fork belongs to the parent; start our own
+            self._pid = os.getpid()
+            self._pending = 1
+            self._pool = None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(self.nice,))
+        return self._pool
@@ -0,0 +1,304 @@
+"""SQL statement accounting, per-request metrics and slow-request profiling.
+
+SQLAlchemy engine events count and time every statement issued inside an app
+context; Flask request hooks turn that into per-request wall time, SQL count,
+DB time and slowest statement. ``init_app`` wires the hooks up and, depending
+on config:
+
+``METRICS_ENABLED``            serve per-route Prometheus histograms on ``/metrics``
+                               and add a ``Server-Timing`` header (default on)
+``SLOW_REQUEST_MS``            log requests slower than this with their slowest
+                               statement (default 500, ``None`` disables)
+``PROFILE_SLOW_REQUESTS``      sample the stack of every request and write the
+                               samples of slow ones to ``PROFILE_DIR`` in folded
+                               (flame-graph) format (default off)
+``PROFILE_THRESHOLD_MS``       what counts as slow for the profiler (defaults to
+                               ``SLOW_REQUEST_MS``)
+``PROFILE_SAMPLE_INTERVAL``    seconds between stack samples (default 0.005)
+``QUERY_COUNT_HEADER``         send ``X-Query-Count`` (used by bench/load_test.py)
+
+Metrics are per process; with several workers each one serves its own.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        if context is not None:
+            context._instrumentation_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is None or not has_app_context():
+        return
+    elapsed = time.perf_counter() - started
+    g.sql_time = g.get('sql_time', 0.0) + elapsed
+    if elapsed > g.get('sql_slowest_time', 0.0):
+        g.sql_slowest_time = elapsed
+        g.sql_slowest = statement
+
+
+def statement_count():
+    """Statements issued so far in the current app/request context."""
+    return g.get('sql_statements', 0)
+
+
+def sql_time():
+    """Seconds spent executing statements in the current app/request context."""
+    return g.get('sql_time', 0.0)
+
+
+def slowest_statement():
+    """``(seconds, sql)`` of the slowest statement so far, or ``(0.0, None)``."""
+    return g.get('sql_slowest_time', 0.0), g.get('sql_slowest')
+
+
+# -- metrics --------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self._series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}'
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {cumulative}'
+            yield f'{self.name}_sum{{{base}}} {total}'
+            yield f'{self.name}_count{{{base}}} {cumulative}'
+
+
+class CounterMetric:
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = Counter()
+
+    def inc(self, labels, amount=1):
+        self._values[labels] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._values.items()):
+            yield f'{self.name}{{{_labels(self.label_names, labels)}}} {value}'
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """Per-route request metrics for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = CounterMetric('ekart_requests_total', 'Requests served.', ('route', 'method', 'status'))
+        self.duration = Histogram('ekart_request_duration_seconds', 'Request wall time.',
+                                  ('route', 'method'), LATENCY_BUCKETS)
+        self.db_time = Histogram('ekart_request_db_seconds', 'Time spent executing SQL per request.',
+                                 ('route', 'method'), LATENCY_BUCKETS)
+        self.statements = Histogram('ekart_request_sql_statements', 'SQL statements issued per request.',
+                                    ('route', 'method'), STATEMENT_BUCKETS)
+        self.slowest = Histogram('ekart_request_slowest_sql_seconds', 'Slowest single SQL statement per request.',
+                                 ('route', 'method'), LATENCY_BUCKETS)
+
+    def record(self, route, method, status, wall, statements, db_time, slowest):
+        labels = (route, method)
+        with self._lock:
+            self.requests.inc((route, method, status))
+            self.duration.observe(labels, wall)
+            self.db_time.observe(labels, db_time)
+            self.statements.observe(labels, statements)
+            self.slowest.observe(labels, slowest)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.db_time, self.statements, self.slowest):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# -- sampling profiler ----------------------------------------------------
+
+class StackSampler:
+    """Samples the Python stacks of threads that are serving a request.
+
+    One daemon thread per process wakes every ``interval`` seconds and adds
+    the current stack of each registered thread to that thread's counter.
+    Stacks are folded root-first into ``frame;frame;frame`` strings, the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def start(self, ident):
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                    self._thread.start()
+        self._active[ident] = Counter()
+
+    def stop(self, ident):
+        return self._active.pop(ident, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, counts in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    counts[_fold(frame)] += 1
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _write_profile(directory, endpoint, wall, samples):
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint or 'unmatched'}-{wall * 1e3:.0f}ms.folded"
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+# -- Flask integration ----------------------------------------------------
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    app.config.setdefault('PROFILE_SLOW_REQUESTS', False)
+    app.config.setdefault('PROFILE_THRESHOLD_MS', None)
+    app.config.setdefault('PROFILE_SAMPLE_INTERVAL', 0.005)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+    app.config.setdefault('QUERY_COUNT_HEADER', False)
+    metrics = RequestMetrics()
+    sampler = StackSampler(app.config['PROFILE_SAMPLE_INTERVAL'])
+    app.extensions['request_metrics'] = metrics
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        if app.config['PROFILE_SLOW_REQUESTS']:
+            sampler.start(threading.get_ident())
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        wall = time.perf_counter() - started
+        statements, db_time = statement_count(), sql_time()
+        slowest_time, slowest_sql = slowest_statement()
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+        if app.config['METRICS_ENABLED']:
+            metrics.record(route, request.method, response.status_code, wall, statements, db_time, slowest_time)
+            response.headers['Server-Timing'] = f'db;dur={db_time * 1e3:.1f}, app;dur={wall * 1e3:.1f}'
+        if app.config['QUERY_COUNT_HEADER']:
+            response.headers['X-Query-Count'] = str(statements)
+
+        slow_ms = app.config['SLOW_REQUEST_MS']
+        if slow_ms is not None and wall * 1e3 >= slow_ms:
+            app.logger.warning(
+                f'Slow request {request.method} {route}: {wall * 1e3:.1f} ms, {statements} SQL statements '
+                f'taking {db_time * 1e3:.1f} ms; slowest {slowest_time * 1e3:.1f} ms: '
+                f"{' '.join((slowest_sql or '-').split())[:500]}"
+            )
+
+        if app.config['PROFILE_SLOW_REQUESTS']:
+            samples = sampler.stop(threading.get_ident())
+            threshold = app.config['PROFILE_THRESHOLD_MS'] or slow_ms
+            if samples and threshold is not None and wall * 1e3 >= threshold:
+                path = _write_profile(app.config['PROFILE_DIR'], request.endpoint, wall, samples)
+                app.logger.info(f'Wrote {sum(samples.values())} stack samples to {path}')
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        if not app.config['METRICS_ENABLED']:
+            return Response('metrics disabled\n', status=404, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def query_budget(limit):
+    """Cap the number of SQL statements a view may issue.
+
+    The count must not depend on how many rows the view touches, so a budget
+    breach means an N+1 pattern crept back in. A breach is logged;
+    tests/test_query_budget.py holds the views to their budgets.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            before = statement_count()
+            response = view(*args, **kwargs)
+            used = statement_count() - before
+            if used > limit:
+                current_app.logger.warning(f'{view.__name__} issued {used} SQL statements (budget {limit})')
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,47 @@
+"""Background worker threads for deferred, batched maintenance work."""
+import os
+import threading
+
+
+class PeriodicWorker:
+    """Runs ``task()`` inside an app context every ``interval`` seconds, or
+    sooner when ``notify()`` is called.
+
+    The thread is started lazily by ``ensure_started`` so that pre-forking
+    servers get one worker per child process rather than one in the master.
+    """
+
+    def __init__(self, name, task, interval=5.0):
+        self.name = name
+        self.task = task
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def ensure_started(self, app):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(app,), name=self.name, daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def run_once(self, app):
+        with app.app_context():
+            try:
+                return self.task()
+            except Exception as e:
+                app.logger.exception(f'{self.name} failed: {e}')
+
+    def _run(self, app):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.run_once(app)
@@ -0,0 +1,75 @@
+"""Flask JSON provider with native Decimal/datetime support and an optional orjson fast path.
+
+Response rows can carry column values straight from the database: ``Decimal``
+is written as a number and ``date``/``datetime`` as ISO 8601, the same output
+the handlers used to produce with ``float()`` and ``isoformat()``. When the
+optional ``orjson`` package is installed it does the encoding (and request
+decoding); otherwise the stdlib encoder is used with the same output.
+
+``JSON_ENCODER`` selects the backend: ``auto`` (default; orjson if
+importable), ``orjson`` (fail if missing) or ``stdlib``.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+
+def json_default(o):
+    """``json.dumps`` ``default=`` hook for the types the database hands back."""
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(json_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._orjson = None
+        backend = app.config.get('JSON_ENCODER', 'auto')
+        if backend in ('auto', 'orjson'):
+            try:
+                import orjson
+                self._orjson = orjson
+            except ImportError as e:
+                if backend == 'orjson':
+                    raise ImportError('JSON_ENCODER=orjson needs the orjson package '
+                                      '(pip install -r requirements-optional.txt)') from e
+
+    @property
+    def backend(self):
+        return 'orjson' if self._orjson is not None else 'stdlib'
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = self._orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= self._orjson.OPT_SORT_KEYS
+        if indent:
+            option |= self._orjson.OPT_INDENT_2
+        return self._orjson.dumps(obj, default=json_default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if self._orjson is not None and not kwargs:
+            return self._orjson_dumps(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self._orjson is not None and not kwargs:
+            return self._orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self._orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._orjson_dumps(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.config.setdefault('JSON_ENCODER', 'auto')
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,273 @@
+"""Versioned schema migrations.
+
+Applied once per deploy with ``flask db-upgrade`` (or on ``python app.py``
+startup); applied versions are recorded in ``schema_migrations``. Each
+migration is a function taking the Flask-SQLAlchemy ``db`` and must be safe to
+re-run against a schema that already has its change, because databases
+created before this runner existed were set up by ``db.create_all()`` and
+ad-hoc ALTERs.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from archive import CATCH_ALL_PARTITION, partitioned_tables
+
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _columns(db, table):
+    return {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+
+
+def add_column_if_missing(db, table, column, ddl):
+    if column not in _columns(db, table):
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def create_index_if_missing(db, table, name, columns, unique=False):
+    existing = {ix['name'] for ix in inspect(db.session.connection()).get_indexes(table)}
+    if name not in existing:
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        db.session.execute(text(f'CREATE {kind} {name} ON {table} ({", ".join(columns)})'))
+
+
+def create_tables(db, *names):
+    bind = db.session.connection()
+    for name in names:
+        db.Model.metadata.tables[name].create(bind, checkfirst=True)
+
+
+# -- migrations -----------------------------------------------------------
+
+@migration(1, 'baseline schema')
+def _baseline(db):
+    create_tables(db, 'users', 'products', 'product_meta', 'categories', 'product_categories',
+                  'orders', 'order_items', 'cart')
+
+
+@migration(2, 'users.is_active')
+def _users_is_active(db):
+    add_column_if_missing(db, 'users', 'is_active', 'TINYINT(1) NOT NULL DEFAULT 1')
+
+
+@migration(3, 'product_meta.rating_count')
+def _product_meta_rating_count(db):
+    add_column_if_missing(db, 'product_meta', 'rating_count', 'INT NOT NULL DEFAULT 0')
+
+
+@migration(4, 'sales rollup tables')
+def _sales_rollups(db):
+    create_tables(db, 'sales_daily', 'sales_monthly')
+    rows = db.session.execute(text(
+        "SELECT DATE(o.created_at), SUM(oi.price_at_purchase * oi.quantity), COUNT(DISTINCT o.order_id) "
+        "FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+        "WHERE o.status IN ('paid', 'shipped', 'delivered') "
+        "GROUP BY DATE(o.created_at)"
+    )).fetchall()
+    db.session.execute(text('DELETE FROM sales_daily'))
+    db.session.execute(text('DELETE FROM sales_monthly'))
+    monthly = {}
+    for day, sales, orders in rows:
+        day = str(day)[:10]
+        db.session.execute(text('INSERT INTO sales_daily (day, sales, orders) VALUES (:d, :s, :o)'),
+                           {'d': day, 's': sales, 'o': orders})
+        m = monthly.setdefault(day[:7], [0, 0])
+        m[0] += sales
+        m[1] += orders
+    for month, (sales, orders) in monthly.items():
+        db.session.execute(text('INSERT INTO sales_monthly (month, sales, orders) VALUES (:m, :s, :o)'),
+                           {'m': month, 's': sales, 'o': orders})
+
+
+@migration(5, 'product_ratings log')
+def _product_ratings(db):
+    create_tables(db, 'product_ratings')
+
+
+@migration(6, 'popularity scoring')
+def _popularity(db):
+    add_column_if_missing(db, 'product_meta', 'popularity_score', 'FLOAT NOT NULL DEFAULT 0')
+    create_index_if_missing(db, 'product_meta', 'ix_product_meta_popularity', ['popularity'])
+    create_tables(db, 'product_events', 'popularity_state')
+
+
+@migration(7, 'secondary indexes and cart (user_id, product_id) key')
+def _indexes(db):
+    # collapse duplicate cart lines into the oldest row before adding the unique key
+    dupes = db.session.execute(text(
+        'SELECT user_id, product_id, MIN(cart_id), SUM(quantity) FROM cart '
+        'GROUP BY user_id, product_id HAVING COUNT(*) > 1'
+    )).fetchall()
+    for user_id, product_id, keep_id, quantity in dupes:
+        db.session.execute(text('UPDATE cart SET quantity = :q WHERE cart_id = :id'), {'q': quantity, 'id': keep_id})
+        db.session.execute(text('DELETE FROM cart WHERE user_id = :u AND product_id = :p AND cart_id <> :id'),
+                           {'u': user_id, 'p': product_id, 'id': keep_id})
+    create_index_if_missing(db, 'cart', 'uq_cart_user_product', ['user_id', 'product_id'], unique=True)
+    create_index_if_missing(db, 'users', 'ix_users_is_active', ['is_active'])
+    create_index_if_missing(db, 'products', 'ix_products_price', ['price'])
+    create_index_if_missing(db, 'product_meta', 'ix_product_meta_rating', ['rating'])
+    create_index_if_missing(db, 'product_categories', 'ix_product_categories_category_product',
+                            ['category_id', 'product_id'])
+    create_index_if_missing(db, 'orders', 'ix_orders_user_created', ['user_id', 'created_at'])
+    create_index_if_missing(db, 'orders', 'ix_orders_status_created', ['status', 'created_at'])
+    create_index_if_missing(db, 'orders', 'ix_orders_created', ['created_at'])
+    create_index_if_missing(db, 'order_items', 'ix_order_items_order', ['order_id'])
+    create_index_if_missing(db, 'order_items', 'ix_order_items_product_qty', ['product_id', 'quantity'])
+    # listings inner-join product_meta, so every product needs a row
+    db.session.execute(text(
+        'INSERT INTO product_meta (product_id, rating, rating_count, popularity, popularity_score) '
+        'SELECT p.product_id, 0, 0, 0, 0 FROM products p '
+        'LEFT JOIN product_meta m ON m.product_id = p.product_id WHERE m.product_id IS NULL'
+    ))
+
+
+@migration(8, 'products.sku and unique product category links')
+def _bulk_import_keys(db):
+    add_column_if_missing(db, 'products', 'sku', 'VARCHAR(64) NULL')
+    create_index_if_missing(db, 'products', 'uq_products_sku', ['sku'], unique=True)
+    dupes = db.session.execute(text(
+        'SELECT product_id, category_id, MIN(id) FROM product_categories '
+        'GROUP BY product_id, category_id HAVING COUNT(*) > 1'
+    )).fetchall()
+    for product_id, category_id, keep_id in dupes:
+        db.session.execute(text('DELETE FROM product_categories '
+                                'WHERE product_id = :p AND category_id = :c AND id <> :id'),
+                           {'p': product_id, 'c': category_id, 'id': keep_id})
+    create_index_if_missing(db, 'product_categories', 'uq_product_categories_product_category',
+                            ['product_id', 'category_id'], unique=True)
+
+
+@migration(9, 'replica heartbeat')
+def _replica_heartbeat(db):
+    create_tables(db, 'replica_heartbeat')
+
+
+@migration(10, 'order archive tables, month-partitioned on MySQL')
+def _order_archive(db):
+    create_tables(db, 'orders_archive', 'order_items_archive')
+    if db.engine.dialect.name != 'mysql':
+        return
+    tables = ('orders_archive', 'order_items_archive')
+    for table in sorted(set(tables) - partitioned_tables(db.session.connection(), tables)):
+        # months are split off the catch-all as the archive job reaches them
+        db.session.execute(text(f'ALTER TABLE {table} PARTITION BY RANGE COLUMNS(created_at) '
+                                f'(PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN (MAXVALUE))'))
+
+
+@migration(11, 'products.updated_at for incremental search refresh')
+def _products_updated_at(db):
+    if db.engine.dialect.name == 'mysql':
+        # the server keeps it current for writes that do not come through the app
+        ddl = 'DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'
+    else:
+        ddl = "DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'"
+    add_column_if_missing(db, 'products', 'updated_at', ddl)
+    create_index_if_missing(db, 'products', 'ix_products_updated_at', ['updated_at'])
+
+
+@migration(12, 'order status and product sales rollups')
+def _order_rollups(db):
+    create_tables(db, 'order_status_counts', 'product_sales')
+    db.session.execute(text('DELETE FROM order_status_counts'))
+    db.session.execute(text('DELETE FROM product_sales'))
+    db.session.execute(text(
+        'INSERT INTO order_status_counts (status, orders) '
+        'SELECT status, SUM(n) FROM ('
+        ' SELECT status, COUNT(*) AS n FROM orders GROUP BY status'
+        ' UNION ALL SELECT status, COUNT(*) AS n FROM orders_archive GROUP BY status'
+        ') counted GROUP BY status'
+    ))
+    db.session.execute(text(
+        'INSERT INTO product_sales (product_id, quantity) '
+        'SELECT product_id, SUM(qty) FROM ('
+        ' SELECT product_id, SUM(quantity) AS qty FROM order_items GROUP BY product_id'
+        ' UNION ALL SELECT product_id, SUM(quantity) AS qty FROM order_items_archive GROUP BY product_id'
+        ') sold GROUP BY product_id'
+    ))
+
+
+# -- runner ---------------------------------------------------------------
+
+def _ensure_version_table(db):
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        ' version INTEGER PRIMARY KEY,'
+        ' description VARCHAR(255) NOT NULL,'
+        ' applied_at DATETIME NOT NULL)'
+    ))
+    db.session.commit()
+
+
+def applied_versions(db):
+    _ensure_version_table(db)
+    return {row[0] for row in db.session.execute(text('SELECT version FROM schema_migrations'))}
+
+
+@contextmanager
+def _migration_lock(db):
+    """Serialise concurrent runners (e.g. several containers starting at once) on MySQL."""
+    if db.engine.dialect.name != 'mysql':
+        yield
+        return
+    # GET_LOCK is per connection, so hold a dedicated one for the whole run
+    with db.engine.connect() as conn:
+        got = conn.execute(text("SELECT GET_LOCK('ekart_schema_migrations', 60)")).scalar()
+        if not got:
+            raise RuntimeError('Timed out waiting for the schema migration lock')
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('ekart_schema_migrations')"))
+
+
+def upgrade(db, log=print):
+    """Apply every pending migration in version order; return the versions applied."""
+    done = []
+    with _migration_lock(db):
+        applied = applied_versions(db)
+        for version, description, fn in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                fn(db)
+                db.session.execute(
+                    text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            log(f'Applied migration {version}: {description}')
+            done.append(version)
+    return done
+
+
+def status(db):
+    applied = applied_versions(db)
+    return [(version, description, version in applied) for version, description, _ in MIGRATIONS]
+
+
+def init_app(app, db):
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations."""
+        if not upgrade(db):
+            print('Schema is up to date')
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """List schema migrations and whether they have been applied."""
+        for version, description, is_applied in status(db):
+            print(f"{version:>4}  {'applied' if is_applied else 'pending':<8} {description}")
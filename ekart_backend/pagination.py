@@ -0,0 +1,68 @@
+"""Keyset (cursor) pagination helpers shared by the listing endpoints."""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+    return value
+
+
+def encode_cursor(sort, values):
+    """Pack the sort name and the last row's sort key into an opaque token."""
+    payload = json.dumps({'s': sort, 'k': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Return the key values stored in ``token``; raise InvalidCursor if it is
+    malformed or was issued for a different sort order."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in payload['k']]
+    except Exception:
+        raise InvalidCursor('Malformed cursor')
+    if payload.get('s') != sort:
+        raise InvalidCursor('Cursor does not match sort order')
+    return values
+
+
+def keyset_condition(columns, values):
+    """Build ``WHERE`` for rows strictly after ``values`` in ``columns`` order.
+
+    ``columns`` is a list of ``(expression, descending)`` pairs ending with a
+    unique column, so ``(a, b) > (x, y)`` expands to
+    ``a > x OR (a = x AND b > y)`` with the comparison flipped for
+    descending columns. Each branch is index-friendly on a composite key.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(columns):
+        equal = [c == v for (c, _), v in zip(columns[:i], values[:i])]
+        after = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses)
+
+
+def order_by_clauses(columns):
+    return [column.desc() if descending else column.asc() for column, descending in columns]
@@ -0,0 +1,52 @@
+"""Time-decayed popularity scores computed over column arrays with numpy.
+
+A unit sold (or viewed, or added to a cart) contributes ``weight * 2**(-age /
+half_life)`` to its product's score, so a sale from one half-life ago counts
+half as much as one today. Because the decay is exponential, a stored score
+can be brought forward in time by multiplying it by ``decay_factor`` and then
+adding new contributions; a full recompute is only needed after changing the
+half-life or weights.
+"""
+import numpy as np
+
+
+SECONDS_PER_DAY = 86400.0
+
+# ProductMeta.popularity is an integer column; scores are stored scaled.
+SCORE_SCALE = 100
+
+
+def decay_factor(elapsed_seconds, half_life_days):
+    return float(np.exp2(-max(elapsed_seconds, 0.0) / (half_life_days * SECONDS_PER_DAY)))
+
+
+def contributions(product_ids, quantities, timestamps, now, half_life_days, weight=1.0, size=None):
+    """Dense per-product score contributions for one batch of events.
+
+    ``product_ids``, ``quantities`` and ``timestamps`` (epoch seconds) are
+    equal-length arrays. Returns a float64 array indexed by product_id with
+    length ``size`` (or ``max(product_ids) + 1``).
+    """
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    if product_ids.size == 0:
+        return np.zeros(size or 0)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    ages = now - np.asarray(timestamps, dtype=np.float64)
+    np.maximum(ages, 0.0, out=ages)
+    decayed = weight * quantities * np.exp2(-ages / (half_life_days * SECONDS_PER_DAY))
+    minlength = max(size or 0, int(product_ids.max()) + 1)
+    return np.bincount(product_ids, weights=decayed, minlength=minlength)
+
+
+def add_dense(total, part):
+    """Add ``part`` into ``total`` (growing it if needed) and return the result."""
+    if len(part) > len(total):
+        total = np.concatenate([total, np.zeros(len(part) - len(total))])
+    total[:len(part)] += part
+    return total
+
+
+def nonzero_scores(dense):
+    """``[(product_id, score), ...]`` for every product with a positive score."""
+    ids = np.flatnonzero(dense > 0)
+    return list(zip(ids.tolist(), dense[ids].tolist()))
@@ -0,0 +1,27 @@
+"""Response rows built straight from SQL column tuples.
+
+Listing endpoints select exactly the columns they return and turn each result
+tuple into a dict, instead of hydrating ORM objects and copying attributes
+one by one. Values are left as the driver returns them (``Decimal``,
+``datetime``); the JSON provider serialises those natively.
+"""
+
+
+class Projection:
+    """An ordered set of labelled columns and the dict shape they produce.
+
+    ``Projection(product_id=Product.product_id, price=Product.price)`` gives
+    ``columns`` for ``select()``/``with_entities()`` and ``rows()`` to turn
+    the result into ``[{'product_id': ..., 'price': ...}, ...]``.
+    """
+
+    def __init__(self, **columns):
+        self.keys = list(columns)
+        self.columns = [column.label(key) for key, column in columns.items()]
+
+    def row(self, values):
+        return dict(zip(self.keys, values))
+
+    def rows(self, result):
+        keys = self.keys
+        return [dict(zip(keys, values)) for values in result]
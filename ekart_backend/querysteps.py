@@ -0,0 +1,100 @@
+"""Handlers written once, run on the session or concurrently on an async engine.
+
+A *steps generator* yields what it needs next and is sent the result:
+
+- a statement: its rows as a list, or the rowcount of an INSERT, UPDATE or
+  DELETE, which is committed on its own;
+- a list of statements: their results in the same order. Statements yielded
+  together must not depend on each other;
+- ``Call(fn, *args)``: the return value of ``fn(*args)``, for blocking work
+  that is not a single statement (the search and facet index loaders).
+
+A failing statement or call raises its exception at the ``yield``. The
+generator's return value is the result of ``run``/``run_async``.
+
+``run`` executes everything in order on the Flask-SQLAlchemy session, as
+the threaded views always have. ``run_async`` (used by aio.py) gives each
+statement its own pooled connection, so statements yielded together run at
+the same time and do not share a snapshot. It runs calls in a worker thread.
+
+    def page_steps():
+        (total,), rows = yield [count_stmt, page_stmt]
+        return {'total': total[0], 'items': rows}
+"""
+import asyncio
+
+
+class Call:
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+
+def _is_dml(statement):
+    return getattr(statement, 'is_dml', False)
+
+
+def _execute(session, item):
+    if isinstance(item, Call):
+        return item.fn(*item.args)
+    try:
+        result = session.execute(item)
+        if _is_dml(item):
+            session.commit()
+            return result.rowcount
+        return result.all()
+    except Exception:
+        session.rollback()
+        raise
+
+
+async def _execute_async(engine, item):
+    if isinstance(item, Call):
+        return await asyncio.to_thread(item.fn, *item.args)
+    if _is_dml(item):
+        async with engine.begin() as conn:
+            return (await conn.execute(item)).rowcount
+    async with engine.connect() as conn:
+        return (await conn.execute(item)).all()
+
+
+def run(steps, session):
+    """Drive ``steps`` on ``session``, one statement at a time."""
+    result, error = None, None
+    while True:
+        try:
+            request = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(request, list):
+                result = [_execute(session, item) for item in request]
+            else:
+                result = _execute(session, request)
+        except Exception as e:
+            error = e
+
+
+async def run_async(steps, engine):
+    """Drive ``steps`` on the async ``engine``, running each list of statements concurrently."""
+    result, error = None, None
+    while True:
+        try:
+            request = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(request, list):
+                # let every statement finish (and return its connection) before raising
+                outcomes = await asyncio.gather(*(_execute_async(engine, item) for item in request),
+                                                return_exceptions=True)
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                result = outcomes
+            else:
+                result = await _execute_async(engine, request)
+        except Exception as e:
+            error = e
@@ -0,0 +1,182 @@
+"""Read-replica routing for read-only views.
+
+Replicas are extra Flask-SQLAlchemy binds named ``replica1``, ``replica2``,
+... (see ``config.replica_binds``). Views decorated with ``@replica_read``
+send their SELECTs to a replica. Everything else stays on the primary:
+other views, background jobs, CLI commands, and within a replica view any
+INSERT/UPDATE/DELETE, ``FOR UPDATE`` read or flush. Views that must see the
+caller's own writes right away are simply not marked, such as the cart after
+``add_to_cart`` or an order after ``place_order``.
+
+Replicas are used only while they are known to be current enough.
+``replica-monitor``, a PeriodicWorker in each process, runs every
+``REPLICA_CHECK_INTERVAL`` seconds. It writes the time to the one-row
+``replica_heartbeat`` table on the primary and reads the row back from every
+replica. The last beat a replica returns is a lower bound for how far it has
+replayed, since replication applies commits in order. A replica more than
+``REPLICA_MAX_LAG`` seconds behind, or unreachable, is skipped. When no
+replica qualifies, the read goes to the primary.
+
+Read-your-writes across views and workers: a request that commits to the
+primary sets the ``REPLICA_FENCE_COOKIE`` cookie to its commit time. That
+client's replica views then read only from replicas that have replayed past
+that time, so an admin who edits a product sees the edit in the listing. The
+cookie lives ``REPLICA_MAX_LAG`` seconds, after which every usable replica
+has the write. ``REPLICA_MAX_LAG = None`` turns the lag checks off and always
+uses the replicas, except for fenced clients. This suits replicas that are
+not replicating, such as tests and snapshots.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+
+from jobs import PeriodicWorker
+
+
+HEARTBEAT_TABLE = 'replica_heartbeat'
+
+
+def replica_read(view):
+    """Let the view's reads go to a replica (see the module docstring)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.replica_read = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session whose reads inside ``@replica_read`` views go to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('replica_read') and not self._flushing \
+                and not getattr(clause, 'is_dml', False) and getattr(clause, '_for_update_arg', None) is None:
+            router = current_app.extensions.get('replica_router')
+            engine = router.engine_for_request() if router is not None else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, db, app=None):
+        self.db = db
+        self.binds = []
+        self.max_lag = 5.0
+        self.cookie = 'ekart_read_after'
+        self.monitor = PeriodicWorker('replica-monitor', self.check)
+        self._lock = threading.Lock()
+        self._replayed = {}
+        self._errors = {}
+        self._routed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_MAX_LAG', 5.0)
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 1.0)
+        app.config.setdefault('REPLICA_FENCE_COOKIE', 'ekart_read_after')
+        self.binds = sorted(k for k in app.config.get('SQLALCHEMY_BINDS') or {} if k.startswith('replica'))
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        self.cookie = app.config['REPLICA_FENCE_COOKIE']
+        self.monitor.interval = app.config['REPLICA_CHECK_INTERVAL']
+        app.extensions['replica_router'] = self
+        if not self.binds:
+            return
+        with app.app_context():
+            event.listen(self.db.engine, 'commit', self._on_primary_commit)
+        app.after_request(self._set_fence)
+
+    # -- read-your-writes ----------------------------------------------------
+
+    def _on_primary_commit(self, conn):
+        if has_request_context():
+            g.primary_commit_at = time.time()
+
+    def _set_fence(self, response):
+        committed = g.get('primary_commit_at')
+        if committed is not None and request.method not in ('GET', 'HEAD'):
+            response.set_cookie(self.cookie, '%d' % (committed * 1000), max_age=int(self.max_lag or 5) + 1,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def _fence(self):
+        """Commit time of the client's last write, if it may not be on every replica yet."""
+        try:
+            return int(request.cookies.get(self.cookie, '')) / 1000.0
+        except ValueError:
+            return None
+
+    # -- routing -------------------------------------------------------------
+
+    def eligible(self, fence=None):
+        """Replica binds that are within REPLICA_MAX_LAG and have replayed past ``fence``."""
+        if self.max_lag is None:
+            return [] if fence is not None else list(self.binds)
+        now = time.time()
+        with self._lock:
+            return [b for b, replayed in self._replayed.items()
+                    if now - replayed <= self.max_lag and (fence is None or replayed >= fence)]
+
+    def engine_for_request(self):
+        """The replica engine for this request, chosen on its first read, or
+        None for the primary."""
+        if not self.binds:
+            return None
+        if 'replica_bind' not in g:
+            if self.max_lag is not None:
+                self.monitor.ensure_started(current_app._get_current_object())
+            candidates = self.eligible(self._fence())
+            g.replica_bind = random.choice(candidates) if candidates else None
+            with self._lock:
+                key = g.replica_bind or 'primary'
+                self._routed[key] = self._routed.get(key, 0) + 1
+        return self.db.engines[g.replica_bind] if g.replica_bind else None
+
+    # -- lag monitoring ------------------------------------------------------
+
+    def check(self):
+        """Write a heartbeat to the primary and record how far each replica has replayed."""
+        params = {'id': 1, 'beat': int(time.time() * 1000)}
+        with self.db.engine.begin() as conn:
+            if not conn.execute(text(f'UPDATE {HEARTBEAT_TABLE} SET beat_ms = :beat WHERE id = :id'),
+                                params).rowcount:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(f'INSERT INTO {HEARTBEAT_TABLE} (id, beat_ms) VALUES (:id, :beat)'),
+                                     params)
+                except IntegrityError:
+                    pass  # another worker inserted it first; its beat is as good
+        for bind in self.binds:
+            try:
+                with self.db.engines[bind].connect() as conn:
+                    beat = conn.execute(text(f'SELECT beat_ms FROM {HEARTBEAT_TABLE} WHERE id = 1')).scalar()
+            except Exception as e:
+                with self._lock:
+                    self._replayed.pop(bind, None)
+                    self._errors[bind] = str(e)
+                continue
+            with self._lock:
+                self._errors.pop(bind, None)
+                if beat is None:
+                    self._replayed.pop(bind, None)
+                else:
+                    self._replayed[bind] = beat / 1000.0
+        return len(self.binds)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            replicas = {}
+            for bind in self.binds:
+                replayed = self._replayed.get(bind)
+                replicas[bind] = {'lag_seconds': round(now - replayed, 3) if replayed is not None else None}
+                if bind in self._errors:
+                    replicas[bind]['error'] = self._errors[bind]
+            return {'replicas': replicas, 'max_lag': self.max_lag, 'routed': dict(self._routed)}
@@ -0,0 +1,217 @@
+"""Revoked access tokens and deactivated users, checked without the database.
+
+Each process keeps two in-memory maps that flask_jwt_extended's blocklist
+loader consults on every ``@jwt_required`` request:
+
+* revoked token ids (``jti`` -> token expiry), filled by ``/api/logout``;
+* revoked users (``user_id`` -> revocation time), filled on deactivation.
+  Every token of that user issued at or before the revocation is refused, so
+  a later login (once the account is active again) works.
+
+An entry only matters while a token it applies to can still be valid, so it
+expires after ``JWT_ACCESS_TOKEN_EXPIRES``.
+
+Revocations reach the other workers through a shared backend
+(``REVOCATION_BACKEND``):
+
+``local``   no sharing; the stand-in for one process, development and tests.
+            Revocations reach no other worker and are lost on restart, so
+            with more than one server worker (``WEB_CONCURRENCY``, set by
+            serve.py) ``init_app`` logs a warning; production needs ``redis``
+``redis``   a sorted set of live entries plus a pub/sub channel; each worker
+            applies published entries as they arrive and reloads the set every
+            ``REVOCATION_SYNC_INTERVAL`` seconds in case it missed any
+            (``REVOCATION_URL``; anything speaking the redis-py API works,
+            such as fakeredis)
+
+Both settings default to the ``REVOCATION_BACKEND`` and ``REVOCATION_URL``
+environment variables, so serve.py's workers can be pointed at redis.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+
+def _entry(kind, key, value):
+    return '%s|%s|%r' % (kind, key, value)
+
+
+class LocalBackend:
+    def publish(self, member, expires_at):
+        pass
+
+    def snapshot(self):
+        return []
+
+    def listen(self, apply, interval):
+        return None
+
+
+class RedisBackend:
+    def __init__(self, client, prefix='ekart:revoked'):
+        self.client = client
+        self.key = prefix
+        self.channel = prefix + ':events'
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError('REVOCATION_BACKEND=redis needs the redis package '
+                              '(pip install -r requirements-optional.txt)') from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def publish(self, member, expires_at):
+        pipe = self.client.pipeline()
+        pipe.zadd(self.key, {member: expires_at})
+        pipe.zremrangebyscore(self.key, '-inf', time.time())
+        pipe.publish(self.channel, member)
+        pipe.execute()
+
+    def snapshot(self):
+        members = self.client.zrangebyscore(self.key, time.time(), '+inf')
+        return [m.decode() if isinstance(m, bytes) else m for m in members]
+
+    def listen(self, apply, interval):
+        """Apply published entries until the connection fails; reload the
+        full set on start and every ``interval`` seconds."""
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            while True:
+                for member in self.snapshot():
+                    apply(member)
+                deadline = time.monotonic() + interval
+                while time.monotonic() < deadline:
+                    message = pubsub.get_message(timeout=max(deadline - time.monotonic(), 0.01))
+                    if message is not None and message['type'] == 'message':
+                        data = message['data']
+                        apply(data.decode() if isinstance(data, bytes) else data)
+        finally:
+            pubsub.close()
+
+
+class Revocations:
+    """Revoked users and token ids for this process, kept in step with the
+    shared backend by a listener thread started lazily in each worker."""
+
+    def __init__(self, app=None):
+        self.backend = LocalBackend()
+        self.ttl = 3600.0
+        self.interval = 30.0
+        self.logger = None
+        self._users = {}
+        self._jtis = {}
+        self._prune_at = 1024
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REVOCATION_BACKEND', os.environ.get('REVOCATION_BACKEND', 'local'))
+        app.config.setdefault('REVOCATION_URL', os.environ.get('REVOCATION_URL'))
+        app.config.setdefault('REVOCATION_SYNC_INTERVAL', 30.0)
+        if app.config['REVOCATION_BACKEND'] == 'redis':
+            self.backend = RedisBackend.from_url(app.config['REVOCATION_URL'])
+        else:
+            self.backend = LocalBackend()
+        expires = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15))
+        self.ttl = expires.total_seconds() if isinstance(expires, timedelta) else float(expires or 0)
+        self.interval = app.config['REVOCATION_SYNC_INTERVAL']
+        self.logger = app.logger
+        if isinstance(self.backend, LocalBackend) and _server_workers() > 1:
+            app.logger.warning(
+                f'REVOCATION_BACKEND is local but {_server_workers()} server workers are running: '
+                'a logout or deactivation only reaches the worker that handled it and is lost on '
+                'restart. Set REVOCATION_BACKEND=redis and REVOCATION_URL.')
+        app.extensions['revocations'] = self
+
+    # -- writes ------------------------------------------------------------
+
+    def revoke_user(self, user_id):
+        """Refuse every token issued to ``user_id`` up to now."""
+        now = time.time()
+        self._publish(_entry('user', int(user_id), now), now + self.ttl)
+
+    def revoke_token(self, jti, expires_at):
+        """Refuse the token ``jti``; ``expires_at`` is its ``exp`` claim."""
+        self._publish(_entry('jti', jti, float(expires_at)), float(expires_at))
+
+    def _publish(self, member, expires_at):
+        self.apply(member)
+        self.backend.publish(member, expires_at)
+
+    def apply(self, member):
+        kind, key, value = member.split('|')
+        value = float(value)
+        with self._lock:
+            if kind == 'user':
+                key = int(key)
+                if value > self._users.get(key, 0.0):
+                    self._users[key] = value
+            else:
+                self._jtis[key] = value
+            if len(self._users) + len(self._jtis) > self._prune_at:
+                now = time.time()
+                self._users = {k: v for k, v in self._users.items() if v + self.ttl > now}
+                self._jtis = {k: v for k, v in self._jtis.items() if v > now}
+                self._prune_at = max(1024, 2 * (len(self._users) + len(self._jtis)))
+
+    # -- reads -------------------------------------------------------------
+
+    def is_revoked(self, jwt_payload):
+        if self._pid != os.getpid():
+            self._ensure_listener()
+        if jwt_payload.get('jti') in self._jtis:
+            return True
+        revoked_at = self._users.get(_int_or_none(jwt_payload.get('sub')))
+        return revoked_at is not None and jwt_payload.get('iat', 0) <= revoked_at
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._users), 'tokens': len(self._jtis),
+                    'backend': type(self.backend).__name__}
+
+    # -- sync --------------------------------------------------------------
+
+    def _ensure_listener(self):
+        """Load the shared entries and start the listener, once per process;
+        requests wait for the initial load so none slips through."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if not isinstance(self.backend, LocalBackend):
+                try:
+                    for member in self.backend.snapshot():
+                        self.apply(member)
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.warning(f'Could not load revocations: {e}')
+                self._thread = threading.Thread(target=self._listen, name='revocation-listener', daemon=True)
+                self._thread.start()
+            self._pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                self.backend.listen(self.apply, self.interval)
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.warning(f'Revocation listener lost its connection: {e}')
+                time.sleep(1.0)
+
+
+def _server_workers():
+    return _int_or_none(os.environ.get('WEB_CONCURRENCY')) or 1
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,252 @@
+"""In-memory inverted index used by /api/products?q= for product search.
+
+Each process builds its own index in the background on the first search.
+Every ``SEARCH_INDEX_REFRESH_SECONDS`` a search first re-indexes the products
+whose ``updated_at`` moved since the newest change it has seen, which picks
+up edits made by other workers and by bulk imports. Every
+``SEARCH_INDEX_REBUILD_SECONDS`` it starts a full rebuild in the background,
+which also drops deleted products and catches writes that bypassed
+``updated_at``. Until the rebuild swaps in, the old index keeps serving.
+
+At most ``SEARCH_MAX_RESULTS`` hits are ranked. ``search`` returns them as
+``SearchHits``, whose ``total`` counts every match.
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-case, accent-fold and split text into word tokens."""
+    if not text:
+        return []
+    folded = unicodedata.normalize('NFKD', text)
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(folded.lower())
+
+
+class SearchHits(list):
+    """Ranked ``(product_id, score)`` pairs; ``total`` counts all matches,
+    including those cut off by the result cap."""
+
+    def __init__(self, ranked, total):
+        super().__init__(ranked)
+        self.total = total
+
+    @property
+    def truncated(self):
+        return self.total > len(self)
+
+
+class SearchIndex:
+    """Inverted index over product name and description.
+
+    Postings map a term to ``{product_id: weighted term frequency}``; the
+    vocabulary is kept sorted so prefix lookups are a bisect instead of a
+    scan. Scoring is BM25 with the name field weighted above the description.
+    Each query token must match (exactly or as a prefix) for a product to be
+    returned.
+    """
+
+    FIELD_WEIGHTS = {'name': 3.0, 'description': 1.0}
+    K1 = 1.2
+    B = 0.75
+    PREFIX_PENALTY = 0.6
+    # a write that commits after a later-stamped one is still seen by the next
+    # refresh; products in the overlap are re-indexed, which changes nothing
+    REFRESH_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self, app=None):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._reset()
+        self.ready = False
+        self.changed_through = None
+        self.last_refresh = 0.0
+        self.built_at = 0.0
+        self.max_expansions = 50
+        self.max_results = 1000
+        self.refresh_seconds = 30
+        self.rebuild_seconds = 3600
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_INDEX_ENABLED', True)
+        app.config.setdefault('SEARCH_MAX_RESULTS', 1000)
+        app.config.setdefault('SEARCH_MAX_PREFIX_EXPANSIONS', 50)
+        app.config.setdefault('SEARCH_INDEX_REFRESH_SECONDS', 30)
+        app.config.setdefault('SEARCH_INDEX_REBUILD_SECONDS', 3600)
+        self.max_results = app.config['SEARCH_MAX_RESULTS']
+        self.max_expansions = app.config['SEARCH_MAX_PREFIX_EXPANSIONS']
+        self.refresh_seconds = app.config['SEARCH_INDEX_REFRESH_SECONDS']
+        self.rebuild_seconds = app.config['SEARCH_INDEX_REBUILD_SECONDS']
+        app.extensions['search_index'] = self
+
+    def _reset(self):
+        self._postings = defaultdict(dict)
+        self._terms = []
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._total_len = 0.0
+
+    # -- maintenance -------------------------------------------------------
+
+    def _weighted_terms(self, name, description):
+        weights = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += self.FIELD_WEIGHTS['name']
+        for token in tokenize(description):
+            weights[token] += self.FIELD_WEIGHTS['description']
+        return weights
+
+    def _add_locked(self, product_id, name, description):
+        self._remove_locked(product_id)
+        weights = self._weighted_terms(name, description)
+        for term, tf in weights.items():
+            postings = self._postings[term]
+            if not postings:
+                insort(self._terms, term)
+            postings[product_id] = tf
+        self._doc_terms[product_id] = tuple(weights)
+        length = sum(weights.values())
+        self._doc_len[product_id] = length
+        self._total_len += length
+
+    def _remove_locked(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(product_id, 0.0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                pos = bisect_left(self._terms, term)
+                if pos < len(self._terms) and self._terms[pos] == term:
+                    del self._terms[pos]
+
+    def add(self, product_id, name, description, updated_at=None):
+        """Index (or re-index) a single product."""
+        with self._lock:
+            self._add_locked(product_id, name, description)
+            self._seen_locked(updated_at)
+
+    def _seen_locked(self, updated_at):
+        if updated_at is not None and (self.changed_through is None or updated_at > self.changed_through):
+            self.changed_through = updated_at
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def build(self, documents):
+        """Replace the index contents with ``(product_id, name, description, updated_at)`` rows."""
+        fresh = SearchIndex()
+        for product_id, name, description, updated_at in documents:
+            fresh._add_locked(product_id, name, description)
+            fresh._seen_locked(updated_at)
+        with self._lock:
+            self._postings = fresh._postings
+            self._terms = fresh._terms
+            self._doc_terms = fresh._doc_terms
+            self._doc_len = fresh._doc_len
+            self._total_len = fresh._total_len
+            # products added while the build ran are not in it; the next refresh
+            # reloads everything changed after its snapshot
+            self.changed_through = fresh.changed_through
+            self.last_refresh = self.built_at = time.monotonic()
+            self.ready = True
+
+    def warm(self, app, loader):
+        """Build the index in a background thread unless one is already running.
+
+        ``loader(since)`` must return ``(product_id, name, description,
+        updated_at)`` rows, all of them for ``since=None`` and otherwise those
+        with ``updated_at >= since``. It is called inside an app context.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                with app.app_context():
+                    self.build(loader(None))
+            except Exception as e:
+                app.logger.error(f'Search index build failed: {e}')
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name='search-index-build', daemon=True).start()
+
+    def refresh(self, app, loader):
+        """Start a full rebuild once the index is ``rebuild_seconds`` old; otherwise
+        re-index the products changed, here or by other workers, since the last refresh."""
+        if not self.ready or time.monotonic() - self.last_refresh < self.refresh_seconds:
+            return
+        if time.monotonic() - self.built_at >= self.rebuild_seconds:
+            self.warm(app, loader)
+            return
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            self.last_refresh = time.monotonic()
+            since = self.changed_through - self.REFRESH_OVERLAP if self.changed_through is not None else None
+            for product_id, name, description, updated_at in loader(since):
+                self.add(product_id, name, description, updated_at)
+        finally:
+            self._build_lock.release()
+
+    # -- querying ----------------------------------------------------------
+
+    def _expand(self, token):
+        """Return ``(term, factor)`` pairs for an exact match plus prefix matches."""
+        matches = []
+        pos = bisect_left(self._terms, token)
+        while pos < len(self._terms) and len(matches) < self.max_expansions:
+            term = self._terms[pos]
+            if not term.startswith(token):
+                break
+            matches.append((term, 1.0 if term == token else self.PREFIX_PENALTY))
+            pos += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """Return ``SearchHits`` of ``(product_id, score)`` ordered by descending relevance."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return SearchHits([], 0)
+        limit = self.max_results if limit is None else limit
+        with self._lock:
+            n_docs = len(self._doc_len) or 1
+            avg_len = (self._total_len / n_docs) or 1.0
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, factor in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, tf in postings.items():
+                        norm = tf + self.K1 * (1 - self.B + self.B * self._doc_len[product_id] / avg_len)
+                        score = factor * idf * tf * (self.K1 + 1) / norm
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+                if not scores:
+                    return SearchHits([], 0)
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return SearchHits(ranked[:limit] if limit else ranked, len(ranked))
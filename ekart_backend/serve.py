@@ -0,0 +1,121 @@
+"""Serve the API with gunicorn pre-forked workers.
+
+    python serve.py --workers 4 --threads 4 --bind 0.0.0.0:5000 --preload --migrate
+
+``--threads`` above 1 switches to the threaded ``gthread`` worker, which also
+honours HTTP keep-alive (``--keepalive`` seconds); the default ``sync`` worker
+closes every connection. ``--preload`` imports and builds the app once in the
+master so workers fork with the code already loaded (faster start-up and
+shared memory pages), at the cost of ``kill -HUP`` no longer picking up code
+changes.
+
+Process control goes through the master (see ``--pid``):
+``kill -HUP`` starts fresh workers and retires the old ones gracefully,
+``kill -TERM`` drains in-flight requests for up to ``--graceful-timeout``
+seconds, ``kill -TTIN``/``-TTOU`` add or remove a worker.
+
+``--asgi`` serves ``asgi:app`` with uvicorn instead. That is the asyncio
+serving path (aio.py), with the catalog, cart and admin metrics endpoints
+on an async engine. It uses ``--workers``, ``--bind``, ``--backlog``,
+``--keepalive`` and ``--access-log``.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+
+def _post_fork(server, worker):
+    # A preloaded master may have opened connections; never share them with children.
+    application = server.app.application
+    if application is None:
+        return
+    from app import db
+    with application.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+class Server(BaseApplication):
+    """``options`` are gunicorn settings; ``config`` is passed to create_app."""
+
+    def __init__(self, options, config=None):
+        self.options = options
+        self.config = config
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('post_fork', _post_fork)
+
+    def load(self):
+        if self.application is None:
+            from app import create_app
+            self.application = create_app(self.config)
+        return self.application
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default='127.0.0.1:5000')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count() * 2 + 1)
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker (>1 uses the gthread worker)')
+    parser.add_argument('--worker-class', default=None, help='override the gunicorn worker class')
+    parser.add_argument('--keepalive', type=int, default=5, help='seconds to hold idle keep-alive connections')
+    parser.add_argument('--timeout', type=int, default=30, help='restart workers silent for this many seconds')
+    parser.add_argument('--graceful-timeout', type=int, default=30)
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--max-requests', type=int, default=0, help='recycle a worker after this many requests')
+    parser.add_argument('--max-requests-jitter', type=int, default=0)
+    parser.add_argument('--preload', action='store_true', help='load the app in the master before forking')
+    parser.add_argument('--migrate', action='store_true', help='apply pending migrations before starting workers')
+    parser.add_argument('--pid', default=None, help='write the master pid here')
+    parser.add_argument('--access-log', default=None, help="access log file ('-' for stdout)")
+    parser.add_argument('--asgi', action='store_true', help='serve the asyncio app (aio.py) with uvicorn')
+    args = parser.parse_args()
+
+    # sizes per-worker pools such as the password hasher's (hashing.py)
+    os.environ['WEB_CONCURRENCY'] = str(args.workers)
+
+    if args.migrate:
+        import migrations
+        from app import create_app, db
+        with create_app().app_context():
+            migrations.upgrade(db)
+
+    if args.asgi:
+        try:
+            import uvicorn
+        except ImportError:
+            raise SystemExit('--asgi needs uvicorn and an async driver (pip install -r requirements-optional.txt)')
+        host, _, port = args.bind.rpartition(':')
+        uvicorn.run('asgi:app', host=host or '127.0.0.1', port=int(port), workers=args.workers,
+                    backlog=args.backlog, timeout_keep_alive=args.keepalive,
+                    access_log=args.access_log is not None, log_level='info')
+        return 0
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': args.worker_class or ('gthread' if args.threads > 1 else 'sync'),
+        'keepalive': args.keepalive,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'backlog': args.backlog,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'preload_app': args.preload,
+        'pidfile': args.pid,
+        'accesslog': args.access_log,
+    }
+    Server(options).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
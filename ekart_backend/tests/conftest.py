@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ekart  # noqa: E402
+import migrations  # noqa: E402
+
+
+@pytest.fixture
+def app(request):
+    """The app on a fresh in-memory SQLite database, with background jobs and caches off.
+
+    Parametrize it indirectly with a dict to override config, e.g. to turn the
+    catalog cache on.
+    """
+    app = ekart.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}},
+        'SQLALCHEMY_BINDS': {},
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'CATALOG_CACHE_BACKEND': 'none',
+        'METRICS_ENABLED': False,
+        'SLOW_REQUEST_MS': None,
+        'QUERY_COUNT_HEADER': True,
+        'POPULARITY_INTERVAL': 0,
+        'ORDER_ARCHIVE_INTERVAL': 0,
+        'PASSWORD_HASH_WORKERS': 0,
+        **getattr(request, 'param', {}),
+    })
+    with app.app_context():
+        migrations.upgrade(ekart.db, log=lambda *a: None)
+    yield app
+    with app.app_context():
+        ekart.db.session.remove()
+        ekart.db.engine.dispose()
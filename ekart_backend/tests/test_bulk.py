@@ -0,0 +1,21 @@
+"""Bulk import reports rows that are not valid UTF-8 instead of failing."""
+from flask_jwt_extended import create_access_token
+
+import app as ekart
+
+
+def test_invalid_utf8_is_a_row_error(app):
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'username': 'admin', 'role': 'admin'})
+    body = (b'sku,name,price,inventory\n'
+            b'A1,first,1.50,3\n'
+            b'B2,caf\xe9,2.00,1\n'
+            b'C3,third,3.00,2\n')
+    response = app.test_client().post('/api/admin/import/products?format=csv', data=body,
+                                      headers={'Authorization': 'Bearer ' + token})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['applied'], report['failed']) == (2, 1)
+    assert report['errors'] == [{'line': 3, 'error': 'line 3 is not valid UTF-8 (byte offset 47)'}]
+    with app.app_context():
+        assert {sku for (sku,) in ekart.db.session.query(ekart.Product.sku)} == {'A1', 'C3'}
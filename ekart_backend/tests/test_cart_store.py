@@ -0,0 +1,112 @@
+"""Carts in the memory store reach the cart table on flush (write-behind)."""
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app as ekart
+from cart_store import MemoryBackend
+
+memory_store = pytest.mark.parametrize('app', [{'CART_STORE': 'memory', 'CART_FLUSH_INTERVAL': 3600}],
+                                       indirect=True)
+
+
+def _shop(app, stock=5):
+    """Headers of a customer, and the ids of two products with ``stock`` units each."""
+    with app.app_context():
+        customer = ekart.User(username='customer', password_hash='!', role='customer')
+        products = [ekart.Product(name=f'item {i}', description='', price=1, inventory=stock) for i in range(2)]
+        ekart.db.session.add_all([customer, *products])
+        ekart.db.session.flush()
+        ekart.db.session.add_all(ekart.ProductMeta(product_id=p.product_id) for p in products)
+        ekart.db.session.commit()
+        token = create_access_token(identity=str(customer.user_id),
+                                    additional_claims={'username': customer.username, 'role': customer.role})
+        return {'Authorization': 'Bearer ' + token}, customer.user_id, [p.product_id for p in products]
+
+
+def _table(app):
+    with app.app_context():
+        return {row.product_id: row.quantity for row in ekart.Cart.query}
+
+
+def _flush(app):
+    with app.app_context():
+        return ekart.cart_store.flush()
+
+
+def _cart(client, headers):
+    return {line['product_id']: line['quantity'] for line in client.get('/api/cart', headers=headers).get_json()}
+
+
+@memory_store
+def test_changes_reach_the_table_on_flush(app):
+    headers, _, (first, second) = _shop(app)
+    client = app.test_client()
+    client.post('/api/cart', headers=headers, json={'product_id': first, 'quantity': 2})
+    client.put('/api/cart', headers=headers, json={'product_id': first, 'quantity': 3})
+    client.post('/api/cart', headers=headers, json={'product_id': second, 'quantity': 1})
+    client.delete(f'/api/cart/{second}', headers=headers)
+    assert client.post('/api/cart', headers=headers, json={'product_id': first, 'quantity': 3}).status_code == 400
+
+    assert _cart(client, headers) == {first: 3}
+    assert _table(app) == {}
+    assert _flush(app) == 1
+    assert _table(app) == {first: 3}
+    assert _flush(app) == 0
+
+
+@memory_store
+def test_cart_missing_from_the_store_is_loaded_from_the_table(app):
+    headers, user_id, (first, _) = _shop(app)
+    with app.app_context():
+        ekart.db.session.add(ekart.Cart(user_id=user_id, product_id=first, quantity=2))
+        ekart.db.session.commit()
+    assert _cart(app.test_client(), headers) == {first: 2}
+
+
+@memory_store
+def test_failed_checkout_puts_the_lines_back(app):
+    headers, _, (first, _) = _shop(app, stock=2)
+    client = app.test_client()
+    client.post('/api/cart', headers=headers, json={'product_id': first, 'quantity': 2})
+    _flush(app)
+    with app.app_context():
+        ekart.db.session.get(ekart.Product, first).inventory = 1
+        ekart.db.session.commit()
+
+    assert client.post('/api/orders', headers=headers).status_code == 400
+    assert _cart(client, headers) == {first: 2}
+    _flush(app)
+    assert _table(app) == {first: 2}
+
+    client.put('/api/cart', headers=headers, json={'product_id': first, 'quantity': 1})
+    assert client.post('/api/orders', headers=headers).status_code == 201
+    assert _cart(client, headers) == {}
+    _flush(app)
+    assert _table(app) == {}
+
+
+@memory_store
+def test_carts_stay_pending_when_a_flush_fails(app, monkeypatch):
+    headers, _, (first, _) = _shop(app)
+    app.test_client().post('/api/cart', headers=headers, json={'product_id': first, 'quantity': 1})
+
+    def unavailable(carts):
+        raise RuntimeError('database unavailable')
+
+    with monkeypatch.context() as patched:
+        patched.setattr(ekart.cart_store.sql, 'replace', unavailable)
+        with pytest.raises(RuntimeError):
+            _flush(app)
+    assert _flush(app) == 1
+    assert _table(app) == {first: 1}
+
+
+def test_only_clean_idle_carts_are_pruned():
+    store = MemoryBackend(ttl=0)
+    store.fill(1, {10: 1})
+    store.add(2, 10, 1, limit=5)
+    store.prune()
+    assert (store.loaded(1), store.loaded(2)) == (False, True)
+    store.pop_dirty(10)
+    store.prune()
+    assert not store.loaded(2)
@@ -0,0 +1,121 @@
+"""The catalog cache must never serve one request's body for another, nor a
+body that a write has made stale."""
+import os
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app as ekart
+
+memory_cache = pytest.mark.parametrize('app', [{'CATALOG_CACHE_BACKEND': 'memory'}], indirect=True)
+
+
+def _products(app, count):
+    with app.app_context():
+        products = [ekart.Product(name=f'item {i}', description='blue' if i % 2 else 'red',
+                                  price=1 + i, inventory=10) for i in range(count)]
+        ekart.db.session.add_all(products)
+        ekart.db.session.flush()
+        ekart.db.session.add_all(ekart.ProductMeta(product_id=p.product_id) for p in products)
+        ekart.db.session.commit()
+        return [p.product_id for p in products]
+
+
+def _admin(app):
+    with app.app_context():
+        admin = ekart.User(username='admin', password_hash='!', role='admin')
+        ekart.db.session.add(admin)
+        ekart.db.session.commit()
+        token = create_access_token(identity=str(admin.user_id),
+                                    additional_claims={'username': admin.username, 'role': admin.role})
+        return {'Authorization': 'Bearer ' + token}
+
+
+def _listing_hits():
+    return ekart.catalog_cache.stats().get('listing', {}).get('hits', 0)
+
+
+def _ids(response):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return [item['product_id'] for item in response.get_json()['items']]
+
+
+@memory_cache
+def test_blank_search_does_not_poison_the_listing(app):
+    ids = _products(app, 20)
+    client = app.test_client()
+
+    # whitespace is no search at all, not a search that matches nothing
+    assert _ids(client.get('/api/products?q=%20%20')) == ids[:12]
+    assert _ids(client.get('/api/products')) == ids[:12]
+
+
+@memory_cache
+def test_page_zero_does_not_poison_the_first_page(app):
+    ids = _products(app, 20)
+    client = app.test_client()
+
+    assert client.get('/api/products?page=0').get_json()['page'] == 1
+    first = client.get('/api/products')
+    assert _ids(first) == ids[:12]
+    assert first.get_json()['page'] == 1
+
+
+@memory_cache
+def test_workers_hand_out_the_same_etag(app, monkeypatch):
+    _products(app, 3)
+    client = app.test_client()
+    etag = client.get('/api/products').headers['ETag']
+
+    # another worker: a different process with a cache of its own
+    pid = os.getpid() + 1
+    monkeypatch.setattr(os, 'getpid', lambda: pid)
+    ekart.catalog_cache.backend.clear()
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/products').headers['ETag'] == etag
+
+
+@memory_cache
+def test_inventory_update_drops_the_detail_and_the_pages_showing_it(app):
+    ids = _products(app, 20)
+    admin = _admin(app)
+    client = app.test_client()
+    detail = client.get(f'/api/products/{ids[0]}')
+    client.get('/api/products')
+    client.get('/api/products?page=2')
+
+    assert client.patch(f'/api/admin/products/{ids[0]}/inventory', headers=admin,
+                        json={'inventory': 7}).status_code == 200
+
+    fresh = client.get(f'/api/products/{ids[0]}', headers={'If-None-Match': detail.headers['ETag']})
+    assert fresh.status_code == 200 and fresh.get_json()['product']['inventory'] == 7
+    assert fresh.headers['ETag'] != detail.headers['ETag']
+    hits = _listing_hits()
+    assert client.get('/api/products').get_json()['items'][0]['inventory'] == 7
+    assert _listing_hits() == hits
+    client.get('/api/products?page=2')  # does not show the product, so it stayed cached
+    assert _listing_hits() == hits + 1
+
+
+@memory_cache
+def test_restock_drops_in_stock_pages_that_did_not_show_the_product(app):
+    ids = _products(app, 3)
+    admin = _admin(app)
+    client = app.test_client()
+    client.patch(f'/api/admin/products/{ids[0]}/inventory', headers=admin, json={'inventory': 0})
+    assert _ids(client.get('/api/products?in_stock=1')) == ids[1:]
+
+    client.patch(f'/api/admin/products/{ids[0]}/inventory', headers=admin, json={'inventory': 4})
+    assert _ids(client.get('/api/products?in_stock=1')) == ids
+
+
+@memory_cache
+def test_new_product_drops_the_listings(app):
+    ids = _products(app, 2)
+    admin = _admin(app)
+    client = app.test_client()
+    client.get('/api/products')
+
+    created = client.post('/api/admin/products', headers=admin,
+                          json={'name': 'new', 'price': 1, 'inventory': 1}).get_json()['product_id']
+    assert _ids(client.get('/api/products')) == ids + [created]
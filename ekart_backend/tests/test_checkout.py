@@ -0,0 +1,56 @@
+"""Checkout never sells more units than are in stock."""
+from flask_jwt_extended import create_access_token
+from sqlalchemy import update
+
+import app as ekart
+
+
+def _customers(app, count, stock, quantity):
+    """Auth headers of ``count`` customers with ``quantity`` units of one product in the cart."""
+    with app.app_context():
+        product = ekart.Product(name='widget', description='', price=2, inventory=stock)
+        users = [ekart.User(username=f'customer {i}', password_hash='!', role='customer') for i in range(count)]
+        ekart.db.session.add_all([product, *users])
+        ekart.db.session.flush()
+        ekart.db.session.add(ekart.ProductMeta(product_id=product.product_id))
+        ekart.db.session.add_all(ekart.Cart(user_id=u.user_id, product_id=product.product_id, quantity=quantity)
+                                 for u in users)
+        ekart.db.session.commit()
+        headers = [{'Authorization': 'Bearer ' + create_access_token(
+            identity=str(u.user_id), additional_claims={'username': u.username, 'role': u.role})} for u in users]
+        return product.product_id, headers
+
+
+def _state(app, product_id):
+    """``(inventory, orders placed, cart lines left)``."""
+    with app.app_context():
+        return (ekart.db.session.get(ekart.Product, product_id).inventory,
+                ekart.Order.query.count(), ekart.Cart.query.count())
+
+
+def test_second_checkout_for_the_last_units_fails(app):
+    product_id, (first, second) = _customers(app, 2, stock=5, quantity=3)
+    client = app.test_client()
+    assert client.post('/api/orders', headers=first).status_code == 201
+    response = client.post('/api/orders', headers=second)
+    assert response.status_code == 400
+    assert response.get_json()['failed_lines'][0]['available'] == 2
+    assert _state(app, product_id) == (2, 1, 1)
+
+
+def test_stock_sold_after_the_lock_is_not_sold_again(app, monkeypatch):
+    product_id, (customer,) = _customers(app, 1, stock=5, quantity=3)
+    reserve = ekart._reserve_stock
+
+    def sold_meanwhile(lines):
+        # another checkout takes stock between the locked read and the UPDATE,
+        # as it can where the row lock is a no-op (SQLite)
+        ekart.db.session.execute(update(ekart.Product).where(ekart.Product.product_id == product_id)
+                                 .values(inventory=2))
+        return reserve(lines)
+
+    monkeypatch.setattr(ekart, '_reserve_stock', sold_meanwhile)
+    response = app.test_client().post('/api/orders', headers=customer)
+    assert response.status_code == 409, response.get_json()
+    inventory, orders, cart_lines = _state(app, product_id)
+    assert inventory >= 0 and (orders, cart_lines) == (0, 1)
@@ -0,0 +1,113 @@
+"""Facet counts from the bitmap index match counting the products one by one."""
+import random
+
+import pytest
+
+import app as ekart
+from facets import FacetIndex, Filters
+
+NAMES = {1: 'Books', 2: 'Garden', 3: 'Toys'}
+FILTERS = [
+    Filters(),
+    Filters(in_stock=True),
+    Filters(category_ids=[1, 3]),
+    Filters(min_price=20, max_price=120),
+    Filters(min_rating=3),
+    Filters(category_ids=[2], in_stock=True, min_price=5, min_rating=2),
+]
+
+
+def _catalog(count=300, seed=3):
+    """``(products, links)`` rows with gaps in the product ids."""
+    rng = random.Random(seed)
+    products, links = [], []
+    for pid in rng.sample(range(1, 3 * count), count):
+        products.append((pid, round(rng.uniform(0, 600), 2), rng.choice([0, 0, 1, 8]), rng.choice([0, 1.5, 3, 4.5])))
+        links += [(pid, cid) for cid in NAMES if rng.random() < 0.4]
+    return products, links
+
+
+def _expected(products, links, filters, edges=(0, 10, 25, 50, 100, 250, 500), bands=(4, 3, 2, 1)):
+    categories = {}
+    for pid, cid in links:
+        categories.setdefault(pid, set()).add(cid)
+
+    def passes(row, skip=None):
+        pid, price, inventory, rating = row
+        return ((skip == 'in_stock' or not filters.in_stock or inventory > 0)
+                and (skip == 'category' or not filters.category_ids
+                     or categories.get(pid, set()) & set(filters.category_ids))
+                and (skip == 'price' or filters.min_price is None or price >= filters.min_price)
+                and (skip == 'price' or filters.max_price is None or price <= filters.max_price)
+                and (skip == 'rating' or filters.min_rating is None or rating >= filters.min_rating))
+
+    def count(skip, keep):
+        return sum(1 for row in products if passes(row, skip) and keep(row))
+
+    bounds = list(edges) + [float('inf')]
+    return {
+        'total': count(None, lambda row: True),
+        'in_stock': count('in_stock', lambda row: row[2] > 0),
+        'categories': {cid: count('category', lambda row, cid=cid: cid in categories.get(row[0], ()))
+                       for cid in NAMES},
+        'price': [count('price', lambda row, i=i: bounds[i] <= row[1] < bounds[i + 1]) for i in range(len(edges))],
+        'rating': [count('rating', lambda row, band=band: row[3] >= band) for band in bands],
+    }
+
+
+def _counts(facets):
+    return {
+        'total': facets['total'],
+        'in_stock': facets['in_stock'],
+        'categories': {c['category_id']: c['count'] for c in facets['categories']},
+        'price': [p['count'] for p in facets['price']],
+        'rating': [r['count'] for r in facets['rating']],
+    }
+
+
+def _without_empty(expected, filters):
+    expected['categories'] = {cid: n for cid, n in expected['categories'].items()
+                              if n or cid in filters.category_ids}
+    return expected
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_counts_match_a_scan(filters):
+    products, links = _catalog()
+    index = FacetIndex()
+    index.build(products, links, NAMES)
+    assert _counts(index.facets(filters)) == _without_empty(_expected(products, links, filters), filters)
+
+
+def test_writes_during_a_rebuild_are_replayed():
+    products, links = _catalog()
+    index = FacetIndex()
+    index.build(products, links, NAMES)
+    sold_out = next(row for row in products if row[2] > 0)
+
+    def rows_read_while_selling():
+        yield from products
+        # this worker sells out a product after the rebuild read its row
+        index.set_inventory({sold_out[0]: 0})
+
+    index.build(rows_read_while_selling(), links, NAMES)
+    after = [(pid, price, 0 if pid == sold_out[0] else inventory, rating)
+             for pid, price, inventory, rating in products]
+    assert _counts(index.facets(Filters(in_stock=True))) == _without_empty(
+        _expected(after, links, Filters(in_stock=True)), Filters(in_stock=True))
+
+
+def test_listing_total_matches_the_facet_total(app):
+    products, links = _catalog(60)
+    with app.app_context():
+        ekart.db.session.add_all(ekart.Category(category_id=cid, name=name) for cid, name in NAMES.items())
+        ekart.db.session.add_all(ekart.Product(product_id=pid, name=f'item {pid}', description='', price=price,
+                                               inventory=inventory) for pid, price, inventory, _ in products)
+        ekart.db.session.add_all(ekart.ProductMeta(product_id=pid, rating=rating) for pid, _, _, rating in products)
+        ekart.db.session.add_all(ekart.ProductCategory(product_id=pid, category_id=cid) for pid, cid in links)
+        ekart.db.session.commit()
+    ekart.facet_index.ready = False  # the index is shared by every app in this process
+    client = app.test_client()
+    for args in ('', 'in_stock=1', 'category_id=1,3&min_rating=3', 'min_price=20&max_price=120'):
+        body = client.get('/api/products?facets=1&' + args).get_json()
+        assert body['total'] == body['facets']['total'], args
@@ -0,0 +1,55 @@
+"""Paying for an order: only the owner's pending orders, without touching others."""
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app as ekart
+
+
+def _headers(user):
+    token = create_access_token(identity=str(user.user_id),
+                                additional_claims={'username': user.username, 'role': user.role})
+    return {'Authorization': 'Bearer ' + token}
+
+
+def _orders(app):
+    """Headers of the owner and of another customer, a pending order, and an
+    archived delivered order of the owner."""
+    with app.app_context():
+        owner = ekart.User(username='owner', password_hash='!', role='customer')
+        other = ekart.User(username='other', password_hash='!', role='customer')
+        ekart.db.session.add_all([owner, other])
+        ekart.db.session.flush()
+        old = ekart.Order(user_id=owner.user_id, status='delivered', total=1,
+                          created_at=datetime.utcnow() - timedelta(days=400))
+        pending = ekart.Order(user_id=owner.user_id, status='pending', total=1)
+        ekart.db.session.add_all([old, pending])
+        ekart.db.session.commit()
+        ids = pending.order_id, old.order_id
+        assert ekart.order_archive.archive() == 1
+        return (_headers(owner), _headers(other), *ids)
+
+
+def _archived(app, order_id):
+    with app.app_context():
+        return ekart.db.session.get(ekart.Order, order_id) is None
+
+
+def test_paying_someone_elses_order_is_forbidden_and_restores_nothing(app, monkeypatch):
+    owner, other, pending, archived = _orders(app)
+    monkeypatch.setattr(ekart.order_archive, 'restore', lambda order_id: pytest.fail('order restored'))
+    client = app.test_client()
+    assert client.post(f'/api/orders/{pending}/pay', headers=other).status_code == 403
+    assert client.post(f'/api/orders/{archived}/pay', headers=other).status_code == 403
+    assert client.post(f'/api/orders/{archived}/pay', headers=owner).status_code == 400
+    assert _archived(app, archived)
+    assert client.post('/api/orders/999/pay', headers=owner).status_code == 404
+
+
+def test_owner_pays_a_pending_order_once(app):
+    owner, _, pending, _ = _orders(app)
+    client = app.test_client()
+    response = client.post(f'/api/orders/{pending}/pay', headers=owner)
+    assert response.status_code == 200 and response.get_json()['status'] == 'paid'
+    assert client.post(f'/api/orders/{pending}/pay', headers=owner).status_code == 400
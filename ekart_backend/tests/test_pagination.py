@@ -0,0 +1,59 @@
+"""Offset and cursor paging of /api/products, including out-of-range args."""
+import pytest
+
+import app as ekart
+
+
+def _products(app, prices, description='blue shirt'):
+    with app.app_context():
+        products = [ekart.Product(name=f'item {i}', description=description, price=price, inventory=10)
+                    for i, price in enumerate(prices)]
+        ekart.db.session.add_all(products)
+        ekart.db.session.flush()
+        ekart.db.session.add_all(ekart.ProductMeta(product_id=p.product_id) for p in products)
+        ekart.db.session.commit()
+        ekart.search_index.build(ekart._load_search_documents(None))
+        return [p.product_id for p in products]
+
+
+def _walk(client, path):
+    """Every product id from following next_cursor from the first page."""
+    ids, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'{path}&cursor={cursor}')
+        assert response.status_code == 200, response.get_data(as_text=True)
+        body = response.get_json()
+        ids += [item['product_id'] for item in body['items']]
+        cursor = body['next_cursor']
+    return ids
+
+
+@pytest.mark.parametrize('path', ['/api/products?page_size=0', '/api/products?q=blue&page_size=0'])
+def test_empty_page_size_is_one_item_per_page(app, path):
+    ids = _products(app, [5, 5, 5])
+    assert _walk(app.test_client(), path) == ids
+
+
+def test_negative_and_oversized_paging_is_clamped(app):
+    _products(app, [5] * 3)
+    client = app.test_client()
+    for args in ('page=-2&page_size=-5', 'q=blue&page=-2&page_size=-5'):
+        body = client.get('/api/products?' + args).get_json()
+        assert (body['page'], body['page_size'], len(body['items'])) == (1, 1, 1)
+    assert client.get('/api/products?page_size=100000').get_json()['page_size'] == ekart.MAX_PAGE_SIZE
+
+
+@pytest.mark.parametrize('sort', ['price_asc', 'price_desc', 'rating', 'popularity', None])
+def test_cursor_pages_break_ties_on_product_id(app, sort):
+    ids = _products(app, [3, 1, 3, 3, 1, 2, 3])
+    path = '/api/products?page_size=2' + (f'&sort={sort}' if sort else '')
+    walked = _walk(app.test_client(), path)
+    offset = app.test_client().get(path.replace('page_size=2', 'page_size=50')).get_json()['items']
+    assert walked == [item['product_id'] for item in offset]
+    assert sorted(walked) == ids
+
+
+def test_relevance_cursor_breaks_ties_on_product_id(app):
+    ids = _products(app, [1] * 7)
+    # equal documents score the same, so the order is the product ids
+    assert _walk(app.test_client(), '/api/products?q=blue&page_size=2') == ids
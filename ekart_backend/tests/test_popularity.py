@@ -0,0 +1,46 @@
+"""The popularity job folds every order line once, even one committed late."""
+from datetime import datetime, timedelta
+
+import app as ekart
+
+
+def _line(order_item_id, product_id, age):
+    """An order line for ``product_id`` whose order was placed ``age`` ago."""
+    order = ekart.Order(user_id=1, status='paid', total=1, created_at=datetime.utcnow() - age)
+    ekart.db.session.add(order)
+    ekart.db.session.flush()
+    ekart.db.session.add(ekart.OrderItem(order_item_id=order_item_id, order_id=order.order_id,
+                                         product_id=product_id, quantity=1, price_at_purchase=1))
+    ekart.db.session.commit()
+    return order
+
+
+def _popularity():
+    ekart.db.session.expire_all()
+    return {m.product_id: m.popularity for m in ekart.ProductMeta.query.order_by(ekart.ProductMeta.product_id)}
+
+
+def test_line_committed_after_a_higher_id_is_still_folded(app):
+    with app.app_context():
+        ekart.db.session.add(ekart.User(user_id=1, username='customer', password_hash='!', role='customer'))
+        products = [ekart.Product(name=f'item {i}', description='', price=1, inventory=10) for i in range(2)]
+        ekart.db.session.add_all(products)
+        ekart.db.session.commit()
+        first, second = (p.product_id for p in products)
+
+        # line 5 commits while line 3, inserted earlier, is still in flight
+        late = _line(5, second, timedelta(seconds=5))
+        ekart.update_popularity()
+        early = _line(3, first, timedelta(seconds=10))
+
+        for order in (late, early):
+            order.created_at -= timedelta(seconds=app.config['POPULARITY_SETTLE_SECONDS'])
+        ekart.db.session.commit()
+        ekart.update_popularity()
+        scores = _popularity()
+        assert scores[first] > 0 and scores[second] > 0
+        assert ekart.db.session.get(ekart.PopularityState, 1).last_order_item_id == 5
+
+        # a later run does not fold either line again
+        ekart.update_popularity()
+        assert _popularity() == scores
@@ -0,0 +1,70 @@
+"""Statement counts of the hot views must not grow with the number of lines.
+
+Each view is called for a cart or order of 1 line and of 150 lines. Both
+calls must issue the same number of SQL statements, within the view's
+``query_budget``.
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app as ekart
+
+LINE_COUNTS = (1, 150)
+
+
+def _headers(user):
+    token = create_access_token(identity=str(user.user_id),
+                                additional_claims={'username': user.username, 'role': user.role})
+    return {'Authorization': 'Bearer ' + token}
+
+
+def _shop(app, lines):
+    """A customer with ``lines`` products in the cart, and an admin."""
+    with app.app_context():
+        customer = ekart.User(username='customer', password_hash='!', role='customer')
+        admin = ekart.User(username='admin', password_hash='!', role='admin')
+        products = [ekart.Product(name=f'item {i}', description='', price=1 + i % 7, inventory=100)
+                    for i in range(lines)]
+        ekart.db.session.add_all([customer, admin, *products])
+        ekart.db.session.flush()
+        ekart.db.session.add_all(ekart.ProductMeta(product_id=p.product_id) for p in products)
+        ekart.db.session.add_all(ekart.Cart(user_id=customer.user_id, product_id=p.product_id, quantity=2)
+                                 for p in products)
+        ekart.db.session.commit()
+        return _headers(customer), _headers(admin)
+
+
+def _statements(app, client, method, path, headers, endpoint):
+    response = client.open(path, method=method, headers=headers)
+    assert response.status_code < 300, response.get_data(as_text=True)
+    used = int(response.headers['X-Query-Count'])
+    assert used <= app.view_functions[endpoint].query_budget
+    return used
+
+
+def _counts(app, method, path, endpoint, place_order=False):
+    counts = []
+    for lines in LINE_COUNTS:
+        client = app.test_client()
+        customer, admin = _shop(app, lines)
+        order_id = None
+        if place_order:
+            order_id = client.post('/api/orders', headers=customer).get_json()['order_id']
+        headers = admin if path.startswith('/api/admin') else customer
+        counts.append(_statements(app, client, method, path.format(order_id=order_id), headers, endpoint))
+        with app.app_context():
+            ekart.db.drop_all()
+            ekart.db.create_all()
+    return counts
+
+
+@pytest.mark.parametrize('method, path, endpoint, place_order', [
+    ('GET', '/api/cart', 'api.get_cart', False),
+    ('POST', '/api/orders', 'api.place_order', False),
+    ('GET', '/api/orders/{order_id}', 'api.get_order', True),
+    ('GET', '/api/admin/transactions/{order_id}', 'api.admin_transaction_detail', True),
+    ('GET', '/api/admin/metrics', 'api.admin_metrics', True),
+])
+def test_statements_do_not_grow_with_lines(app, method, path, endpoint, place_order):
+    one, many = _counts(app, method, path, endpoint, place_order)
+    assert one == many
@@ -0,0 +1,10 @@
+"""The hot endpoints' SELECTs must not scan tables they are not expected to
+(bench/explain_check.py, on a seeded in-memory database)."""
+from bench import explain_check
+
+
+def test_no_unexpected_full_scans(app):
+    with app.app_context():
+        explain_check.seed(200)
+    report = []
+    assert explain_check.check(app, log=report.append) == 0, '\n'.join(report)
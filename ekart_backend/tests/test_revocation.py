@@ -0,0 +1,44 @@
+"""Logout and deactivation take effect on the next request, without reading the user row."""
+import pytest
+
+import app as ekart
+
+CREDENTIALS = {'username': 'customer', 'password': 'correct horse battery staple'}
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    """A client for a registered customer; revocations start empty and do not
+    leak into other tests, whose users reuse the same ids."""
+    monkeypatch.setattr(ekart.revocations, '_users', {})
+    monkeypatch.setattr(ekart.revocations, '_jtis', {})
+    client = app.test_client()
+    assert client.post('/api/register', json=CREDENTIALS).status_code == 201
+    return client
+
+
+def _login(client):
+    response = client.post('/api/login', json=CREDENTIALS)
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+
+
+def test_authenticated_requests_do_not_query_the_database(client):
+    response = client.get('/api/profile', headers=_login(client))
+    assert response.status_code == 200
+    assert response.headers['X-Query-Count'] == '0'
+
+
+def test_logout_revokes_only_the_presented_token(client):
+    first, second = _login(client), _login(client)
+    assert client.post('/api/logout', headers=first).status_code == 200
+    assert client.get('/api/profile', headers=first).status_code == 401
+    assert client.get('/api/profile', headers=second).status_code == 200
+
+
+def test_deactivation_revokes_every_token_and_blocks_login(client):
+    first, second = _login(client), _login(client)
+    assert client.post('/api/account/deactivate', headers=first).status_code == 200
+    assert client.get('/api/profile', headers=first).status_code == 401
+    assert client.get('/api/profile', headers=second).status_code == 401
+    assert client.post('/api/login', json=CREDENTIALS).status_code == 403
@@ -0,0 +1,62 @@
+"""The product search index: ranking, and refreshing from products changed elsewhere."""
+from datetime import timedelta
+
+import pytest
+
+import app as ekart
+from search_index import SearchIndex
+
+
+def _ids(hits):
+    return [pid for pid, _ in hits]
+
+
+def test_ranking_and_matching():
+    index = SearchIndex()
+    index.build([
+        (1, 'Red shoe', 'blue laces', None),
+        (2, 'Blue shirt', 'cotton', None),
+        (3, 'Bluebird mug', '', None),
+        (4, 'Café table', 'oak', None),
+    ])
+    hits = index.search('blue')
+    ranked = _ids(hits)
+    assert ranked.index(2) < ranked.index(1)  # a name match outweighs a description match
+    assert set(ranked) == {1, 2, 3}  # 'bluebird' matches as a prefix
+    assert _ids(index.search('blue shi')) == [2]  # every term must match
+    assert _ids(index.search('cafe')) == [4]
+
+    top = index.search('blue', limit=1)
+    assert (len(top), top.total, top.truncated) == (1, 3, True)
+    assert not hits.truncated
+
+
+def test_equal_documents_rank_by_product_id():
+    index = SearchIndex()
+    index.build([(pid, 'Blue shirt', '', None) for pid in (9, 3, 5)])
+    assert _ids(index.search('blue')) == [3, 5, 9]
+
+
+@pytest.mark.parametrize('app', [{'SEARCH_INDEX_REFRESH_SECONDS': 0}], indirect=True)
+def test_refresh_picks_up_products_changed_by_other_workers(app):
+    with app.app_context():
+        products = [ekart.Product(name=name, description='', price=1, inventory=1)
+                    for name in ('Blue shirt', 'Red shirt', 'Green shirt')]
+        ekart.db.session.add_all(products)
+        ekart.db.session.commit()
+        blue, red, green = (p.product_id for p in products)
+        ekart.search_index.build(ekart._load_search_documents(None))
+        seen = ekart.search_index.changed_through
+
+        # written elsewhere: one edit stamped now, and one that commits late
+        # with a stamp just before the newest change the index has seen
+        ekart.db.session.get(ekart.Product, red).name = 'Red scarf'
+        ekart.db.session.commit()
+        late = ekart.db.session.get(ekart.Product, green)
+        late.name = 'Green scarf'
+        late.updated_at = seen - timedelta(seconds=1)
+        ekart.db.session.commit()
+
+        assert _ids(ekart._search_product_ids('scarf')) == [red, green]
+        assert _ids(ekart._search_product_ids('shirt')) == [blue]
+        assert ekart.search_index.changed_through > seen